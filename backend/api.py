@@ -7,11 +7,15 @@ logging.getLogger("passlib").setLevel(logging.ERROR)
 logging.getLogger("passlib.handlers.bcrypt").setLevel(logging.ERROR)
 
 from .db import init_db
+from .api_admin import router as admin_router
+from .api_metrics import RequestMetricsMiddleware, router as metrics_router
 from .api_auth import router as auth_router
 from .api_profiles import router as profiles_router
 from .api_metadata import router as meta_router
 from .assess import router as assess_router
-from .ocr import router as ocr_router
+from .ocr import router as ocr_router, start_ocr, stop_ocr
+from .scan import router as scan_router
+from .policy_registry import start_policy_watcher, stop_policy_watcher
 
 
 @asynccontextmanager
@@ -20,15 +24,20 @@ async def lifespan(app: FastAPI):
     init_db()
     from .db import ensure_schema_if_dev
     ensure_schema_if_dev()
+    start_policy_watcher()  # hot-reloads changed policy files (mtime polling + SIGHUP)
+    await start_ocr()  # one OCR client (credentials + channel) for the process
     yield
     # ---- Shutdown ----
     # add any cleanup here (e.g., close db engines, clients, etc.)
+    await stop_ocr()
+    stop_policy_watcher()
 
 
 app = FastAPI(
     title="FoodScanner API",
     lifespan=lifespan,
 )
+app.add_middleware(RequestMetricsMiddleware)
 
 
 # health
@@ -40,6 +49,9 @@ def health():
 # Routers
 app.include_router(assess_router, prefix="")
 app.include_router(ocr_router, prefix="")
+app.include_router(scan_router, prefix="")
 app.include_router(auth_router)
 app.include_router(profiles_router)
-app.include_router(meta_router)
\ No newline at end of file
+app.include_router(meta_router)
+app.include_router(admin_router)
+app.include_router(metrics_router)
@@ -0,0 +1,49 @@
+# backend/api_admin.py
+import hmac
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from . import metrics
+from .metrics import PHASE_SECONDS
+from .policy_registry import get_registry
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+# Admin endpoints are disabled unless ADMIN_TOKEN is set; callers send it as X-Admin-Token.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(404, "Not found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(403, "Forbidden")
+
+@router.get("/policy", dependencies=[Depends(require_admin)])
+def policy_status():
+    """Active policies and their fingerprints."""
+    reg = get_registry()
+    default = reg.engine(reg.default) if reg.default else None
+    return {
+        "fingerprint": default.fingerprint if default else None,
+        "policies": reg.status(),
+    }
+
+@router.post("/policy/reload", dependencies=[Depends(require_admin)])
+def policy_reload():
+    """Reload changed policy files now (same path as the background watcher / SIGHUP)."""
+    return get_registry().reload()
+
+@router.get("/timings", dependencies=[Depends(require_admin)])
+def phase_timings():
+    """Per-phase assessment latency histograms (filled while ASSESS_PHASE_TIMING is on)."""
+    out = {}
+    for (phase,), s in sorted(PHASE_SECONDS.series().items()):
+        count = s["count"]
+        out[phase] = {
+            "count": count,
+            "mean_ms": s["sum"] / count * 1000 if count else 0.0,
+            "buckets": {("+Inf" if le == float("inf") else repr(le)): n for le, n in s["buckets"]},
+        }
+    return {"enabled": metrics.ASSESS_PHASE_TIMING, "phases": out}
@@ -6,6 +6,7 @@ from .models import User
 from .auth import hash_password, verify_password, make_token
 from .schemas import RegisterReq, LoginReq, TokenResp, AccountResp, AccountUpdateReq
 from .deps import get_current_user
+from .profile_matchers import invalidate_user
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -62,12 +63,15 @@ def update_me(
         user.owner_name = req.owner_name
     if req.state_province is not None:
         user.state_province = req.state_province
+    country_changed = req.country is not None and req.country != user.country
     if req.country is not None:
         user.country = req.country
 
     session.add(user)
     session.commit()
     session.refresh(user)
+    if country_changed:
+        invalidate_user(user.id)  # cached matchers picked their policy by the old country
 
     return AccountResp(
         id=user.id, 
@@ -1,13 +1,13 @@
 # backend/api_metadata.py
 from fastapi import APIRouter
-from .assess import load_policy
+from .policy_registry import select_engine
 from .schemas import AllowedAllergensResp
 
 router = APIRouter(prefix="/meta", tags=["meta"])
 
 @router.get("/allowed-allergens", response_model=AllowedAllergensResp)
 def allowed_allergens():
-    pol = load_policy()
+    pol = select_engine().policy
     toks = (pol.get("tokens") or {})
     items = toks.get("major_allergens") or []
     return AllowedAllergensResp(allergens=items)
@@ -0,0 +1,120 @@
+# backend/api_metrics.py
+"""
+GET /metrics in the Prometheus text format, plus the ASGI middleware that feeds
+the per-route request histogram. Cache and DB pool figures are read at scrape
+time, from one snapshot per scrape. Set METRICS_TOKEN to require "Authorization: Bearer <token>" on scrapes.
+"""
+import hmac
+import os
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from . import metrics
+from .metrics import HTTP_IN_FLIGHT, HTTP_REQUEST_SECONDS, Gauge
+
+router = APIRouter(tags=["metrics"])
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+
+class RequestMetricsMiddleware:
+    """Latency per (method, route template, status) and the in-flight gauge; unmatched paths share one label."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        started = time.perf_counter()
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, scope["method"], route, str(status))
+
+
+# ---------- scrape-time collectors ----------
+def _pool(attr: str):
+    def read() -> Dict[Tuple[str, ...], float]:
+        from .db import engine
+        fn = getattr(engine.pool, attr, None)
+        return {(): fn()} if callable(fn) else {}  # not every pool class tracks these
+    return read
+
+def _collect_cache_stats() -> Dict[str, Dict]:
+    """Stats of the caches that exist; a scrape never creates one just to measure it."""
+    from . import ocr, policy_registry
+    from .assess import _RESULT_CACHE
+    from .profile_matchers import profile_cache_stats
+    out = {"assess_result": _RESULT_CACHE.stats(), "profile_matcher": profile_cache_stats()}
+    if ocr._phash is not None:
+        out["ocr_phash"] = ocr._phash.stats()
+    if ocr._cache is not None:
+        out["ocr_result"] = ocr._cache.stats()
+    if policy_registry._registry is not None:
+        out["policy_engine"] = policy_registry._registry.cache_stats()
+    return out
+
+_scrape: ContextVar[Optional[Dict[str, Dict]]] = ContextVar("metrics_scrape", default=None)
+
+def _cache_stats() -> Dict[str, Dict]:
+    """The current scrape's snapshot (taken once in get_metrics), else a fresh one."""
+    snapshot = _scrape.get()
+    return snapshot if snapshot is not None else _collect_cache_stats()
+
+def _cache_field(field: str, cache: Optional[str] = None):
+    def read() -> Dict[Tuple[str, ...], float]:
+        stats = _cache_stats()
+        if cache is not None:
+            return {(): stats[cache][field]} if cache in stats else {}
+        return {(name,): s[field] for name, s in stats.items()}
+    return read
+
+for _name, _help, _attr in (
+    ("foodscanner_db_pool_size", "Configured size of the DB connection pool.", "size"),
+    ("foodscanner_db_pool_checked_out", "DB connections currently checked out.", "checkedout"),
+    ("foodscanner_db_pool_overflow", "DB connections opened beyond the pool size (negative: unused capacity).", "overflow"),
+):
+    metrics.register(Gauge(_name, _help, callback=_pool(_attr)))
+# cache counters restart when a cache is cleared or rebuilt, so they are gauges, not Prometheus counters
+for _name, _help, _field, _cache in (
+    ("foodscanner_cache_hits", "Cache hits since the cache was created or cleared.", "hits", None),
+    ("foodscanner_cache_misses", "Cache misses since the cache was created or cleared.", "misses", None),
+    ("foodscanner_cache_hit_ratio", "Cache hits / lookups since the cache was created or cleared.", "hit_ratio", None),
+    ("foodscanner_cache_entries", "Entries currently cached.", "size", None),
+    ("foodscanner_ocr_cache_disk_bytes", "Bytes held by the on-disk OCR result cache.", "disk_bytes", "ocr_result"),
+    ("foodscanner_ocr_phash_false_match_ratio", "False matches / checked perceptual-hash hits.",
+     "false_match_ratio", "ocr_phash"),
+    ("foodscanner_ocr_phash_threshold", "Hamming distance accepted as a near-duplicate image.", "threshold", "ocr_phash"),
+):
+    metrics.register(Gauge(_name, _help, () if _cache else ("cache",), callback=_cache_field(_field, _cache)))
+
+
+@router.get("/metrics", include_in_schema=False, response_class=PlainTextResponse)
+def get_metrics(authorization: Optional[str] = Header(default=None)):
+    if METRICS_TOKEN:
+        supplied = (authorization or "")[7:] if (authorization or "").lower().startswith("bearer ") else ""
+        if not hmac.compare_digest(supplied, METRICS_TOKEN):
+            raise HTTPException(401, "Unauthorized")
+    token = _scrape.set(_collect_cache_stats())  # one snapshot shared by every cache gauge
+    try:
+        text = metrics.render()
+    finally:
+        _scrape.reset(token)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -10,7 +10,8 @@ from .db import get_session
 from .models import User, Profile, ProfileAllergen
 from .schemas import ProfileIn, ProfileOut
 from .deps import get_current_user
-from .assess import load_policy  # reuse policy loader
+from .policy_registry import select_engine  # reuse compiled policy
+from .profile_matchers import invalidate_profile
 
 router = APIRouter(prefix="/profiles", tags=["profiles"])
 
@@ -49,7 +50,7 @@ def _norm_allergen(s: str) -> str:
     return (s or "").strip().lower().rstrip("s").replace("-", "").replace(" ", "")
 
 def _allowed_allergens_norm() -> set[str]:
-    pol = load_policy() or {}
+    pol = select_engine().policy or {}
     majors = (pol.get("tokens", {}).get("major_allergens") or [])
     return {_norm_allergen(x) for x in majors}
 
@@ -168,6 +169,7 @@ def update_profile(profile_id: int, req: ProfileIn, user: User = Depends(get_cur
     session.add(prof)
     session.commit()
     session.refresh(prof)
+    invalidate_profile(prof.id)  # personalized assessments must see the new allergens/avoids
 
     return ProfileOut(
     id=prof.id,
@@ -191,6 +193,7 @@ def delete_profile(profile_id: int, user: User = Depends(get_current_user),
     _AVOID_CACHE.pop(prof.id, None)
     session.delete(prof)
     session.commit()
+    invalidate_profile(profile_id)
     return {"ok": True}
 
 @router.get("/{profile_id}", response_model=ProfileOut)
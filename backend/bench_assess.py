@@ -0,0 +1,288 @@
+# backend/bench_assess.py
+"""
+Microbenchmarks for label assessment on synthetic corpora.
+
+    python -m backend.bench_assess                                  # print the report
+    python -m backend.bench_assess --save-baseline bench.json       # record a baseline
+    python -m backend.bench_assess --baseline bench.json            # exit 1 on regressions
+    python -m backend.bench_assess --quick --scenario tokens=500
+
+Each scenario builds a policy and a label corpus from a fixed seed, varying one
+dimension around the base (50 tokens, 100 hazards, 4 patterns, 20% synonyms):
+tokens per label (5-500), hazard-list size (4-10k), pattern count and synonym
+density. Per-call latency percentiles are reported for the three phases of
+PolicyEngine.assess (prepare: normalize/synonyms/fuzzy/multi-word, classify:
+token masks, score) and for the whole call, both cold (memo tables cleared
+before every call) and warm. Allocation peaks per phase come from a separate
+tracemalloc pass so tracing does not skew the timings.
+"""
+from typing import Dict, List, Optional, Tuple
+import argparse, json, platform, random, sys, time, tracemalloc
+
+from .policy_engine import PolicyEngine, _CODE_DIGEST, pattern_budget
+
+BASE = {"tokens": 50, "hazards": 100, "patterns": 4, "synonyms": 0.2}
+SWEEP = {
+    "tokens": (5, 50, 500),
+    "hazards": (4, 100, 10000),
+    "patterns": (0, 4, 32),
+    "synonyms": (0.0, 0.2, 0.6),
+}
+PHASES = ("prepare", "classify", "score", "total")
+DEFAULT_THRESHOLD = 0.25  # relative slowdown of a p50 that counts as a regression
+NOISE_FLOOR_US = 5.0  # absolute slowdowns below this are timer noise
+
+_SYLLABLES = ("ba", "ce", "di", "fo", "gu", "ha", "ke", "li", "mo", "nu", "pa", "ro", "si", "tu", "ve", "xy", "zo")
+
+
+# ---------- synthetic data ----------
+def _word(rng: random.Random, syllables: int) -> str:
+    return "".join(rng.choice(_SYLLABLES) for _ in range(syllables))
+
+def make_policy(rng: random.Random, hazards: int, patterns: int, synonyms: int = 40) -> Dict:
+    """Policy with a generated vocabulary; every canonical allergen/animal term gets one alias."""
+    allergens = sorted({_word(rng, 2) for _ in range(20)})
+    animals = sorted({_word(rng, 3) for _ in range(20)})
+    canon = (allergens + animals)[:synonyms]
+    trace = [rf"(?i)\b{_word(rng, 2)}\s+{_word(rng, 2)}\b" for _ in range(patterns - patterns // 4)]
+    deny = [rf"(?i)\b{_word(rng, 3)}\d+\b" for _ in range(patterns // 4)]
+    return {
+        "matching": {"multiword": True},
+        "tokens": {
+            "major_allergens": allergens,
+            "animal_tokens": animals,
+            "hazardous_chemicals": sorted({f"{_word(rng, 3)} {_word(rng, 2)}ide" for _ in range(hazards)}),
+            "synonyms": {c: [f"{c}{_word(rng, 1)}"] for c in canon},
+            "additives": [{"id": f"E{100 + i}", "names": [_word(rng, 4)]} for i in range(10)],
+        },
+        "patterns": {"trace_allergen_patterns": trace, "deny_patterns": deny},
+        "scoring": {"weights": {"ALLERGEN_MATCH": 5}, "thresholds": {"caution": 3, "avoid": 10}},
+    }
+
+def make_corpus(rng: random.Random, policy: Dict, labels: int, tokens: int, synonym_density: float) -> List[List[str]]:
+    """Labels mixing unseen words, policy terms, synonym aliases and the odd E-number or hazard."""
+    toks = policy["tokens"]
+    aliases = [a for names in toks["synonyms"].values() for a in names]
+    terms = toks["major_allergens"] + toks["animal_tokens"]
+    filler = [_word(rng, rng.randint(2, 4)) for _ in range(2000)]
+    hazards = toks["hazardous_chemicals"]
+    corpus = []
+    for _ in range(labels):
+        label = []
+        for _ in range(tokens):
+            r = rng.random()
+            if aliases and r < synonym_density:
+                label.append(rng.choice(aliases).upper())
+            elif r < synonym_density + 0.1:
+                label.append(rng.choice(terms))
+            elif r < synonym_density + 0.12:
+                label.append(f"E{rng.randint(100, 999)}")
+            elif r < synonym_density + 0.121:
+                label.append(f"{rng.choice(filler)} {rng.choice(hazards)}")
+            else:
+                label.append(" ".join(rng.choice(filler) for _ in range(rng.randint(1, 3))))
+        corpus.append(label)
+    return corpus
+
+
+# ---------- measurement ----------
+def _phases(engine: PolicyEngine, tokens: List[str]) -> Tuple[float, float, float]:
+    """One assessment split into (prepare, classify, score) seconds; mirrors PolicyEngine.analyze + score."""
+    clock = time.perf_counter
+    with pattern_budget(engine.pattern_budget):
+        t0 = clock()
+        toks, fixes = [], []
+        for raw in tokens:
+            t, fix = engine.resolve(raw)
+            if t is None:
+                continue
+            toks.append(t)
+            toks.extend(engine.embedded_terms(t))
+            if fix:
+                fixes.append(fix)
+        t1 = clock()
+        masks = [engine.mask_of(t) for t in toks]
+        agg = 0
+        for m in masks:
+            agg |= m
+        t2 = clock()
+        engine.score(toks, masks, agg, fixes)
+        t3 = clock()
+    return t1 - t0, t2 - t1, t3 - t2
+
+def _reset_memo(engine: PolicyEngine) -> None:
+    engine._seen.clear()
+    engine._fuzzy_seen.clear()
+    engine._embedded.clear()
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p90/p99/mean/max of latencies in seconds, reported in microseconds (nearest rank)."""
+    s = sorted(samples)
+    if not s:
+        return {"p50": 0.0, "p90": 0.0, "p99": 0.0, "mean": 0.0, "max": 0.0}
+    def rank(q: float) -> float:
+        return s[min(len(s) - 1, max(0, int(round(q * len(s))) - 1))] * 1e6
+    return {"p50": round(rank(0.50), 2), "p90": round(rank(0.90), 2), "p99": round(rank(0.99), 2),
+            "mean": round(sum(s) / len(s) * 1e6, 2), "max": round(s[-1] * 1e6, 2)}
+
+def _latencies(engine: PolicyEngine, corpus: List[List[str]], cold: bool, repeat: int) -> Dict[str, Dict[str, float]]:
+    samples: Dict[str, List[float]] = {p: [] for p in PHASES}
+    for _ in range(repeat):
+        for label in corpus:
+            if cold:
+                _reset_memo(engine)
+            parts = _phases(engine, label)
+            for phase, dt in zip(PHASES, parts):
+                samples[phase].append(dt)
+            samples["total"].append(sum(parts))
+    return {phase: percentiles(v) for phase, v in samples.items()}
+
+def _allocations(engine: PolicyEngine, corpus: List[List[str]]) -> Dict[str, float]:
+    """Mean peak traced bytes per phase and call (cold), measured with tracemalloc."""
+    totals = {p: 0 for p in PHASES[:3]}
+    tracemalloc.start()
+    try:
+        for label in corpus:
+            _reset_memo(engine)
+            state: Dict = {}
+
+            def prepare(label=label):
+                state["toks"], state["fixes"] = [], []
+                for raw in label:
+                    t, fix = engine.resolve(raw)
+                    if t is not None:
+                        state["toks"].append(t)
+                        state["toks"].extend(engine.embedded_terms(t))
+                        if fix:
+                            state["fixes"].append(fix)
+
+            def classify():
+                state["masks"] = [engine.mask_of(t) for t in state["toks"]]
+                agg = 0
+                for m in state["masks"]:
+                    agg |= m
+                state["agg"] = agg
+
+            def score():
+                engine.score(state["toks"], state["masks"], state["agg"], state["fixes"])
+
+            with pattern_budget(engine.pattern_budget):
+                for name, fn in (("prepare", prepare), ("classify", classify), ("score", score)):
+                    before = tracemalloc.get_traced_memory()[0]
+                    tracemalloc.reset_peak()
+                    fn()
+                    totals[name] += tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    n = max(1, len(corpus))
+    return {name: round(total / n, 1) for name, total in totals.items()}
+
+def scenarios(only: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """name -> parameters; each sweep value is combined with the base values of the other dimensions."""
+    out: Dict[str, Dict] = {}
+    for dim, values in SWEEP.items():
+        for v in values:
+            params = dict(BASE, **{dim: v})
+            name = f"{dim}={v}"
+            if params == BASE:
+                name = "base"
+            out.setdefault(name, params)
+    if only:
+        out = {k: v for k, v in out.items() if k in only}
+    return out
+
+def run_scenario(params: Dict, labels: int = 200, repeat: int = 3, seed: int = 1) -> Dict:
+    rng = random.Random(seed)
+    policy = make_policy(rng, params["hazards"], params["patterns"])
+    corpus = make_corpus(rng, policy, labels, params["tokens"], params["synonyms"])
+    started = time.perf_counter()
+    engine = PolicyEngine(policy)
+    compile_ms = (time.perf_counter() - started) * 1000
+    cold = _latencies(engine, corpus, cold=True, repeat=1)
+    _reset_memo(engine)
+    for label in corpus:  # warm-up pass fills the memo tables
+        engine.assess(label)
+    warm = _latencies(engine, corpus, cold=False, repeat=repeat)
+    return {"params": params, "labels": labels, "compile_ms": round(compile_ms, 2),
+            "cold_us": cold, "warm_us": warm, "alloc_bytes": _allocations(engine, corpus[:50])}
+
+def run(only: Optional[List[str]] = None, labels: int = 200, repeat: int = 3, seed: int = 1) -> Dict:
+    return {
+        "meta": {"python": platform.python_version(), "machine": platform.machine(), "seed": seed,
+                 "labels": labels, "repeat": repeat, "engine_code": _CODE_DIGEST.hex()[:16],
+                 "created": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "scenarios": {name: run_scenario(p, labels, repeat, seed) for name, p in scenarios(only).items()},
+    }
+
+
+# ---------- baselines ----------
+def compare(current: Dict, baseline: Dict, threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    """Regressions of current vs baseline: p50 per phase (cold and warm) slower by more than threshold."""
+    problems = []
+    for name, base in (baseline.get("scenarios") or {}).items():
+        cur = (current.get("scenarios") or {}).get(name)
+        if cur is None:
+            continue
+        for mode in ("cold_us", "warm_us"):
+            for phase in PHASES:
+                old = base.get(mode, {}).get(phase, {}).get("p50")
+                new = cur.get(mode, {}).get(phase, {}).get("p50")
+                if old is None or new is None:
+                    continue
+                if new > old * (1 + threshold) and new - old > NOISE_FLOOR_US:
+                    problems.append(f"{name} {mode[:-3]} {phase}: p50 {old:.1f} -> {new:.1f} us "
+                                    f"(+{(new / old - 1) * 100 if old else float('inf'):.0f}%)")
+    return problems
+
+def _print_report(result: Dict) -> None:
+    print(f"{'scenario':<18} {'compile':>9} {'cold p50':>9} {'cold p99':>9} {'warm p50':>9} {'warm p99':>9}"
+          f"  {'prepare/classify/score alloc (B)':>32}")
+    for name, r in result["scenarios"].items():
+        cold, warm, alloc = r["cold_us"]["total"], r["warm_us"]["total"], r["alloc_bytes"]
+        print(f"{name:<18} {r['compile_ms']:>7.1f}ms {cold['p50']:>7.1f}us {cold['p99']:>7.1f}us "
+              f"{warm['p50']:>7.1f}us {warm['p99']:>7.1f}us  "
+              f"{alloc['prepare']:>10.0f} {alloc['classify']:>10.0f} {alloc['score']:>10.0f}")
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="python -m backend.bench_assess", description=__doc__.split("\n\n")[0])
+    p.add_argument("--scenario", action="append", help="run only these scenarios (e.g. base, tokens=500)")
+    p.add_argument("--labels", type=int, default=200, help="labels per corpus")
+    p.add_argument("--repeat", type=int, default=3, help="warm passes over the corpus")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--quick", action="store_true", help="small corpora (smoke run)")
+    p.add_argument("--json", metavar="PATH", help="write the full results as JSON ('-' for stdout)")
+    p.add_argument("--save-baseline", metavar="PATH", help="write the results as the new baseline")
+    p.add_argument("--baseline", metavar="PATH", help="compare against a baseline; exit 1 on regressions")
+    p.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                   help="allowed relative p50 slowdown before it counts as a regression")
+    return p
+
+def _dump(result: Dict, path: str) -> None:
+    text = json.dumps(result, indent=2)
+    if path == "-":
+        print(text)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text + "\n")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    labels, repeat = (20, 1) if args.quick else (args.labels, args.repeat)
+    result = run(args.scenario, labels, repeat, args.seed)
+    if args.json:
+        _dump(result, args.json)
+    if args.json != "-":
+        _print_report(result)
+    if args.save_baseline:
+        _dump(result, args.save_baseline)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            problems = compare(result, json.load(f), args.threshold)
+        for p in problems:
+            print(f"[bench_assess] regression: {p}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,129 @@
+# backend/bench_columnar.py
+"""
+Columnar (NumPy) vs per-label scoring for bulk_assess-style chunk streams.
+
+    python -m backend.bench_columnar                              # shipped policy, 20 chunks of 2000 labels
+    python -m backend.bench_columnar --unique 0.3 --chunks 50     # high-cardinality dump
+    python -m backend.bench_columnar --policy backend/policies/policy_v2.json --json -
+
+A catalog is generated from a fixed seed: ingredient names are drawn from a
+Zipf-distributed pool of common ingredients (the policy vocabulary plus
+generated words), and a --unique share of tokens is one-off text (OCR noise,
+brand and batch names) that no other label repeats. Chunks are scored in
+sequence by one long-lived ColumnarAssessor (like a bulk_assess worker) and by
+PolicyEngine.assess_many(budget=False), each on its own engine so neither
+benefits from the other's memo tables; the results are checked to be equal.
+"""
+from typing import Dict, List, Optional
+import argparse, itertools, json, platform, random, statistics, sys, time
+
+from .columnar import COLUMNAR_VOCAB_MAX, ColumnarAssessor
+from .policy_engine import PolicyEngine, load_policy
+
+_SYLLABLES = ("ba", "ce", "di", "fo", "gu", "ha", "ke", "li", "mo", "nu", "pa", "ro", "si", "tu", "ve", "xy", "zo")
+
+
+# ---------- synthetic catalog ----------
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+def make_chunks(rng: random.Random, policy: Dict, chunks: int, chunk_size: int, tokens: int = 20,
+                unique: float = 0.1, pool: int = 3000) -> List[List[List[str]]]:
+    """chunks x chunk_size labels of ~tokens ingredients; a `unique` share of tokens is never repeated."""
+    vocab = PolicyEngine(policy).index
+    common = sorted(vocab) + [" ".join(_word(rng) for _ in range(rng.randint(1, 2))) for _ in range(pool)]
+    rng.shuffle(common)
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(common))))  # Zipf
+    serial = itertools.count()
+    out = []
+    for _ in range(chunks):
+        chunk = []
+        for _ in range(chunk_size):
+            n = max(1, int(rng.gauss(tokens, tokens / 4)))
+            label = rng.choices(common, cum_weights=weights, k=n)
+            for i in range(n):
+                if rng.random() < unique:
+                    label[i] = f"{_word(rng)} {next(serial)}"
+            chunk.append(label)
+        out.append(chunk)
+    return out
+
+
+# ---------- measurement ----------
+def run(policy: Dict, chunks: List[List[List[str]]], max_vocab: int = COLUMNAR_VOCAB_MAX) -> Dict:
+    """Per-chunk seconds for both paths over the same chunk sequence, plus the columnar vocabulary size."""
+    columnar = ColumnarAssessor(PolicyEngine(policy), max_vocab)
+    per_label = PolicyEngine(policy)
+    col_s, row_s, vocab, mismatches = [], [], [], 0
+    for chunk in chunks:
+        started = time.perf_counter()
+        got = columnar.assess_corpus(chunk)
+        col_s.append(time.perf_counter() - started)
+        vocab.append(len(columnar.tokens))
+        started = time.perf_counter()
+        want = per_label.assess_many(chunk, budget=False)
+        row_s.append(time.perf_counter() - started)
+        mismatches += sum(g != w for g, w in zip(got, want))
+    col, row = statistics.median(col_s), statistics.median(row_s)
+    return {"labels_per_chunk": len(chunks[0]) if chunks else 0, "chunks": len(chunks),
+            "columnar_ms_p50": round(col * 1000, 2), "columnar_ms_max": round(max(col_s) * 1000, 2),
+            "assess_many_ms_p50": round(row * 1000, 2), "assess_many_ms_max": round(max(row_s) * 1000, 2),
+            "speedup": round(row / col, 2) if col else None, "vocab_max": max(vocab), "vocab_last": vocab[-1],
+            "mismatches": mismatches}
+
+def _print_report(result: Dict) -> None:
+    meta = result["meta"]
+    print(f"{meta['chunks']} chunks x {meta['chunk_size']} labels, ~{meta['tokens']} tokens, "
+          f"unique share {meta['unique']}")
+    print(f"{'unique':>7} {'columnar p50':>13} {'assess_many p50':>16} {'speedup':>8} {'vocab max':>10} {'mismatch':>9}")
+    for r in result["runs"]:
+        print(f"{r['unique']:>7} {r['columnar_ms_p50']:>11.1f}ms {r['assess_many_ms_p50']:>14.1f}ms "
+              f"{r['speedup']:>7.2f}x {r['vocab_max']:>10} {r['mismatches']:>9}")
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="python -m backend.bench_columnar", description=__doc__.split("\n\n")[0])
+    p.add_argument("--policy", default=None, help="policy file (default: POLICY_DIR/POLICY_FILE)")
+    p.add_argument("--chunks", type=int, default=20)
+    p.add_argument("--chunk-size", type=int, default=2000, help="labels per chunk (bulk_assess --chunk-size)")
+    p.add_argument("--tokens", type=int, default=20, help="mean ingredients per label")
+    p.add_argument("--unique", type=float, action="append",
+                   help="share of one-off tokens (repeatable; default 0, 0.1 and 0.3)")
+    p.add_argument("--max-vocab", type=int, default=COLUMNAR_VOCAB_MAX)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--quick", action="store_true", help="3 chunks of 200 labels (smoke run)")
+    p.add_argument("--json", metavar="PATH", help="write the results as JSON ('-' for stdout)")
+    return p
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.policy:
+        with open(args.policy, "r", encoding="utf-8") as f:
+            policy = json.load(f)
+    else:
+        policy = load_policy()
+    chunks, size = (3, 200) if args.quick else (args.chunks, args.chunk_size)
+    runs = []
+    for unique in args.unique or (0.0, 0.1, 0.3):
+        data = make_chunks(random.Random(args.seed), policy, chunks, size, args.tokens, unique)
+        runs.append({"unique": unique, **run(policy, data, args.max_vocab)})
+    result = {"meta": {"python": platform.python_version(), "machine": platform.machine(), "chunks": chunks,
+                       "chunk_size": size, "tokens": args.tokens, "unique": [r["unique"] for r in runs],
+                       "max_vocab": args.max_vocab, "created": time.strftime("%Y-%m-%dT%H:%M:%S")},
+              "runs": runs}
+    if args.json:
+        text = json.dumps(result, indent=2)
+        if args.json == "-":
+            print(text)
+        else:
+            with open(args.json, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+    if args.json != "-":
+        _print_report(result)
+    if any(r["mismatches"] for r in runs):
+        print("[bench_columnar] columnar results differ from assess_many", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
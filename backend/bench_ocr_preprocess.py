@@ -0,0 +1,197 @@
+# backend/bench_ocr_preprocess.py
+"""
+Upload bytes saved vs OCR accuracy for the /v1/ocr preprocessing settings.
+
+    python -m backend.bench_ocr_preprocess                          # synthetic fixtures, bytes and time only
+    python -m backend.bench_ocr_preprocess --fixtures labels/ --backend vision
+    python -m backend.bench_ocr_preprocess --max-edge 1600 --max-edge 2048 --quality 75 --quality 85
+
+A fixture set is a directory of photos; `<name>.txt` next to a photo holds its
+expected text. Without --fixtures, phone-sized label photos are rendered from a
+fixed seed (EXIF-rotated, with sensor noise) along with their text. For every
+combination of max edge, JPEG quality and grayscale, each photo goes through
+ocr.preprocess_image and the report shows bytes in/out, preprocessing time and,
+with a real OCR backend, accuracy: the text similarity (0-1) of the OCR result
+to the expected text, or to the OCR of the untouched photo when there is none.
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import argparse, asyncio, difflib, io, itertools, json, os, platform, random, statistics, sys, time
+
+from PIL import Image, ImageDraw, ImageFont
+
+from .ocr import OCR_TIMEOUT, PreprocessOptions, preprocess_image
+
+DEFAULT_MAX_EDGES = (1024, 1600, 2048, 3072)
+DEFAULT_QUALITIES = (70, 85)
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp", ".heic", ".tif", ".tiff", ".bmp")
+
+_WORDS = ("sugar", "wheat flour", "palm oil", "skimmed milk powder", "salt", "emulsifier (soy lecithin)",
+          "E330", "E202", "cocoa butter", "hazelnuts", "whey powder", "natural flavouring", "glucose syrup",
+          "barley malt extract", "raising agent (E500)", "rapeseed oil", "eggs", "vanillin", "E471")
+
+
+# ---------- fixtures ----------
+def make_fixture(rng: random.Random, size: Tuple[int, int] = (4032, 3024)) -> Tuple[bytes, str]:
+    """A JPEG 'photo' of an ingredient list (EXIF orientation 6: taken in portrait) and its text."""
+    words = rng.sample(_WORDS, 12)
+    text = "Ingredients: " + ", ".join(words)
+    w, h = size
+    img = Image.effect_noise((w, h), 18).convert("RGB")
+    img = Image.blend(img, Image.new("RGB", (w, h), (236, 230, 214)), 0.85)
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default(size=max(12, h // 28))
+    lines, line = [], ""
+    for word in text.split(" "):
+        if line and draw.textlength(line + " " + word, font=font) > w * 0.8:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}".strip()
+    lines.append(line)
+    y = h // 8
+    for line in lines:
+        draw.text((w // 10, y), line, fill=(30, 28, 26), font=font)
+        y += int(font.size * 1.4)
+    img = img.rotate(90, expand=True)  # the sensor stores it sideways...
+    exif = Image.Exif()
+    exif[0x0112] = 6  # ...and the Orientation tag says to turn it back
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=92, exif=exif)
+    return out.getvalue(), text
+
+def synthetic_fixtures(count: int, seed: int = 1, size: Tuple[int, int] = (4032, 3024)) -> List[Tuple[str, bytes, Optional[str]]]:
+    rng = random.Random(seed)
+    return [(f"synthetic-{i}", *make_fixture(rng, size)) for i in range(count)]
+
+def load_fixtures(directory: str) -> List[Tuple[str, bytes, Optional[str]]]:
+    """(name, image bytes, expected text or None) for every image in a directory."""
+    out = []
+    for name in sorted(os.listdir(directory)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() not in IMAGE_EXTS:
+            continue
+        with open(os.path.join(directory, name), "rb") as f:
+            content = f.read()
+        expected = None
+        sidecar = os.path.join(directory, stem + ".txt")
+        if os.path.exists(sidecar):
+            with open(sidecar, "r", encoding="utf-8") as f:
+                expected = f.read()
+        out.append((name, content, expected))
+    return out
+
+
+# ---------- measurement ----------
+def similarity(a: str, b: str) -> float:
+    """0-1 similarity of two OCR texts, ignoring case and whitespace layout."""
+    return difflib.SequenceMatcher(None, " ".join(a.split()).casefold(), " ".join(b.split()).casefold()).ratio()
+
+def settings(max_edges=DEFAULT_MAX_EDGES, qualities=DEFAULT_QUALITIES, grayscale=(True, False)) -> List[PreprocessOptions]:
+    return [PreprocessOptions(e, g, q) for e, q, g in itertools.product(max_edges, qualities, grayscale)]
+
+def _label(opts: PreprocessOptions) -> str:
+    return f"edge={opts.max_edge} q={opts.quality} {'gray' if opts.grayscale else 'color'}"
+
+async def _measure(fixtures: List[Tuple[str, bytes, Optional[str]]], options: List[PreprocessOptions],
+                   backend) -> List[Dict]:
+    async def ocr(content: bytes) -> str:
+        return await asyncio.wait_for(backend.detect(content, None, OCR_TIMEOUT), OCR_TIMEOUT)
+
+    reference: Dict[str, str] = {}
+    if backend is not None:
+        for name, content, expected in fixtures:
+            reference[name] = expected if expected is not None else await ocr(content)
+    bytes_in = sum(len(content) for _, content, _ in fixtures)
+    rows = []
+    for opts in options:
+        out_bytes, times, scores = 0, [], []
+        for name, content, _ in fixtures:
+            started = time.perf_counter()
+            out = preprocess_image(content, opts)
+            times.append((time.perf_counter() - started) * 1000)
+            out_bytes += len(out)
+            if backend is not None:
+                scores.append(similarity(await ocr(out), reference[name]))
+        rows.append({"setting": _label(opts), "max_edge": opts.max_edge, "quality": opts.quality,
+                     "grayscale": opts.grayscale, "bytes_in": bytes_in, "bytes_out": out_bytes,
+                     "saved": round(1 - out_bytes / bytes_in, 4) if bytes_in else 0.0,
+                     "ms_p50": round(statistics.median(times), 2) if times else 0.0,
+                     "ms_max": round(max(times), 2) if times else 0.0,
+                     "accuracy": round(statistics.mean(scores), 4) if scores else None})
+    return rows
+
+def run(fixtures: List[Tuple[str, bytes, Optional[str]]], options: List[PreprocessOptions],
+        backend_factory: Optional[Callable[[], Any]] = None) -> Dict:
+    """One row per setting. backend_factory builds an OCR backend (in the benchmark's event loop) for accuracy."""
+    async def go():
+        backend = backend_factory() if backend_factory else None
+        try:
+            return type(backend).__name__ if backend else None, await _measure(fixtures, options, backend)
+        finally:
+            if backend is not None:
+                await backend.close()
+
+    backend_name, rows = asyncio.run(go())
+    return {"meta": {"python": platform.python_version(), "machine": platform.machine(),
+                     "fixtures": len(fixtures), "backend": backend_name,
+                     "created": time.strftime("%Y-%m-%dT%H:%M:%S")},
+            "settings": rows}
+
+def _print_report(result: Dict) -> None:
+    print(f"{result['meta']['fixtures']} fixtures, backend: {result['meta']['backend'] or 'none (no accuracy)'}")
+    print(f"{'setting':<26} {'bytes in':>11} {'bytes out':>11} {'saved':>7} {'p50':>9} {'max':>9} {'accuracy':>9}")
+    for r in result["settings"]:
+        acc = f"{r['accuracy']:.3f}" if r["accuracy"] is not None else "-"
+        print(f"{r['setting']:<26} {r['bytes_in']:>11} {r['bytes_out']:>11} {r['saved'] * 100:>6.1f}% "
+              f"{r['ms_p50']:>7.1f}ms {r['ms_max']:>7.1f}ms {acc:>9}")
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="python -m backend.bench_ocr_preprocess", description=__doc__.split("\n\n")[0])
+    p.add_argument("--fixtures", metavar="DIR", help="photos (+ <name>.txt expected text); default: synthetic")
+    p.add_argument("--count", type=int, default=6, help="synthetic fixtures to render")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--max-edge", type=int, action="append", help=f"max edges to try (default {DEFAULT_MAX_EDGES})")
+    p.add_argument("--quality", type=int, action="append", help=f"JPEG qualities to try (default {DEFAULT_QUALITIES})")
+    p.add_argument("--color-only", action="store_true", help="skip the grayscale settings")
+    p.add_argument("--gray-only", action="store_true", help="skip the color settings")
+    p.add_argument("--backend", choices=("none", "vision"), default="none",
+                   help="OCR backend for accuracy (vision needs Cloud credentials)")
+    p.add_argument("--quick", action="store_true", help="two small synthetic photos, one setting (smoke run)")
+    p.add_argument("--json", metavar="PATH", help="write the results as JSON ('-' for stdout)")
+    return p
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.fixtures:
+        fixtures = load_fixtures(args.fixtures)
+        if not fixtures:
+            print(f"[bench_ocr_preprocess] no images in {args.fixtures}", file=sys.stderr)
+            return 2
+    elif args.quick:
+        fixtures = synthetic_fixtures(2, args.seed, size=(1600, 1200))
+    else:
+        fixtures = synthetic_fixtures(args.count, args.seed)
+    grayscale = (False,) if args.color_only else (True,) if args.gray_only else (True, False)
+    if args.quick:
+        options = settings(args.max_edge or (1024,), args.quality or (85,), grayscale[:1])
+    else:
+        options = settings(args.max_edge or DEFAULT_MAX_EDGES, args.quality or DEFAULT_QUALITIES, grayscale)
+    backend_factory = None
+    if args.backend == "vision":
+        from .ocr import VisionOcr
+        backend_factory = VisionOcr
+    result = run(fixtures, options, backend_factory)
+    if args.json:
+        text = json.dumps(result, indent=2)
+        if args.json == "-":
+            print(text)
+        else:
+            with open(args.json, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+    if args.json != "-":
+        _print_report(result)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,257 @@
+# backend/bulk_assess.py
+"""
+Offline bulk assessor for Open Food Facts-style dumps.
+
+    python -m backend.bulk_assess products.jsonl.gz -o verdicts.ndjson --workers 8
+    python -m backend.bulk_assess products.csv --format csv --checkpoint run.ckpt
+
+Input is streamed (JSONL/NDJSON or CSV, optionally gzip-compressed, "-" for stdin),
+tokenized with backend.ingredients, split into chunks and fanned out to a process
+pool; every worker compiles the policy once. Results are written in input order as
+NDJSON or CSV. With --checkpoint the run can be interrupted and resumed where the
+last flushed chunk ended.
+"""
+from typing import Dict, Iterator, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import argparse, csv, gzip, json, os, sys, time
+
+from .ingredients import split_ingredients
+from .policy_engine import PolicyEngine, get_engine
+
+# (line number, product id, tokens or None, error or None)
+Record = Tuple[int, Optional[str], Optional[List[str]], Optional[str]]
+
+
+# ---------- input ----------
+def _open_text(path: str, mode: str = "rt"):
+    if path == "-":
+        return sys.stdin if "r" in mode else sys.stdout
+    if path.endswith(".gz"):
+        return gzip.open(path, mode, encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+def _tokens_from(value) -> Optional[List[str]]:
+    """Ingredient field -> token list: plain text is tokenized, lists are taken as-is (OFF {"text": ...} items too)."""
+    if isinstance(value, str):
+        return split_ingredients(value)
+    if isinstance(value, list):
+        out = []
+        for v in value:
+            if isinstance(v, dict):
+                v = v.get("text") or v.get("id")
+            if v:
+                out.append(str(v))
+        return out
+    return None
+
+def _is_csv(path: str, fmt: Optional[str]) -> bool:
+    if fmt:
+        return fmt == "csv"
+    return path.removesuffix(".gz").endswith(".csv")
+
+def iter_records(path: str, field: str, id_field: str, input_format: Optional[str] = None,
+                 skip: int = 0, fallback_field: Optional[str] = None) -> Iterator[Record]:
+    """Stream records from a JSONL or CSV dump without loading it into memory."""
+    with _open_text(path) as f:
+        if _is_csv(path, input_format):
+            csv.field_size_limit(2**31 - 1)  # OFF exports carry very long text columns
+            rows: Iterator = csv.DictReader(f)
+            for n, row in enumerate(rows, start=1):
+                if n <= skip:
+                    continue
+                toks = _tokens_from(row.get(field)) or (fallback_field and _tokens_from(row.get(fallback_field)))
+                yield n, row.get(id_field), toks, None if toks else "no ingredients"
+            return
+        for n, line in enumerate(f, start=1):
+            if n <= skip:
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                yield n, None, None, "invalid json"
+                continue
+            if not isinstance(obj, dict):
+                yield n, None, None, "invalid record"
+                continue
+            pid = obj.get(id_field)
+            toks = _tokens_from(obj.get(field)) or (fallback_field and _tokens_from(obj.get(fallback_field)))
+            yield n, None if pid is None else str(pid), toks, None if toks else "no ingredients"
+
+
+# ---------- workers ----------
+_ENGINE: Optional[PolicyEngine] = None
+_COLUMNAR = None
+
+def _init_worker(policy_file: Optional[str], columnar: bool) -> None:
+    """Per-process setup: compile the policy once and keep it for every chunk."""
+    global _ENGINE, _COLUMNAR
+    _ENGINE = get_engine(policy_file)
+    if columnar:
+        from .columnar import ColumnarAssessor
+        _COLUMNAR = ColumnarAssessor(_ENGINE)
+
+def _assess_chunk(chunk: List[Record]) -> List[Dict]:
+    ok = [r for r in chunk if r[3] is None]
+    token_lists = [r[2] for r in ok]
+    if _COLUMNAR is not None:
+        scored = iter(_COLUMNAR.assess_corpus(token_lists))
+    else:
+        scored = iter(_ENGINE.assess_many(token_lists, budget=False))  # offline: identical to the columnar path
+    out = []
+    for line, pid, _, error in chunk:
+        row: Dict = {"line": line, "id": pid}
+        if error is None:
+            score, verdict, reasons = next(scored)
+            row.update(score=score, verdict=verdict, reasons=reasons)
+        else:
+            row["error"] = error
+        out.append(row)
+    return out
+
+
+# ---------- output ----------
+CSV_COLUMNS = ["line", "id", "score", "verdict", "reason_codes", "reasons", "error"]
+
+class _Writer:
+    def __init__(self, f, fmt: str, write_header: bool):
+        self.f = f
+        self.fmt = fmt
+        self._csv = csv.writer(f) if fmt == "csv" else None
+        if self._csv is not None and write_header:
+            self._csv.writerow(CSV_COLUMNS)
+
+    def write(self, row: Dict) -> None:
+        if self._csv is None:
+            self.f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            return
+        reasons = row.get("reasons") or []
+        self._csv.writerow([
+            row["line"], row.get("id") or "", row.get("score", ""), row.get("verdict", ""),
+            "|".join(r["code"] for r in reasons),
+            json.dumps(reasons, ensure_ascii=False) if reasons else "",
+            row.get("error") or "",
+        ])
+
+
+# ---------- checkpoints ----------
+def _load_checkpoint(path: Optional[str], input_path: str) -> Dict:
+    if not path or not os.path.exists(path):
+        return {"records": 0, "output_bytes": 0}
+    with open(path, "r", encoding="utf-8") as f:
+        ckpt = json.load(f)
+    if ckpt.get("input") != os.path.abspath(input_path):
+        raise SystemExit(f"checkpoint {path} belongs to another input: {ckpt.get('input')}")
+    return ckpt
+
+def _save_checkpoint(path: str, input_path: str, records: int, output_bytes: int) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"input": os.path.abspath(input_path), "records": records,
+                   "output_bytes": output_bytes}, f)
+    os.replace(tmp, path)
+
+
+# ---------- driver ----------
+def _chunks(records: Iterator[Record], size: int) -> Iterator[List[Record]]:
+    chunk: List[Record] = []
+    for rec in records:
+        chunk.append(rec)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def run(args: argparse.Namespace) -> int:
+    out_fmt = args.format or ("csv" if args.output.removesuffix(".gz").endswith(".csv") else "ndjson")
+    if args.checkpoint and (args.output == "-" or args.output.endswith(".gz")):
+        raise SystemExit("--checkpoint needs a plain (uncompressed) output file")
+
+    ckpt = _load_checkpoint(args.checkpoint, args.input)
+    done = int(ckpt.get("records", 0))
+    if args.output == "-":
+        out = sys.stdout
+    elif done and os.path.exists(args.output):
+        out = open(args.output, "r+", encoding="utf-8", newline="")
+        out.seek(int(ckpt.get("output_bytes", 0)))
+        out.truncate()
+    else:
+        done = 0
+        out = _open_text(args.output, "wt")
+    writer = _Writer(out, out_fmt, write_header=(done == 0))
+
+    records = iter_records(args.input, args.field, args.id_field, args.input_format,
+                           skip=done, fallback_field=args.fallback_field)
+    started = last_report = time.monotonic()
+    processed = 0
+
+    def flush(rows: List[Dict]) -> None:
+        nonlocal processed, last_report
+        for row in rows:
+            writer.write(row)
+        processed += len(rows)
+        if args.checkpoint:
+            out.flush()
+            _save_checkpoint(args.checkpoint, args.input, done + processed, out.tell())
+        now = time.monotonic()
+        if not args.quiet and now - last_report >= args.progress_every:
+            last_report = now
+            rate = processed / max(now - started, 1e-9)
+            print(f"[bulk_assess] {done + processed} records, {rate:,.0f} rec/s", file=sys.stderr)
+
+    try:
+        if args.workers <= 0:
+            _init_worker(args.policy, args.columnar)
+            for chunk in _chunks(records, args.chunk_size):
+                flush(_assess_chunk(chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                     initargs=(args.policy, args.columnar)) as pool:
+                pending: deque = deque()
+                for chunk in _chunks(records, args.chunk_size):
+                    pending.append(pool.submit(_assess_chunk, chunk))
+                    # bounded in-flight window keeps memory flat; results leave in input order
+                    while len(pending) >= args.workers * 2:
+                        flush(pending.popleft().result())
+                while pending:
+                    flush(pending.popleft().result())
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.monotonic() - started
+    if not args.quiet:
+        print(f"[bulk_assess] done: {processed} records in {elapsed:.1f}s "
+              f"({processed / max(elapsed, 1e-9):,.0f} rec/s)", file=sys.stderr)
+    if args.checkpoint and os.path.exists(args.checkpoint) and not args.keep_checkpoint:
+        os.remove(args.checkpoint)
+    return 0
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="python -m backend.bulk_assess", description=__doc__.split("\n\n")[0])
+    p.add_argument("input", help="JSONL/NDJSON or CSV dump (.gz ok), or - for stdin")
+    p.add_argument("-o", "--output", default="-", help="output file (.ndjson/.csv), default stdout")
+    p.add_argument("--format", choices=["ndjson", "csv"], help="output format (default: from extension)")
+    p.add_argument("--input-format", choices=["jsonl", "csv"], help="input format (default: from extension)")
+    p.add_argument("--field", default="ingredients_text", help="ingredients field (text or list)")
+    p.add_argument("--fallback-field", default="ingredients",
+                   help="field used when --field is empty (OFF: list of {text: ...})")
+    p.add_argument("--id-field", default="code", help="product id field")
+    p.add_argument("--policy", default=None, help="policy file (default: POLICY_DIR/POLICY_FILE)")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes; 0 = in-process")
+    p.add_argument("--chunk-size", type=int, default=2000, help="records per worker task")
+    p.add_argument("--columnar", action="store_true", help="score chunks with the NumPy columnar engine (same results; faster only on "
+                        "repetitive vocabularies, measure with python -m backend.bench_columnar)")
+    p.add_argument("--checkpoint", help="checkpoint file for resumable runs")
+    p.add_argument("--keep-checkpoint", action="store_true", help="keep the checkpoint after success")
+    p.add_argument("--progress-every", type=float, default=5.0, help="seconds between throughput reports")
+    p.add_argument("-q", "--quiet", action="store_true")
+    return p
+
+def main(argv: Optional[List[str]] = None) -> int:
+    return run(build_parser().parse_args(argv))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,238 @@
+# backend/columnar.py
+"""
+Columnar scoring engine for large offline batches (nightly catalog re-scoring).
+
+Tokens are mapped to integer ids through the compiled policy vocabulary, the
+per-token category masks live in NumPy arrays, and per-product category
+aggregates, scores and verdicts come from vectorized reductions. Results are
+identical to PolicyEngine.assess / assess_tokens.
+
+Tokens seen in a corpus are interned on top of the policy vocabulary and the
+mask tables are extended for the new ids only. Once more than
+COLUMNAR_VOCAB_MAX tokens are interned, the next corpus starts again from the
+policy vocabulary, so a long-lived assessor stays bounded on high-cardinality
+dumps. `python -m backend.bench_columnar` measures it against assess_many.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+from itertools import chain
+import os
+import numpy as np
+
+from .policy_engine import (
+    PolicyEngine, ADDITIVE_SHIFT, CAT_ALLERGEN, CAT_ANIMAL, CAT_DENY, CAT_E_NUMBER,
+    CAT_HARD_ANY, CAT_TRACE, CAT_UNCHECKED, _E_NUM_RE,
+)
+
+_NO_ADDITIVE = np.iinfo(np.int64).max
+_CAT_BITS = (1 << ADDITIVE_SHIFT) - 1
+COLUMNAR_VOCAB_MAX = int(os.getenv("COLUMNAR_VOCAB_MAX", "200000"))
+
+
+class ColumnarAssessor:
+    """Vectorized scorer bound to one compiled PolicyEngine; the vocabulary grows as new tokens are seen."""
+
+    def __init__(self, engine: PolicyEngine, max_vocab: int = COLUMNAR_VOCAB_MAX):
+        self.engine = engine
+        self.max_vocab = max_vocab
+        self.tokens: List[str] = []
+        self.vocab: Dict[str, int] = {}
+        self._masks: List[int] = []
+        self._raw: Dict[str, int] = {}  # raw token -> id (-1: normalizes to nothing)
+        self._fixes: Dict[str, str] = {}  # raw token -> fuzzy "typo->term" note
+        self._expand: Dict[str, Tuple[int, ...]] = {}  # raw token -> ids of embedded multi-word terms
+        # per-id tables, filled up to _built and grown geometrically
+        self._cats = np.zeros(0, dtype=np.int64)
+        self._first_add = np.zeros(0, dtype=np.int64)
+        self._built = 0
+        for t in engine.index:
+            self._intern(t)
+        self._base = len(self.tokens)
+
+    def reset(self) -> None:
+        """Forget every token learned from corpora; the policy vocabulary (and its table rows) stays."""
+        base = self._base
+        for t in self.tokens[base:]:
+            del self.vocab[t]
+        del self.tokens[base:]
+        del self._masks[base:]
+        self._raw.clear()
+        self._fixes.clear()
+        self._expand.clear()
+        self._built = min(self._built, base)
+
+    def _intern(self, t: str) -> int:
+        tid = self.vocab.get(t)
+        if tid is None:
+            tid = self.vocab[t] = len(self.tokens)
+            self.tokens.append(t)
+            self._masks.append(self.engine.mask_of(t))
+        return tid
+
+    def encode(self, token_lists: Iterable[List[str]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Flatten labels into (token ids, per-label start offsets with a final end offset).
+        Multi-word policy terms found inside a token are appended right after it.
+        """
+        lists = [tokens or [] for tokens in token_lists]
+        raw_offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, lists), dtype=np.int64, count=len(lists)), out=raw_offsets[1:])
+        flat = list(chain.from_iterable(lists))
+        raw_ids = self._raw
+        try:
+            unseen = {t for t in flat if t not in raw_ids}
+        except TypeError:  # unhashable tokens: fall back to their string form
+            flat = [t if isinstance(t, str) else str(t) for t in flat]
+            unseen = {t for t in flat if t not in raw_ids}
+        for key in unseen:
+            t, fix = self.engine.resolve(key)
+            raw_ids[key] = -1 if t is None else self._intern(t)
+            if fix:
+                self._fixes[key if isinstance(key, str) else str(key)] = fix
+            extra = self.engine.embedded_terms(t) if t is not None else ()
+            if extra:
+                self._expand[key] = tuple(self._intern(e) for e in extra)
+        expand = self._expand
+        if expand and any(k in expand for k in flat):
+            # embedded terms follow their token, so every label's slice grows accordingly
+            groups = [((raw_ids[k],) if raw_ids[k] >= 0 else ()) + expand.get(k, ()) for k in flat]
+            ends = np.zeros(len(flat) + 1, dtype=np.int64)
+            np.cumsum(np.fromiter(map(len, groups), dtype=np.int64, count=len(groups)), out=ends[1:])
+            ids = np.fromiter(chain.from_iterable(groups), dtype=np.int64, count=int(ends[-1]))
+            return ids, ends[raw_offsets]
+        ids = np.fromiter(map(raw_ids.__getitem__, flat), dtype=np.int64, count=len(flat))
+        # drop tokens that normalize to nothing and shift offsets accordingly
+        keep = ids >= 0
+        if keep.all():
+            return ids, raw_offsets
+        kept = np.zeros(len(flat) + 1, dtype=np.int64)
+        np.cumsum(keep, out=kept[1:])
+        return ids[keep], kept[raw_offsets]
+
+    def _tables(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Per-id category bits and index of the first configured additive the token names."""
+        n, built = len(self._masks), self._built
+        if n > built:
+            if n > len(self._cats):
+                size = max(n, 2 * len(self._cats))
+                for name in ("_cats", "_first_add"):
+                    grown = np.empty(size, dtype=np.int64)
+                    grown[:built] = getattr(self, name)[:built]
+                    setattr(self, name, grown)
+            new = self._masks[built:]  # only ids interned since the last call
+            self._cats[built:n] = np.fromiter((m & _CAT_BITS for m in new), dtype=np.int64, count=n - built)
+            self._first_add[built:n] = np.fromiter(
+                (((m >> ADDITIVE_SHIFT) & -(m >> ADDITIVE_SHIFT)).bit_length() - 1
+                 if m >> ADDITIVE_SHIFT else _NO_ADDITIVE for m in new),
+                dtype=np.int64, count=n - built,
+            )
+            self._built = n
+        return self._cats[:n], self._first_add[:n]
+
+    def _fuzzy_fixes(self, lists: List[List[str]]) -> Dict[int, List[str]]:
+        """Per-label fuzzy corrections (label index -> notes) for labels that had any."""
+        fixes = self._fixes
+        out: Dict[int, List[str]] = {}
+        if not fixes:
+            return out
+        for i, tokens in enumerate(lists):
+            notes = [fixes[k] for k in (t if isinstance(t, str) else str(t) for t in tokens) if k in fixes]
+            if notes:
+                out[i] = notes
+        return out
+
+    def assess_corpus(self, token_lists: Iterable[List[str]]) -> List[Tuple[int, str, List[Dict]]]:
+        if len(self.tokens) > self.max_vocab:
+            self.reset()
+        lists = [tokens or [] for tokens in token_lists]
+        ids, offsets = self.encode(lists)
+        n = len(offsets) - 1
+        if n <= 0:
+            return []
+        eng = self.engine
+        fuzzy = self._fuzzy_fixes(lists) if eng.fuzzy_index is not None else {}
+        cats, first_add = self._tables()
+        starts, ends = offsets[:-1], offsets[1:]
+        nonempty = ends > starts
+
+        # ---- per-product reductions ----
+        agg = np.zeros(n, dtype=np.int64)
+        add_idx = np.full(n, _NO_ADDITIVE, dtype=np.int64)
+        enum_pos = np.full(n, _NO_ADDITIVE, dtype=np.int64)
+        if ids.size:
+            tok_cats = cats[ids]
+            seg = starts[nonempty]
+            agg[nonempty] = np.bitwise_or.reduceat(tok_cats, seg)
+            add_idx[nonempty] = np.minimum.reduceat(first_add[ids], seg)
+            pos = np.where(tok_cats & CAT_E_NUMBER, np.arange(ids.size, dtype=np.int64), _NO_ADDITIVE)
+            enum_pos[nonempty] = np.minimum.reduceat(pos, seg)
+
+        # ---- vectorized soft scoring (products without hard/deny hits) ----
+        def has(bit: int) -> np.ndarray:
+            return (agg & bit) != 0
+
+        trace, allergen, animal = has(CAT_TRACE), has(CAT_ALLERGEN), has(CAT_ANIMAL)
+        additive = (add_idx != _NO_ADDITIVE) | has(CAT_E_NUMBER)
+        unknown = ~(trace | allergen | animal | additive)
+        scores = (trace * eng.w_trace + allergen * eng.w_allergen + animal * eng.w_vegan
+                  + additive * eng.w_add + unknown * eng.w_unknown).astype(np.int64)
+        verdicts = np.where(scores >= eng.avoid_th, 2, np.where(scores >= eng.caution_th, 1, 0))
+        slow = has(CAT_HARD_ANY) | has(CAT_DENY) | has(CAT_UNCHECKED)
+        if fuzzy:
+            slow[list(fuzzy)] = True
+
+        # ---- assemble results ----
+        # labels without trace hits share one reasons layout per (flags, additive param)
+        flags = trace * 1 + allergen * 2 + animal * 4 + unknown * 8
+        enum_tok = np.full(n, -1, dtype=np.int64)
+        has_enum = enum_pos != _NO_ADDITIVE
+        enum_tok[has_enum] = ids[enum_pos[has_enum]]
+        param = np.where(add_idx != _NO_ADDITIVE, add_idx, np.where(enum_tok >= 0, -2 - enum_tok, -1))
+        names = ("safe", "caution", "avoid")
+        tokens, masks = self.tokens, self._masks
+        layouts: Dict[Tuple[int, int], Tuple[Tuple[str, str], ...]] = {}
+        out: List[Tuple[int, str, List[Dict]]] = []
+        rows = zip(scores.tolist(), verdicts.tolist(), flags.tolist(), param.tolist(),
+                   slow.tolist(), starts.tolist(), ends.tolist())
+        for i, (score, verdict, fl, pk, is_slow, lo, hi) in enumerate(rows):
+            if is_slow:
+                # hard overrides / deny patterns / fuzzy and unchecked-token notes need per-token handling
+                seg_ids = ids[lo:hi].tolist()
+                seg_masks = [masks[t] for t in seg_ids]
+                m = 0
+                for x in seg_masks:
+                    m |= x
+                out.append(eng.score([tokens[t] for t in seg_ids], seg_masks, m, fuzzy.get(i)))
+                continue
+            layout = layouts.get((fl, pk))
+            if layout is None:
+                layout = layouts[(fl, pk)] = self._layout(fl, pk)
+            reasons = [{"code": c, "param": p} for c, p in layout]
+            if fl & 1:
+                hits = {tokens[t] for t in ids[lo:hi].tolist() if masks[t] & CAT_TRACE}
+                reasons.insert(0, {"code": "TRACE_ALLERGEN", "param": ", ".join(sorted(hits))})
+            out.append((score, names[verdict], reasons))
+        return out
+
+    def _layout(self, flags: int, param: int) -> Tuple[Tuple[str, str], ...]:
+        """Soft-scoring reasons (after any TRACE_ALLERGEN) for a flags/additive-param combination."""
+        out = []
+        if flags & 2:
+            out.append(("ALLERGEN_MATCH", "major_allergen"))
+        if flags & 4:
+            out.append(("VEGAN_CONFLICT", "animal"))
+        if param >= 0:
+            out.append(("ADDITIVE_FLAG", self.engine.additives[param][0]))
+        elif param <= -2:
+            t = self.tokens[-2 - param]
+            out.append(("ADDITIVE_FLAG", t.upper() if _E_NUM_RE.match(t) else t))
+        if flags & 8:
+            out.append(("UNKNOWN", "none"))
+        return tuple(out)
+
+
+def assess_corpus(token_lists: Iterable[List[str]], engine: Optional[PolicyEngine] = None):
+    """Convenience wrapper: columnar assessment with the active (or given) compiled policy."""
+    if engine is None:
+        from .policy_engine import get_engine
+        engine = get_engine()
+    return ColumnarAssessor(engine).assess_corpus(token_lists)
@@ -0,0 +1,71 @@
+# backend/compile_policy.py
+"""
+Precompile policy files into binary snapshots for fast cold starts.
+
+    python -m backend.compile_policy                      # every policy in POLICY_DIR
+    python -m backend.compile_policy backend/policies/policy_v2.json
+    python -m backend.compile_policy --check              # exit 1 if a snapshot is missing or stale
+
+Each <policy>.json gets a <policy>.json.snapshot next to it. Workers load the
+snapshot (mmap + unpickle) instead of compiling the JSON; a snapshot whose policy
+bytes or engine code no longer match is ignored and the JSON is compiled instead.
+"""
+from typing import List, Optional
+import argparse, glob, hashlib, json, os, sys, time
+
+from .policy_engine import PolicyEngine, read_snapshot, snapshot_path, write_snapshot
+
+
+def _policy_files(paths: List[str]) -> List[str]:
+    if paths:
+        return paths
+    pdir = os.getenv("POLICY_DIR", "backend/policies")
+    return sorted(glob.glob(os.path.join(pdir, "*.json")))
+
+def compile_file(path: str, out: Optional[str] = None) -> str:
+    """Compile one policy file and write its snapshot; returns a one-line report."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    started = time.perf_counter()
+    engine = PolicyEngine(json.loads(raw.decode("utf-8")), fingerprint=hashlib.sha256(raw).hexdigest())
+    compiled_ms = (time.perf_counter() - started) * 1000
+    target = out or snapshot_path(path)
+    size = write_snapshot(engine, raw, target)
+    started = time.perf_counter()
+    read_snapshot(target, hashlib.sha256(raw).digest())
+    loaded_ms = (time.perf_counter() - started) * 1000
+    return (f"{path} -> {target} ({size / 1024:.1f} KiB; compile {compiled_ms:.1f} ms, "
+            f"snapshot load {loaded_ms:.1f} ms)")
+
+def is_current(path: str) -> bool:
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).digest()
+    return read_snapshot(snapshot_path(path), digest) is not None
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="python -m backend.compile_policy", description=__doc__.split("\n\n")[0])
+    p.add_argument("policies", nargs="*", help="policy JSON files (default: every *.json in POLICY_DIR)")
+    p.add_argument("-o", "--output", help="snapshot path (single policy only)")
+    p.add_argument("--check", action="store_true", help="only verify that snapshots are current")
+    return p
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    files = _policy_files(args.policies)
+    if not files:
+        print("[compile_policy] no policy files found", file=sys.stderr)
+        return 1
+    if args.output and len(files) != 1:
+        raise SystemExit("--output needs exactly one policy file")
+    if args.check:
+        stale = [f for f in files if not is_current(f)]
+        for f in stale:
+            print(f"[compile_policy] stale or missing snapshot: {f}", file=sys.stderr)
+        return 1 if stale else 0
+    for f in files:
+        print(f"[compile_policy] {compile_file(f, args.output)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
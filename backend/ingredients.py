@@ -0,0 +1,138 @@
+# backend/ingredients.py
+"""
+Ingredient-text tokenizer.
+
+Turns label text (typically OCR output) into ingredient tokens:
+  - skips everything before an "Ingredients:" / "Ingrédients:" / "Ingrediënten:" header
+  - splits on commas, semicolons and sentence-ending periods, keeping decimals ("3,5%")
+  - flattens nested parentheses: "chocolate (sugar, cocoa butter, milk)"
+    -> "chocolate", "sugar", "cocoa butter", "milk"
+  - drops percentages and footnote marks, and normalizes E-numbers ("E 322", "e-322" -> "E322")
+  - strips allergen declaration prefixes ("Contains: milk", "Bevat: melk" -> "milk", "melk")
+    but keeps precautionary statements ("may contain nuts") whole
+  - a list without any comma or semicolon is split one ingredient per line
+
+iter_ingredients is a generator over text chunks, so the bulk paths can feed
+large inputs without joining them first.
+"""
+from typing import Iterable, Iterator, List, Optional, Union
+import re, unicodedata
+
+_HEADER_RE = re.compile(
+    r"\b(?:ingredients?|ingr[ée]dients?|ingredi[ëe]nten|zutaten|ingredientes)\s*[:：]", re.IGNORECASE
+)
+_HEADER_SCAN_LIMIT = 4096  # header must appear within the first N characters
+_PERCENT_RE = re.compile(r"[<>≤≥]?\s*\d+(?:[.,]\d+)?\s*%")
+_E_NUMBER_RE = re.compile(r"^e\s*[-‐–]?\s*(\d{3,4})\s*([a-z])?(?:\s*\(?[ivx]+\)?)?$", re.IGNORECASE)
+_CLASS_RE = re.compile(r"^([^:：]{1,40})[:：]\s*(.+)$")
+# precautionary statements stay one token so the trace patterns see them whole
+_KEEP_CLASS_RE = re.compile(
+    r"\b(?:may|can|might)\s+contain|peut\s+contenir|kann\s+.*enthalten|kan\s+.*bevatten|"
+    r"traces?|sporen|spuren|puede\s+contener", re.IGNORECASE)
+# "Contains: milk" / "Bevat melk": the declared allergen is the ingredient
+_DECLARATION_RE = re.compile(
+    r"^(?:contains?|contient|bevat|enth[äa]lt|contiene|cont[ée]m)\b\s*[:：]?\s*", re.IGNORECASE)
+_ROMAN_RE = re.compile(r"^[ivx]{1,4}$", re.IGNORECASE)  # "E322(ii)" sub-numbers
+_OPEN, _CLOSE = "([{", ")]}"
+_SEPARATORS = ",;"
+
+
+def _clean(item: str) -> Optional[str]:
+    s = _PERCENT_RE.sub(" ", item)
+    s = s.replace("*", " ").replace("_", " ")
+    s = " ".join(s.split()).strip(" .:-–·")
+    if not s:
+        return None
+    if _KEEP_CLASS_RE.search(s):
+        return s  # "may contain: nuts", "traces of hazelnut"
+    s = _DECLARATION_RE.sub("", s)
+    # class prefix: "emulsifier: soy lecithin" -> "soy lecithin"
+    m = _CLASS_RE.match(s)
+    if m:
+        s = m.group(2).strip(" .:-–")
+    if not s or _ROMAN_RE.match(s):
+        return None
+    m = _E_NUMBER_RE.match(s)
+    if m:
+        return "E" + m.group(1) + (m.group(2) or "").lower()
+    if not any(ch.isalpha() for ch in s):
+        return None
+    return s
+
+
+def _chars(text: Union[str, Iterable[str]]) -> Iterator[str]:
+    """Yield NFC-normalized characters, skipping anything before an ingredients header."""
+    chunks = [text] if isinstance(text, str) else text
+    head = ""
+    it = iter(chunks)
+    for chunk in it:
+        head += unicodedata.normalize("NFC", chunk)
+        if len(head) >= _HEADER_SCAN_LIMIT:
+            break
+    m = _HEADER_RE.search(head[:_HEADER_SCAN_LIMIT])
+    yield from head[m.end():] if m else head
+    for chunk in it:
+        yield from unicodedata.normalize("NFC", chunk)
+
+
+def iter_ingredients(text: Union[str, Iterable[str]]) -> Iterator[str]:
+    """Stream ingredient tokens from label text (a string or an iterable of text chunks)."""
+    stack: List[List[str]] = [[]]  # one buffer per open parenthesis level
+    pending = ""  # "," after a digit or any ".": decimal/abbreviation or separator, decided by the next char
+    separated = False  # a "," or ";" was seen: line breaks are wrapping, not separators
+
+    def flush() -> List[str]:
+        buf = stack[-1]
+        raw = "".join(buf)
+        buf.clear()
+        lines = [raw.replace("\n", " ")] if separated else raw.split("\n")
+        return [item for item in map(_clean, lines) if item]
+
+    for ch in _chars(text):
+        if pending:
+            if ch.isdigit():
+                stack[-1].append(pending)
+                stack[-1].append(ch)
+                pending = ""
+                continue
+            is_sep = pending == "," or ch.isspace()
+            if not is_sep:
+                stack[-1].append(pending)
+            pending = ""
+            if is_sep:
+                separated = separated or pending == ","
+                yield from flush()
+        if ch in _SEPARATORS or ch == ".":
+            buf = stack[-1]
+            # "." only separates before whitespace / end; "," between digits is a decimal
+            if ch == "." or (ch == "," and buf and buf[-1].isdigit()):
+                pending = ch
+                continue
+            separated = True
+            yield from flush()
+        elif ch in _OPEN:
+            yield from flush()  # parent name comes before its sub-ingredients
+            stack.append([])
+        elif ch in _CLOSE:
+            yield from flush()
+            if len(stack) > 1:
+                stack.pop()
+        elif ch in "\r\n":
+            stack[-1].append("\n")
+        elif ch == "\t":
+            stack[-1].append(" ")
+        else:
+            stack[-1].append(ch)
+
+    if pending == ",":
+        pending = ""
+    while stack:
+        if pending:
+            stack[-1].append(pending)
+            pending = ""
+        yield from flush()
+        stack.pop()
+
+
+def split_ingredients(text: Union[str, Iterable[str]]) -> List[str]:
+    return list(iter_ingredients(text))
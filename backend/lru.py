@@ -0,0 +1,72 @@
+# backend/lru.py
+"""
+Small thread-safe LRU cache with an optional per-entry TTL and hit/miss counters.
+"""
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+from collections import OrderedDict
+import threading, time
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Bounded mapping: least recently used entries are evicted first, expired ones on access."""
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = max(0, int(maxsize))
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING:
+                expires, value = item
+                if expires >= self._clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if not self.maxsize:
+            return
+        expires = self._clock() + self.ttl if self.ttl else float("inf")
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Value without touching recency, expiry or the hit/miss counters."""
+        item = self._data.get(key, _MISSING)
+        return default if item is _MISSING else item[1]
+
+    def keys(self) -> List[Hashable]:
+        with self._lock:
+            return list(self._data)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+        return default if item is _MISSING else item[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits,
+                "misses": self.misses, "hit_ratio": self.hits / total if total else 0.0}
@@ -0,0 +1,317 @@
+# backend/matchers.py
+"""
+Multi-pattern matchers built at policy compile time.
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from collections import deque
+import re
+
+try:  # Python 3.11+
+    from re import _parser as _sre_parse, _constants as _sre_c
+except ImportError:  # pragma: no cover - older interpreters
+    import sre_parse as _sre_parse, sre_constants as _sre_c
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton: finds every occurrence of every pattern in one
+    left-to-right pass over the text, independent of the number of patterns.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: Tuple[str, ...] = tuple(sorted({p for p in patterns if p}))
+        # node 0 is the root; each node: goto transitions, fail link, output pattern ids
+        goto: List[Dict[str, int]] = [{}]
+        out: List[Tuple[int, ...]] = [()]
+        for pid, pat in enumerate(self.patterns):
+            node = 0
+            for ch in pat:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][ch] = nxt
+                    goto.append({})
+                    out.append(())
+                node = nxt
+            out[node] = out[node] + (pid,)
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in goto[node].items():
+                queue.append(nxt)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                cand = goto[f].get(ch, 0)
+                fail[nxt] = cand if cand != nxt else 0
+                # inherit outputs of the longest proper suffix that is also a pattern
+                out[nxt] = out[nxt] + out[fail[nxt]]
+            # (root children keep fail = 0)
+
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """Yield (start_offset, pattern) for every occurrence in text."""
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self.patterns
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for pid in out[node]:
+                pat = patterns[pid]
+                yield i - len(pat) + 1, pat
+
+    def iter_word_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """Like iter_matches, but only occurrences that start and end on word boundaries."""
+        n = len(text)
+        for start, pat in self.iter_matches(text):
+            end = start + len(pat)
+            if (start == 0 or not text[start - 1].isalnum()) and (end == n or not text[end].isalnum()):
+                yield start, pat
+
+    def scan(self, texts: Iterable[str]) -> List[Tuple[int, int, str]]:
+        """Scan many texts; return (text_index, start_offset, pattern) for every hit."""
+        hits = []
+        for idx, text in enumerate(texts):
+            for start, pat in self.iter_matches(text):
+                hits.append((idx, start, pat))
+        return hits
+
+
+# ---------- Fused regex groups ----------
+_LEADING_FLAGS_RE = re.compile(r"^\(\?([aiLmsux]+)\)")
+
+def _walk(items):
+    """Yield every (op, av) of a parsed pattern, descending into nested groups."""
+    for op, av in items:
+        yield op, av
+        for sub in (av if isinstance(av, (list, tuple)) else ()):
+            if isinstance(sub, _sre_parse.SubPattern):
+                yield from _walk(sub)
+            elif isinstance(sub, (list, tuple)):
+                for x in sub:
+                    if isinstance(x, _sre_parse.SubPattern):
+                        yield from _walk(x)
+
+def nested_quantifiers(pattern: str, flags: int = re.IGNORECASE) -> bool:
+    """True if an unbounded repeat contains another unbounded repeat (the classic ReDoS shape)."""
+    try:
+        parsed = _sre_parse.parse(pattern, flags)
+    except re.error:
+        return False
+    unbounded = (_sre_c.MAX_REPEAT, _sre_c.MIN_REPEAT)
+    for op, av in _walk(parsed):
+        if op in unbounded and av[1] == _sre_c.MAXREPEAT:
+            if any(o in unbounded and a[1] == _sre_c.MAXREPEAT for o, a in _walk(av[2])):
+                return True
+    return False
+
+def required_literal(pattern: str, flags: int = re.IGNORECASE) -> Optional[str]:
+    """
+    Longest run of literal characters every match must contain (lowercased, ASCII only),
+    or None if the pattern has no such anchor. Only top-level literals are considered.
+    """
+    try:
+        parsed = _sre_parse.parse(pattern, flags)
+    except re.error:
+        return None
+    best, run = "", []
+    for op, av in list(parsed) + [(None, None)]:
+        if op is _sre_c.LITERAL and av < 128:
+            run.append(chr(av).lower())
+            continue
+        if len(run) > len(best):
+            best = "".join(run)
+        run = []
+    return best or None
+
+class PatternSet:
+    """
+    A group of policy regexes evaluated as one: valid patterns are fused into a
+    single alternation with one named group per pattern, and a literal prefilter
+    lets tokens that cannot match skip the regex engine entirely.
+
+    Patterns with nested unbounded quantifiers are withheld: `re` cannot time out
+    a single search, and one such search can backtrack for seconds. They are
+    listed in `withheld` so callers can treat the group as not fully evaluated.
+    """
+
+    def __init__(self, patterns: Iterable[str], flags: int = re.IGNORECASE):
+        compiled, withheld = [], []
+        for p in (patterns or []):
+            try:
+                rx = re.compile(p, flags)
+            except re.error:
+                continue
+            if nested_quantifiers(rx.pattern, rx.flags):
+                withheld.append(rx.pattern)
+                continue
+            compiled.append(rx)
+        self.compiled: Tuple[re.Pattern, ...] = tuple(compiled)
+        self.withheld: Tuple[str, ...] = tuple(withheld)
+
+        fused, residual = [], []
+        for i, rx in enumerate(compiled):
+            body = self._fusable_body(rx)
+            if body is None:
+                residual.append(rx)
+            else:
+                fused.append(f"(?P<p{i}>{body})")
+        self._fused = None
+        if fused:
+            try:
+                self._fused = re.compile("|".join(fused), flags)
+            except re.error:
+                residual = list(compiled)
+        self._residual: Tuple[re.Pattern, ...] = tuple(residual)
+
+        lits = [required_literal(rx.pattern, rx.flags) for rx in compiled]
+        self.literals: Optional[Tuple[str, ...]] = tuple(lits) if lits and all(lits) else None
+
+    @staticmethod
+    def _fusable_body(rx: "re.Pattern") -> Optional[str]:
+        """Pattern source usable inside a larger alternation, or None (backrefs, named groups, a/L/u flags)."""
+        if rx.groupindex:
+            return None
+        try:
+            parsed = _sre_parse.parse(rx.pattern, rx.flags)
+        except re.error:
+            return None
+        if any(op in (_sre_c.GROUPREF, _sre_c.GROUPREF_EXISTS) for op, _ in _walk(parsed)):
+            return None
+        src = rx.pattern
+        m = _LEADING_FLAGS_RE.match(src)
+        if m:
+            if set(m.group(1)) - set("imsx"):
+                return None
+            # keep a verbose-mode trailing comment from swallowing the closing paren
+            tail = "\n" if "x" in m.group(1) else ""
+            src = f"(?{m.group(1)}:{src[m.end():]}{tail})"
+        return src
+
+    def __len__(self) -> int:
+        return len(self.compiled) + len(self.withheld)
+
+    def _may_match(self, text: str) -> bool:
+        lits = self.literals
+        # the prefilter is exact only for ASCII text (IGNORECASE folds e.g. "ſ" to "s")
+        if lits is None or not text.isascii():
+            return True
+        if not text.islower():
+            text = text.lower()
+        return any(lit in text for lit in lits)
+
+    def search(self, text: str) -> bool:
+        """True if any pattern in the group matches somewhere in text."""
+        if not self.compiled or not self._may_match(text):
+            return False
+        if self._fused is not None and self._fused.search(text):
+            return True
+        return any(rx.search(text) for rx in self._residual)
+
+    def which(self, text: str) -> Optional[str]:
+        """Source of a pattern that matches text (the leftmost fused hit first), else None."""
+        if not self.compiled or not self._may_match(text):
+            return None
+        if self._fused is not None:
+            m = self._fused.search(text)
+            if m:
+                return self.compiled[int(m.lastgroup[1:])].pattern
+        for rx in self._residual:
+            if rx.search(text):
+                return rx.pattern
+        return None
+
+
+# ---------- Fuzzy lookup ----------
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Optimal-string-alignment (Damerau-Levenshtein) distance between a and b,
+    computed in a diagonal band; returns max_distance + 1 once the bound is exceeded.
+    """
+    if a == b:
+        return 0
+    la, lb = len(a), len(b)
+    if abs(la - lb) > max_distance:
+        return max_distance + 1
+    big = max_distance + 1
+    prev2: List[int] = []
+    prev = list(range(lb + 1))
+    for i in range(1, la + 1):
+        cur = [big] * (lb + 1)
+        cur[0] = i
+        lo, hi = max(1, i - max_distance), min(lb, i + max_distance)
+        ai = a[i - 1]
+        row_min = cur[0] if lo == 1 else big
+        for j in range(lo, hi + 1):
+            cost = 0 if ai == b[j - 1] else 1
+            v = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and ai == b[j - 2] and a[i - 2] == b[j - 1]:
+                v = min(v, prev2[j - 2] + 1)
+            cur[j] = v
+            if v < row_min:
+                row_min = v
+        if row_min > max_distance:
+            return big
+        prev2, prev = prev, cur
+    return min(prev[lb], big)
+
+def _deletes(word: str, max_distance: int) -> set:
+    out = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        nxt = set()
+        for w in frontier:
+            for i in range(len(w)):
+                nxt.add(w[:i] + w[i + 1:])
+        nxt -= out
+        out |= nxt
+        frontier = nxt
+    return out
+
+class SymSpell:
+    """
+    Symmetric-delete index (SymSpell) over a fixed vocabulary: every term's
+    deletions (of its first prefix_length chars, up to max_distance) are
+    precomputed, so a lookup only generates deletions of the query and verifies
+    the few candidates that share one, instead of scanning the vocabulary.
+    """
+
+    def __init__(self, terms: Iterable[str], max_distance: int = 2, prefix_length: int = 7):
+        self.max_distance = max_distance
+        self.prefix_length = max(prefix_length, max_distance + 1)
+        self.terms = frozenset(t for t in terms if t)
+        index: Dict[str, List[str]] = {}
+        for term in self.terms:
+            for d in _deletes(term[:self.prefix_length], max_distance):
+                index.setdefault(d, []).append(term)
+        self._index = index
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def lookup(self, word: str, max_distance: Optional[int] = None) -> Optional[Tuple[str, int]]:
+        """Closest term within max_distance as (term, distance); ties go to the lexicographically smallest."""
+        d_max = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        if word in self.terms:
+            return word, 0
+        best: Optional[Tuple[int, str]] = None
+        seen = set()
+        for d in _deletes(word[:self.prefix_length], d_max):
+            for term in self._index.get(d, ()):
+                if term in seen:
+                    continue
+                seen.add(term)
+                bound = best[0] if best else d_max
+                dist = edit_distance(word, term, bound)
+                if dist <= bound and (best is None or (dist, term) < best):
+                    best = (dist, term)
+        return (best[1], best[0]) if best else None
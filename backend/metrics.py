@@ -0,0 +1,254 @@
+# backend/metrics.py
+"""
+In-process metrics: counters, gauges, histograms and per-request phase timers,
+rendered in the Prometheus text format (see api_metrics for GET /metrics).
+
+Phase timing is off unless ASSESS_PHASE_TIMING=1. When a request runs inside
+phase_timing(), the assessment pipeline records how long each phase took
+(normalize, synonyms, fuzzy, multiword, classify and, within classify, the
+hazard scan, regex patterns and additive matching, then score). The durations
+go out as a Server-Timing header and into the PHASE_SECONDS histogram. When
+timing is off the pipeline only pays one context-variable lookup per call.
+"""
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+import os, threading, time
+
+ASSESS_PHASE_TIMING = os.getenv("ASSESS_PHASE_TIMING", "0").lower() in ("1", "true", "yes")
+
+# seconds; fine-grained at the low end where most phases land
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                   0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+Samples = Dict[Tuple[str, ...], float]
+
+
+class Counter:
+    """
+    Monotonic count per label set. With a callback (returning {labels: value} or
+    a plain number) the values are read at scrape time instead, e.g. from a cache.
+    """
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable[[], Union[float, Samples]]] = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self._values: Samples = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Samples:
+        if self.callback is not None:
+            value = self.callback()
+            return value if isinstance(value, dict) else {(): value}
+        with self._lock:
+            return dict(self._values)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Gauge(Counter):
+    """Current value per label set: set/inc/dec it, or read it from a callback at scrape time."""
+    type = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    """Bucketed observations (Prometheus semantics: le buckets plus sum and count), one series per label set."""
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List] = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            s[i] += 1
+            s[-1] += value
+
+    def series(self) -> Dict[Tuple[str, ...], Dict]:
+        """labels -> {"buckets": [(le, cumulative count)], "count", "sum"}."""
+        out = {}
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for labels, s in items:
+            cumulative, running = [], 0
+            for le, n in zip(self.buckets + (float("inf"),), s[:-1]):
+                running += n
+                cumulative.append((le, running))
+            out[labels] = {"buckets": cumulative, "count": running, "sum": s[-1]}
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+# ---------- registry / exposition ----------
+Metric = Union[Counter, Gauge, Histogram]
+_registry: Dict[str, Metric] = {}
+
+def register(metric: Metric) -> Metric:
+    """Add a metric to the /metrics output (re-registering a name replaces the old metric)."""
+    _registry[metric.name] = metric
+    return metric
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _num(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+def render() -> str:
+    """Every registered metric in the Prometheus text exposition format (version 0.0.4)."""
+    lines: List[str] = []
+    for name in sorted(_registry):
+        metric = _registry[name]
+        try:
+            if isinstance(metric, Histogram):
+                series = metric.series()
+            else:
+                samples = metric.samples()
+        except Exception:  # a failing callback must not take the whole scrape down
+            continue
+        lines.append(f"# HELP {name} {metric.help}")
+        lines.append(f"# TYPE {name} {metric.type}")
+        if isinstance(metric, Histogram):
+            for labels, s in sorted(series.items()):
+                for le, n in s["buckets"]:
+                    le_label = 'le="%s"' % _num(le)
+                    lines.append(f"{name}_bucket{_labels(metric.labelnames, labels, le_label)} {n}")
+                lines.append(f"{name}_sum{_labels(metric.labelnames, labels)} {_num(s['sum'])}")
+                lines.append(f"{name}_count{_labels(metric.labelnames, labels)} {s['count']}")
+        else:
+            for labels, value in sorted(samples.items()):
+                lines.append(f"{name}{_labels(metric.labelnames, labels)} {_num(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------- application metrics ----------
+HTTP_REQUEST_SECONDS = register(Histogram(
+    "foodscanner_http_request_duration_seconds", "HTTP request latency by route template.",
+    ("method", "route", "status")))
+HTTP_IN_FLIGHT = register(Gauge("foodscanner_http_requests_in_flight", "Requests currently being served."))
+HTTP_IN_FLIGHT.set(0)
+VERDICTS = register(Counter("foodscanner_verdicts_total", "Assessment verdicts returned.", ("route", "verdict")))
+OCR_UPSTREAM_SECONDS = register(Histogram(
+    "foodscanner_ocr_upstream_seconds", "Latency of OCR backend calls.", ("outcome",)))
+OCR_PREPROCESS_BYTES = register(Counter(
+    "foodscanner_ocr_preprocess_bytes_total", "Image bytes before (in) and after (out) OCR preprocessing.",
+    ("stage",)))
+OCR_PHASH_DISTANCE = register(Histogram(
+    "foodscanner_ocr_phash_match_distance", "Hamming distance of perceptual-hash OCR matches.",
+    buckets=tuple(range(17))))
+OCR_PHASH_VERIFIED = register(Counter(
+    "foodscanner_ocr_phash_verified_total",
+    "Perceptual-hash OCR hits re-read to check them (OCR_PHASH_VERIFY_RATE)."))
+OCR_PHASH_FALSE_MATCHES = register(Counter(
+    "foodscanner_ocr_phash_false_matches_total", "Checked perceptual-hash hits whose OCR text differed."))
+PHASE_SECONDS = register(Histogram(
+    "foodscanner_assess_phase_seconds", "Time spent per assessment phase.", ("phase",)))
+
+
+# ---------- phase timers ----------
+class PhaseTimer:
+    """Accumulated seconds per phase for one request (phases may nest: classify includes patterns)."""
+    __slots__ = ("phases",)
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def header(self) -> str:
+        """Server-Timing value, durations in milliseconds."""
+        return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.phases.items())
+
+class Laps:
+    """
+    Back-to-back phases of one code path: laps("name") books the time since the
+    previous lap. Without a timer every call is a no-op, so the timed and untimed
+    paths are the same code.
+    """
+    __slots__ = ("timer", "last")
+
+    def __init__(self, timer: Optional[PhaseTimer]):
+        self.timer = timer
+        self.last = time.perf_counter() if timer is not None else 0.0
+
+    def __call__(self, phase: str) -> None:
+        if self.timer is not None:
+            now = time.perf_counter()
+            self.timer.add(phase, now - self.last)
+            self.last = now
+
+_timer: ContextVar[Optional[PhaseTimer]] = ContextVar("phase_timer", default=None)
+
+def current_timer() -> Optional[PhaseTimer]:
+    return _timer.get()
+
+def timed(phase: str):
+    """Context manager timing one phase of the current request (no-op when timing is off)."""
+    timer = _timer.get()
+    return timer.phase(phase) if timer is not None else nullcontext()
+
+@contextmanager
+def phase_timing(enabled: Optional[bool] = None) -> Iterator[Optional[PhaseTimer]]:
+    """
+    Time the assessment phases run inside the block. Yields None when timing is
+    disabled (ASSESS_PHASE_TIMING unset); on exit the phases feed PHASE_SECONDS.
+    """
+    if not (ASSESS_PHASE_TIMING if enabled is None else enabled):
+        yield None
+        return
+    timer = PhaseTimer()
+    token = _timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _timer.reset(token)
+        for name, seconds in timer.phases.items():
+            PHASE_SECONDS.observe(seconds, name)
@@ -0,0 +1,171 @@
+# backend/ocr_cache.py
+"""
+Two-tier cache of OCR results, keyed by content address.
+
+    key = sha256(backend kind + image bytes)          image uploads / image_base64
+    key = sha256(backend kind + URL)                  image_url, memory only, for OCR_URL_CACHE_TTL s
+
+A URL is never fetched or revalidated by us (that would let clients make the
+server call arbitrary hosts), so its entry simply expires: an image replaced
+behind the same URL is read again after at most OCR_URL_CACHE_TTL seconds.
+
+Tier 1 is an in-process LRU (OCR_CACHE_SIZE entries). Tier 2 is a directory of
+small text files (OCR_CACHE_DIR, default <tmp>/foodscanner-ocr-cache; empty
+disables it) shared by the workers on a host and kept across restarts. Its
+total size is capped at OCR_CACHE_DISK_MAX_BYTES: when a write goes over the
+cap, the least recently used files are removed until it is 10% under.
+"""
+from typing import Any, Dict, Optional
+import hashlib, logging, os, tempfile, threading
+
+from .lru import LRUCache
+
+log = logging.getLogger("ocr_cache")
+
+OCR_CACHE_SIZE = int(os.getenv("OCR_CACHE_SIZE", "512"))
+OCR_CACHE_DISK_MAX_BYTES = int(os.getenv("OCR_CACHE_DISK_MAX_BYTES", str(64 * 1024 * 1024)))
+OCR_URL_CACHE_TTL = float(os.getenv("OCR_URL_CACHE_TTL", "300"))  # 0 disables caching of image_url results
+_DEFAULT_DIR = os.path.join(tempfile.gettempdir(), "foodscanner-ocr-cache")
+
+
+def image_key(kind: str, content: bytes) -> str:
+    return hashlib.sha256(kind.encode("utf-8") + b"\0img\0" + content).hexdigest()
+
+def url_key(kind: str, url: str) -> str:
+    return hashlib.sha256("\0".join((kind, "url", url)).encode("utf-8")).hexdigest()
+
+
+class OcrCache:
+    """Memory LRU in front of a size-capped directory, plus a TTL'd LRU for URLs; counts hits per tier and misses."""
+
+    def __init__(self, maxsize: int = OCR_CACHE_SIZE, directory: Optional[str] = _DEFAULT_DIR,
+                 max_bytes: int = OCR_CACHE_DISK_MAX_BYTES, url_ttl: float = OCR_URL_CACHE_TTL):
+        self.memory = LRUCache(maxsize)
+        self.urls = LRUCache(maxsize if url_ttl > 0 else 0, ttl=url_ttl)
+        self.directory = directory or None
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.memory_hits = self.disk_hits = self.misses = 0
+        self.disk_bytes = 0
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                self.disk_bytes = sum(size for _, _, size in self._files())
+            except OSError as e:
+                log.warning("OCR disk cache disabled (%s): %s", self.directory, e)
+                self.directory = None
+
+    @classmethod
+    def from_env(cls) -> "OcrCache":
+        return cls(directory=os.getenv("OCR_CACHE_DIR", _DEFAULT_DIR))
+
+    # ---- disk tier ----
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _files(self):
+        """(path, last use, size) for every cached file."""
+        for sub in os.scandir(self.directory):
+            if sub.is_dir():
+                for f in os.scandir(sub.path):
+                    if f.is_file() and not f.name.endswith(".tmp"):
+                        st = f.stat()
+                        yield f.path, st.st_mtime, st.st_size
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            os.utime(path)  # mtime doubles as last-use time for eviction
+            return text
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    def _disk_set(self, key: str, text: str) -> None:
+        path = self._path(key)
+        data = text.encode("utf-8")
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)  # atomic: concurrent readers see the old file or the new one
+        except OSError as e:
+            log.warning("OCR disk cache write failed: %s", e)
+            return
+        with self._lock:
+            self.disk_bytes += len(data)
+            over = self.disk_bytes > self.max_bytes
+        if over:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Drop least recently used files until the directory is 10% under the cap (rescanned: other workers write too)."""
+        try:
+            files = sorted(self._files(), key=lambda f: f[1])
+        except OSError:
+            return
+        total = sum(size for _, _, size in files)
+        target = self.max_bytes * 0.9
+        for path, _, size in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        with self._lock:
+            self.disk_bytes = total
+
+    # ---- public API ----
+    def get(self, key: str) -> Optional[str]:
+        text = self.memory.peek(key)
+        if text is not None:
+            self.memory.get(key)  # refresh recency
+            with self._lock:
+                self.memory_hits += 1
+            return text
+        if self.directory:
+            text = self._disk_get(key)
+            if text is not None:
+                self.memory.set(key, text)
+                with self._lock:
+                    self.disk_hits += 1
+                return text
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, text: str) -> None:
+        self.memory.set(key, text)
+        if self.directory:
+            self._disk_set(key, text)
+
+    def get_url(self, key: str) -> Optional[str]:
+        text = self.urls.get(key)
+        with self._lock:
+            if text is None:
+                self.misses += 1
+            else:
+                self.memory_hits += 1
+        return text
+
+    def set_url(self, key: str, text: str) -> None:
+        self.urls.set(key, text)
+
+    def clear(self) -> None:
+        """Forget the memory tiers and the counters (the disk tier is left to its size cap)."""
+        self.memory.clear()
+        self.urls.clear()
+        with self._lock:
+            self.memory_hits = self.disk_hits = self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {"size": len(self.memory) + len(self.urls), "maxsize": self.memory.maxsize, "hits": hits,
+                "misses": self.misses, "hit_ratio": hits / total if total else 0.0,
+                "memory_hits": self.memory_hits, "disk_hits": self.disk_hits,
+                "disk_bytes": self.disk_bytes if self.directory else 0, "disk_max_bytes": self.max_bytes}
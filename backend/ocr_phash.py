@@ -0,0 +1,149 @@
+# backend/ocr_phash.py
+"""
+Near-duplicate image lookup for /v1/ocr: the same label photographed twice a
+second apart has different bytes (so misses ocr_cache) but almost the same
+64-bit difference hash (dHash: 9x8 grayscale thumbnail, one bit per
+left/right brightness comparison).
+
+    OCR_PHASH=1                    enable the layer (off by default)
+    OCR_PHASH_THRESHOLD=4          max Hamming distance counted as "same image"
+    OCR_PHASH_SIZE=2048            hashes remembered (oldest dropped first)
+    OCR_PHASH_VERIFY_RATE=0.05     share of near-duplicate hits still sent to OCR
+                                   and compared, to measure the false-match rate
+
+Lookups use multi-index hashing: the hash is cut into threshold + 1 chunks,
+and by pigeonhole any hash within the threshold agrees exactly on at least one
+chunk, so a query touches one bucket per chunk instead of every entry.
+A larger threshold raises the hit rate and the false-match rate together; the
+verified sample (PhashIndex.stats) is what to tune it against.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
+import io, os, random, threading
+
+from PIL import Image, UnidentifiedImageError
+
+OCR_PHASH = os.getenv("OCR_PHASH", "0").lower() in ("1", "true", "yes")
+OCR_PHASH_THRESHOLD = int(os.getenv("OCR_PHASH_THRESHOLD", "4"))
+OCR_PHASH_SIZE = int(os.getenv("OCR_PHASH_SIZE", "2048"))
+OCR_PHASH_VERIFY_RATE = float(os.getenv("OCR_PHASH_VERIFY_RATE", "0.05"))
+
+HASH_BITS = 64
+
+
+def dhash(content: bytes) -> Optional[int]:
+    """64-bit difference hash of an encoded image, or None when Pillow cannot decode it."""
+    try:
+        with Image.open(io.BytesIO(content)) as img:
+            img.draft("L", (64, 64))  # JPEG: let the decoder downscale, much cheaper than a full decode
+            small = img.convert("L").resize((9, 8), Image.Resampling.BOX)
+    except (UnidentifiedImageError, OSError, ValueError, Image.DecompressionBombError):
+        return None
+    px = small.tobytes()
+    h = 0
+    for row in range(8):
+        base = row * 9
+        for col in range(8):
+            h = (h << 1) | (px[base + col] > px[base + col + 1])
+    return h
+
+
+def _same_text(a: str, b: str) -> bool:
+    return " ".join(a.split()).casefold() == " ".join(b.split()).casefold()
+
+
+class PhashIndex:
+    """Bounded multi-index hash table of (kind, dHash) -> OCR text, with hit and verification counters."""
+
+    def __init__(self, threshold: int = OCR_PHASH_THRESHOLD, maxsize: int = OCR_PHASH_SIZE,
+                 verify_rate: float = OCR_PHASH_VERIFY_RATE):
+        if not 0 <= threshold < HASH_BITS:
+            raise ValueError(f"threshold must be in [0, {HASH_BITS}), got {threshold}")
+        self.threshold = threshold
+        self.maxsize = max(0, int(maxsize))
+        self.verify_rate = min(1.0, max(0.0, verify_rate))
+        n = threshold + 1
+        widths = [HASH_BITS // n + (i < HASH_BITS % n) for i in range(n)]
+        self._chunks: List[Tuple[int, int]] = []  # (shift, mask) per chunk
+        shift = HASH_BITS
+        for w in widths:
+            shift -= w
+            self._chunks.append((shift, (1 << w) - 1))
+        self._tables: List[Dict[int, set]] = [{} for _ in self._chunks]
+        self._entries: "OrderedDict[Tuple[str, int], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        self.verified = self.false_matches = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _parts(self, h: int):
+        return [(h >> shift) & mask for shift, mask in self._chunks]
+
+    def lookup(self, kind: str, h: int) -> Optional[Tuple[str, int]]:
+        """(text, distance) of the closest remembered hash within the threshold, else None."""
+        best: Optional[Tuple[str, int]] = None
+        with self._lock:
+            seen = set()
+            for table, part in zip(self._tables, self._parts(h)):
+                for key in table.get(part, ()):
+                    if key in seen or key[0] != kind:
+                        continue
+                    seen.add(key)
+                    d = bin(key[1] ^ h).count("1")
+                    if d <= self.threshold and (best is None or d < best[1]):
+                        best = (self._entries[key], d)
+                        if d == 0:
+                            break
+            if best is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return best
+
+    def add(self, kind: str, h: int, text: str) -> None:
+        if not self.maxsize:
+            return
+        key = (kind, h)
+        with self._lock:
+            if key in self._entries:
+                self._entries[key] = text
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = text
+            for table, part in zip(self._tables, self._parts(h)):
+                table.setdefault(part, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                old, _ = self._entries.popitem(last=False)
+                for table, part in zip(self._tables, self._parts(old[1])):
+                    bucket = table.get(part)
+                    if bucket is not None:
+                        bucket.discard(old)
+                        if not bucket:
+                            del table[part]
+
+    def should_verify(self) -> bool:
+        return self.verify_rate > 0 and random.random() < self.verify_rate
+
+    def record_verification(self, cached: str, fresh: str) -> bool:
+        """Compare a near-duplicate hit with the real OCR text; True when they agree."""
+        same = _same_text(cached, fresh)
+        with self._lock:
+            self.verified += 1
+            self.false_matches += not same
+        return same
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            for table in self._tables:
+                table.clear()
+            self.hits = self.misses = self.verified = self.false_matches = 0
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits,
+                "misses": self.misses, "hit_ratio": self.hits / total if total else 0.0,
+                "threshold": self.threshold, "verified": self.verified, "false_matches": self.false_matches,
+                "false_match_ratio": self.false_matches / self.verified if self.verified else 0.0}
@@ -0,0 +1,180 @@
+# backend/ocr_upload.py
+"""
+Request bodies for /v1/ocr and /v1/scan. Besides the JSON OcrRequest
+(image_base64 / image_url), both endpoints take the photo as-is:
+
+    Content-Type: image/jpeg (any image/*)     the body is the image; other fields
+                                               (profileId) go in the query string
+    Content-Type: multipart/form-data          an "image" file part, other fields
+                                               as ordinary form fields
+
+Binary bodies skip the 33% base64 inflation and the JSON/str/bytes triple
+copy: the body is streamed once into a list of chunks, the size limit
+(OCR_MAX_UPLOAD_BYTES) is enforced while reading, and the image is joined
+into a single bytes object at the end. Multipart parts are fed straight from
+the stream into python-multipart, so the form never touches a temp file.
+"""
+from typing import Dict, List, Optional, Tuple, Type, TypeVar
+import os
+
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+OCR_MAX_UPLOAD_BYTES = int(os.getenv("OCR_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+IMAGE_FIELD = "image"
+_FORM_FIELDS_MAX_BYTES = 64 * 1024  # non-file form fields, all together
+_MULTIPART_SLACK = 16 * 1024        # boundaries and part headers
+
+M = TypeVar("M", bound=BaseModel)
+
+
+def _too_large(limit: int) -> HTTPException:
+    return HTTPException(413, f"upload too large (max {limit} bytes)")
+
+def _check_length(request: Request, limit: int) -> None:
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > limit:
+        raise _too_large(limit)  # refuse before reading a byte
+
+async def read_body(request: Request, limit: int) -> bytes:
+    """The request body, read once; 413 as soon as it passes limit bytes."""
+    _check_length(request, limit)
+    chunks: List[bytes] = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            raise _too_large(limit)
+        chunks.append(chunk)
+    return chunks[0] if len(chunks) == 1 else b"".join(chunks)
+
+
+class _Form:
+    """python-multipart callbacks: the image part into chunks, small fields into a dict."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.fields: Dict[str, str] = {}
+        self.image: Optional[List[bytes]] = None
+        self.image_size = 0
+        self.field_bytes = 0
+        self._header_field = b""
+        self._header_value = b""
+        self._headers: Dict[bytes, bytes] = {}
+        self._name: Optional[str] = None
+        self._is_file = False
+        self._data: List[bytes] = []
+
+    def callbacks(self) -> Dict:
+        return {"on_part_begin": self.on_part_begin, "on_header_field": self.on_header_field,
+                "on_header_value": self.on_header_value, "on_header_end": self.on_header_end,
+                "on_headers_finished": self.on_headers_finished, "on_part_data": self.on_part_data,
+                "on_part_end": self.on_part_end}
+
+    def on_part_begin(self) -> None:
+        self._headers, self._data, self._name, self._is_file = {}, [], None, False
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name")
+        self._name = name.decode("utf-8", "replace") if name is not None else None
+        self._is_file = b"filename" in options or \
+            self._headers.get(b"content-type", b"").lower().startswith(b"image/")
+        if self._is_file:
+            if self._name != IMAGE_FIELD:
+                raise HTTPException(400, f"unexpected file field {self._name!r} (send the photo as {IMAGE_FIELD!r})")
+            if self.image is not None:
+                raise HTTPException(400, "send one image per request")
+            self.image = self._data
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        n = end - start
+        if self._is_file:
+            self.image_size += n
+            if self.image_size > self.limit:
+                raise _too_large(self.limit)
+        else:
+            self.field_bytes += n
+            if self.field_bytes > _FORM_FIELDS_MAX_BYTES:
+                raise HTTPException(413, "form fields too large")
+        self._data.append(data[start:end])
+
+    def on_part_end(self) -> None:
+        if not self._is_file and self._name is not None:
+            self.fields[self._name] = b"".join(self._data).decode("utf-8", "replace")
+
+
+async def _read_multipart(request: Request, boundary: bytes, limit: int) -> Tuple[Dict[str, str], Optional[bytes]]:
+    raw_limit = limit + _FORM_FIELDS_MAX_BYTES + _MULTIPART_SLACK
+    _check_length(request, raw_limit)
+    form = _Form(limit)
+    parser = MultipartParser(boundary, form.callbacks())
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > raw_limit:
+            raise _too_large(limit)
+        parser.write(chunk)
+    parser.finalize()
+    image = None
+    if form.image is not None:
+        image = form.image[0] if len(form.image) == 1 else b"".join(form.image)
+        form.image = None
+    return form.fields, image
+
+def _validate(model: Type[M], data) -> M:
+    try:
+        return model.model_validate_json(data) if isinstance(data, bytes) else model.model_validate(data)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+async def parse_image_request(request: Request, model: Type[M], limit: Optional[int] = None) -> Tuple[M, Optional[bytes]]:
+    """
+    (model, raw image bytes or None) from a JSON, multipart or image/* body.
+    JSON bodies are limited to the base64 size of a limit-sized image.
+    """
+    limit = OCR_MAX_UPLOAD_BYTES if limit is None else limit
+    ctype, options = parse_options_header(request.headers.get("content-type", ""))
+    ctype = ctype.decode("latin-1").lower()
+    if ctype.startswith("image/"):
+        content = await read_body(request, limit)
+        if not content:
+            raise HTTPException(400, "empty image body")
+        return _validate(model, dict(request.query_params)), content
+    if ctype == "multipart/form-data":
+        boundary = options.get(b"boundary")
+        if not boundary:
+            raise HTTPException(400, "multipart body without a boundary")
+        fields, content = await _read_multipart(request, boundary, limit)
+        if content is not None and not content:
+            raise HTTPException(400, "empty image part")
+        return _validate(model, fields), content
+    body = await read_body(request, limit * 4 // 3 + _FORM_FIELDS_MAX_BYTES)
+    return _validate(model, body), None
+
+def upload_openapi(model: Type[BaseModel]) -> Dict:
+    """openapi_extra documenting the three accepted request bodies of a route that reads them itself."""
+    fields = {k: v for k, v in model.model_json_schema().get("properties", {}).items()
+              if k not in ("image_base64", "image_url")}
+    return {"requestBody": {"required": True, "content": {
+        "application/json": {"schema": model.model_json_schema()},
+        "multipart/form-data": {"schema": {"type": "object", "required": [IMAGE_FIELD], "properties": {
+            IMAGE_FIELD: {"type": "string", "format": "binary"}, **fields}}},
+        "image/*": {"schema": {"type": "string", "format": "binary"}},
+    }}}
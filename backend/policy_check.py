@@ -0,0 +1,316 @@
+# backend/policy_check.py
+"""
+Policy compiler / validator.
+
+    python -m backend.policy_check                       # POLICY_DIR/POLICY_FILE
+    python -m backend.policy_check backend/policies/policy_v3.json --json
+
+Compiles the policy and reports:
+  - invalid regexes and unreadable settings (errors)
+  - duplicate or empty list entries, aliases mapped to several canonicals (warnings)
+  - regex cost: every pattern (and each fused group) is timed in a child process
+    against adversarial inputs of growing length; patterns that time out or scale
+    super-linearly are errors, and so are nested unbounded quantifiers (found
+    statically). Hot reload (validate_engine) repeats only the static checks.
+  - the compiled engine's memory footprint, per component
+
+Exit status is 1 when there are errors (or warnings with --strict), else 0.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+import argparse, json, multiprocessing, re, sys, time, tracemalloc
+
+from .matchers import _sre_c, _sre_parse, _walk, nested_quantifiers, required_literal
+from .policy_engine import PolicyEngine, _as_set, _norm, policy_path, validate_engine
+
+PATTERN_GROUPS = ("trace_allergen_patterns", "deny_patterns", "allow_patterns")
+LIST_KEYS = ("major_allergens", "animal_tokens", "default_unsafe_tokens", "hazardous_chemicals", "unsafe_allowlist")
+SIZES = (1024, 2048, 4096, 8192)
+SUPERLINEAR_RATIO = 24.0  # t(8x input) / t(x): ~8 when linear, ~64 when quadratic
+MIN_MEASURABLE = 0.001  # seconds; below this the ratio is timer noise
+
+
+# ---------- static checks ----------
+def _entries(policy: Dict, key: str) -> List:
+    flat = policy.get(key)
+    nested = (policy.get("tokens", {}) or {}).get(key)
+    return list(flat or []) + list(nested or [])
+
+def check_entries(policy: Dict) -> Tuple[List[str], List[str]]:
+    """(errors, warnings) for token lists, synonyms and additives."""
+    errors: List[str] = []
+    warnings: List[str] = []
+    for key in LIST_KEYS:
+        seen: Dict[str, str] = {}
+        for item in _entries(policy, key):
+            if not isinstance(item, str):
+                errors.append(f"{key}: non-string entry {item!r}")
+                continue
+            n = _norm(item)
+            if not n:
+                warnings.append(f"{key}: empty entry")
+            elif n in seen:
+                warnings.append(f"{key}: duplicate {item!r} (same as {seen[n]!r})")
+            else:
+                seen[n] = item
+
+    owners: Dict[str, str] = {}
+    synonyms = _entries_dict(policy, "synonyms")
+    for canonical, aliases in synonyms.items():
+        for alias in aliases or []:
+            a = _norm(alias)
+            prev = owners.get(a)
+            if prev is not None and prev != _norm(canonical):
+                warnings.append(f"synonyms: {alias!r} maps to both {prev!r} and {canonical!r}")
+            owners[a] = _norm(canonical)
+
+    ids: Dict[str, int] = {}
+    names: Dict[str, str] = {}
+    additives = (policy.get("tokens", {}) or {}).get("additives") or policy.get("additives") or []
+    for i, add in enumerate(additives):
+        if not isinstance(add, dict):
+            errors.append(f"additives[{i}]: expected an object, got {add!r}")
+            continue
+        aid = (add.get("id") or "").strip().upper()
+        if not aid:
+            warnings.append(f"additives[{i}]: missing id")
+        elif aid in ids:
+            warnings.append(f"additives[{i}]: duplicate id {aid} (also additives[{ids[aid]}])")
+        else:
+            ids[aid] = i
+        for name in _as_set(add.get("names") or []):
+            if name in names and names[name] != aid:
+                warnings.append(f"additives[{i}]: name {name!r} also listed under {names[name]}")
+            names.setdefault(name, aid)
+
+    for group in PATTERN_GROUPS:
+        seen_p = set()
+        for i, p in enumerate((policy.get("patterns", {}) or {}).get(group) or []):
+            if p in seen_p:
+                warnings.append(f"patterns.{group}[{i}]: duplicate pattern {p!r}")
+            seen_p.add(p)
+    return errors, warnings
+
+def _entries_dict(policy: Dict, key: str) -> Dict:
+    out = dict(policy.get(key) or {})
+    out.update((policy.get("tokens", {}) or {}).get(key) or {})
+    return out
+
+
+# ---------- dynamic regex cost ----------
+def adversarial_inputs(pattern: str, n: int, flags: int = re.IGNORECASE) -> List[str]:
+    """Long strings built from the pattern's own characters, ending in a character that forces a mismatch."""
+    chars = {"a", " "}
+    try:
+        for op, av in _walk(_sre_parse.parse(pattern, flags)):
+            if op is _sre_c.LITERAL:
+                chars.add(chr(av))
+            elif op is _sre_c.IN:
+                for sub_op, sub_av in av:
+                    if sub_op is _sre_c.LITERAL:
+                        chars.add(chr(sub_av))
+                    elif sub_op is _sre_c.RANGE:
+                        chars.add(chr(sub_av[0]))
+    except re.error:
+        pass
+    inputs = [c * n + "\x00" for c in sorted(chars)[:12]]
+    lit = required_literal(pattern, flags)
+    if lit:
+        inputs.append((lit + " ") * (n // (len(lit) + 1)) + "\x00")
+        inputs.append(lit + " " * n + "\x00")
+    return inputs
+
+def _time_worker(pattern: str, flags: int, sizes: Tuple[int, ...], out) -> None:
+    rx = re.compile(pattern, flags)
+    for n in sizes:
+        worst = 0.0
+        for s in adversarial_inputs(pattern, n, flags):
+            best = float("inf")
+            for _ in range(3):
+                t0 = time.perf_counter()
+                rx.search(s)
+                best = min(best, time.perf_counter() - t0)
+            worst = max(worst, best)
+        out.put((n, worst))
+
+def time_pattern(pattern: str, flags: int = re.IGNORECASE, timeout: float = 2.0,
+                 sizes: Tuple[int, ...] = SIZES) -> Tuple[List[Tuple[int, float]], bool]:
+    """Worst-case search time per input size, measured in a child process; (timings, timed_out)."""
+    ctx = multiprocessing.get_context()
+    q = ctx.Queue()
+    proc = ctx.Process(target=_time_worker, args=(pattern, flags, sizes, q), daemon=True)
+    proc.start()
+    proc.join(timeout)
+    timed_out = proc.is_alive()
+    if timed_out:
+        proc.terminate()
+        proc.join()
+    timings = []
+    while len(timings) < len(sizes):
+        try:
+            timings.append(q.get(timeout=0.05 if timed_out else 1.0))
+        except Exception:
+            break
+    return timings, timed_out
+
+def check_cost(pattern: str, flags: int = re.IGNORECASE, timeout: float = 2.0,
+               budget: float = 0.01) -> Optional[str]:
+    """Problem description for a pattern whose matching cost is not linear or over budget, else None."""
+    timings, timed_out = time_pattern(pattern, flags, timeout)
+    if timed_out:
+        done = f" (reached {timings[-1][0]} chars)" if timings else ""
+        return f"did not finish within {timeout:.1f}s on adversarial input{done}: catastrophic backtracking"
+    if len(timings) < 2:
+        return "could not be timed"
+    (n0, t0), (n1, t1) = timings[0], timings[-1]
+    if t1 >= MIN_MEASURABLE and t1 / max(t0, 1e-7) > SUPERLINEAR_RATIO * (n1 / n0) / 8:
+        return f"super-linear: {t0 * 1000:.2f} ms at {n0} chars -> {t1 * 1000:.2f} ms at {n1} chars"
+    if t1 > budget:
+        return f"slow: {t1 * 1000:.1f} ms at {n1} chars (budget {budget * 1000:.0f} ms)"
+    return None
+
+
+def pattern_checks(engine: PolicyEngine) -> List[Tuple[str, str, int]]:
+    """(where, pattern, flags) for every valid policy pattern and every fused group of an engine."""
+    patterns = engine.policy.get("patterns", {}) or {}
+    checks: List[Tuple[str, str, int]] = []
+    for group in PATTERN_GROUPS:
+        for i, p in enumerate(patterns.get(group) or []):
+            try:
+                rx = re.compile(p, re.IGNORECASE)
+            except (re.error, TypeError):
+                continue  # reported by validate_engine
+            checks.append((f"patterns.{group}[{i}]", rx.pattern, rx.flags))
+    for group, ps in (("trace_allergen_patterns", engine.trace_patterns),
+                      ("deny_patterns", engine.deny_patterns), ("allow_patterns", engine.allow_patterns)):
+        if ps._fused is not None and len(ps.compiled) > 1:
+            checks.append((f"patterns.{group} (fused)", ps._fused.pattern, ps._fused.flags))
+    return checks
+
+def pattern_problems(engine: PolicyEngine, timeout: float = 2.0,
+                     budget: float = 0.01) -> List[Tuple[str, str, Optional[str]]]:
+    """
+    (where, pattern, problem or None) for every check of pattern_checks. Nested
+    unbounded quantifiers are a problem on their own: the engine withholds such
+    patterns (see PatternSet), so they would never run.
+    """
+    out = []
+    for where, pattern, flags in pattern_checks(engine):
+        if nested_quantifiers(pattern, flags):
+            problem = "nested unbounded quantifiers (withheld by the engine)"
+        else:
+            problem = check_cost(pattern, flags, timeout, budget)
+        out.append((where, pattern, problem))
+    return out
+
+
+# ---------- memory ----------
+def deep_sizeof(obj, seen: Optional[set] = None) -> int:
+    """Approximate retained size of an object graph (containers, instances, compiled patterns)."""
+    seen = set() if seen is None else seen
+    stack, total = [obj], 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif hasattr(o, "__dict__") and not isinstance(o, type):
+            stack.append(o.__dict__)
+        elif hasattr(o, "__slots__"):
+            stack.extend(getattr(o, s) for s in o.__slots__ if hasattr(o, s))
+    return total
+
+def footprint(engine: PolicyEngine) -> Dict[str, int]:
+    """Bytes per engine component (largest first); shared objects count once, for the first component."""
+    seen = {id(engine.policy)}
+    parts = {}
+    for name, value in sorted(vars(engine).items()):
+        if name == "policy":
+            continue
+        parts[name] = deep_sizeof(value, seen)
+    return dict(sorted(parts.items(), key=lambda kv: -kv[1]))
+
+
+# ---------- driver ----------
+def check_policy(path: str, timeout: float = 2.0, budget: float = 0.01) -> Dict:
+    report: Dict = {"policy": path, "errors": [], "warnings": [], "patterns": [], "memory": {}}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            policy = json.load(f)
+    except (OSError, ValueError) as e:
+        report["errors"].append(f"cannot read policy: {e}")
+        return report
+
+    errors, warnings = check_entries(policy)
+    report["errors"] += errors
+    report["warnings"] += warnings
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        engine = PolicyEngine(policy)
+    except Exception as e:
+        tracemalloc.stop()
+        report["errors"].append(f"compile failed: {e!r}")
+        return report
+    compile_ms = (time.perf_counter() - t0) * 1000
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    report["errors"] += [e for e in validate_engine(engine) if e not in report["errors"]]
+
+    for where, pattern, problem in pattern_problems(engine, timeout, budget):
+        report["patterns"].append({"where": where, "pattern": pattern, "problem": problem})
+        if problem:
+            message = f"{where} {pattern!r}: {problem}"
+            if message not in report["errors"]:
+                report["errors"].append(message)
+
+    parts = footprint(engine)
+    report["memory"] = {"total_bytes": sum(parts.values()), "allocated_during_compile": allocated,
+                        "compile_ms": round(compile_ms, 2), "components": parts}
+    return report
+
+def _print_report(report: Dict) -> None:
+    print(f"policy: {report['policy']}")
+    for e in report["errors"]:
+        print(f"  ERROR   {e}")
+    for w in report["warnings"]:
+        print(f"  WARNING {w}")
+    ok = sum(1 for p in report["patterns"] if not p["problem"])
+    print(f"  patterns: {ok}/{len(report['patterns'])} within budget")
+    mem = report.get("memory") or {}
+    if mem:
+        print(f"  compiled engine: {mem['total_bytes'] / 1024:.1f} KiB "
+              f"({mem['allocated_during_compile'] / 1024:.1f} KiB allocated, {mem['compile_ms']} ms)")
+        for name, size in list(mem["components"].items())[:8]:
+            print(f"    {name:<22} {size / 1024:8.1f} KiB")
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="python -m backend.policy_check", description=__doc__.split("\n\n")[0])
+    p.add_argument("policies", nargs="*", help="policy JSON files (default: POLICY_DIR/POLICY_FILE)")
+    p.add_argument("--timeout", type=float, default=2.0, help="seconds allowed per pattern before it counts as catastrophic")
+    p.add_argument("--budget-ms", type=float, default=10.0, help="max worst-case search time at 8192 chars")
+    p.add_argument("--strict", action="store_true", help="fail on warnings too")
+    p.add_argument("--json", action="store_true", help="print the reports as JSON")
+    return p
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    paths = args.policies or [policy_path()]
+    reports = [check_policy(p, args.timeout, args.budget_ms / 1000) for p in paths]
+    if args.json:
+        print(json.dumps(reports, indent=2, ensure_ascii=False))
+    else:
+        for r in reports:
+            _print_report(r)
+    failed = any(r["errors"] or (args.strict and r["warnings"]) for r in reports)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,827 @@
+# backend/policy_engine.py
+"""
+Compiled policy engine.
+
+A PolicyEngine is built once from a policy dict: every token list is frozen,
+synonym maps are prebuilt and regexes are precompiled, so assessing a label
+only does the matching work. Engines are cached process-wide (see get_engine).
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+import hashlib, json, logging, mmap, os, pickle, re, struct, threading, time, unicodedata
+
+from .matchers import AhoCorasick, PatternSet, SymSpell, nested_quantifiers
+from .metrics import Laps, current_timer
+
+log = logging.getLogger("policy_engine")
+
+
+# ---------- Policy file location ----------
+def policy_path() -> str:
+    pdir = os.getenv("POLICY_DIR", "backend/policies")
+    explicit = os.getenv("POLICY_FILE")
+    candidates = [explicit] if explicit else ["policy_v2.json"]
+    for name in candidates:
+        if not name:
+            continue
+        path = os.path.join(pdir, name)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"No policy file found in {pdir} (tried: {candidates})")
+
+def load_policy() -> dict:
+    with open(policy_path(), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ---------- Normalization helpers ----------
+def _normalize_token(tok: str, policy: Dict) -> str:
+    norm = policy.get("normalization", {}) or {}
+    s = tok if isinstance(tok, str) else str(tok)
+    if (norm.get("unicode") or "").upper() in {"NFKC", "NFC", "NFKD", "NFD"}:
+        s = unicodedata.normalize(norm["unicode"].upper(), s)
+    if norm.get("trim", True):
+        s = s.strip()
+    if norm.get("lowercase", True):
+        s = s.lower()
+    return s
+
+def _normalize_tokens(tokens: List[str], policy: Dict) -> List[str]:
+    return [_normalize_token(t, policy) for t in tokens or []]
+
+def _norm(s: str) -> str:
+    return (s or "").strip().lower()
+
+def _as_set(items: Iterable[str]) -> set:
+    return {_norm(x) for x in (items or [])}
+
+def _get_set(policy: Dict, flat_key: str, nested_key: str = None, default: Iterable[str] = ()) -> set:
+    """
+    Read a set from EITHER flat (policy[flat_key]) OR nested (policy['tokens'][nested_key or flat_key]).
+    Merge both if present. Fall back to 'default' if neither given.
+    """
+    nested_key = nested_key or flat_key
+    flat_vals = policy.get(flat_key)
+    nested_vals = (policy.get("tokens", {}) or {}).get(nested_key)
+    merged = set()
+    if flat_vals:
+        merged |= _as_set(flat_vals)
+    if nested_vals:
+        merged |= _as_set(nested_vals)
+    if not merged and default:
+        merged = _as_set(default)
+    return merged
+
+def _exists_in_policy(policy: Dict, flat_key: str, nested_key: str = None) -> bool:
+    """Return True if the key is explicitly present (non-empty) in flat or nested schema."""
+    nested_key = nested_key or flat_key
+    if flat_key in policy and policy.get(flat_key):
+        return True
+    tokens = policy.get("tokens", {})
+    return isinstance(tokens, dict) and tokens.get(nested_key) not in (None, [], {})
+
+def _get_additives(policy: Dict) -> List[Dict]:
+    """
+    Pull additives from flat (policy['additives']) and/or nested (policy['tokens']['additives']).
+    Each item: {"id":"E951","names":["e951","aspartame"]}
+    """
+    flat = policy.get("additives") or []
+    nested = (policy.get("tokens", {}) or {}).get("additives") or []
+    return list(flat) + list(nested)
+
+def _get_overrides_tokens(policy: Dict, key: str) -> set:
+    return _as_set((policy.get("overrides", {}) or {}).get(key) or [])
+
+def _build_syn_map(policy: Dict) -> Dict[str, str]:
+    """
+    Build {alias -> canonical} from tokens.synonyms in the policy.
+    Canonical keys should be the English/base tokens your rules use.
+    """
+    syn = ((policy.get("tokens") or {}).get("synonyms") or {})
+    rev: Dict[str, str] = {}
+    for canonical, aliases in syn.items():
+        c = _norm(canonical)
+        rev[c] = c  # map canonical to itself
+        for a in aliases or []:
+            rev[_norm(a)] = c
+    return rev
+
+def _apply_synonyms(tokens: List[str], syn_map: Dict[str, str]) -> List[str]:
+    """Replace any alias token with its canonical form if present in the map."""
+    if not syn_map:
+        return tokens
+    return [syn_map.get(_norm(t), t) for t in tokens]
+
+
+# ---------- Sensible defaults ----------
+_DEFAULT_MAJOR_ALLERGENS = {
+    "milk", "peanut", "egg", "wheat", "soy", "fish", "shellfish", "tree nut"
+}
+_DEFAULT_ANIMAL_TOKENS = {"chicken", "beef", "pork", "gelatin", "lard", "fish"}
+_DEFAULT_UNSAFE = {"soap", "detergent"}
+_DEFAULT_BIOCIDES = {
+    "benzalkonium chloride",
+    "chlorine dioxide",
+    "formaldehyde",
+    "ethylene glycol",
+}
+_DEFAULT_ALLOWLIST = {
+    "citric acid", "ascorbic acid", "lactic acid", "malic acid",
+    "tartaric acid", "fumaric acid", "acetic acid", "phosphoric acid",
+}
+_DEFAULT_ADD_SYNONYMS = {"aspartame"}  # additive fallback if no configured list
+_E_NUM_RE = re.compile(r"^e\d{3}[a-z]?$", re.IGNORECASE)
+# real words a small edit away from a policy term: never "corrected" (chickpea is not chicken)
+_KNOWN_WORDS = frozenset({
+    "chickpea", "chickpeas", "boeuf", "fishy", "wheaty", "milky", "nutty", "eggy", "cheesy",
+    "nutmeg", "coconut", "buckwheat", "eggplant", "peanutty", "soybean oil",
+})
+
+def policy_fingerprint(policy: Dict) -> str:
+    """Stable content hash of a policy dict (key order does not matter)."""
+    blob = json.dumps(policy, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _fuzzy_allowance(term: str) -> int:
+    """Edits a fuzzy match may make to reach term: none below 6 chars (milk, wheat, oeuf), 1 below 8, else 2."""
+    return 0 if len(term) < 6 else 1 if len(term) < 8 else 2
+
+
+# ---------- Token categories ----------
+# Each normalized token maps to one int mask; additive i of the policy is bit ADDITIVE_SHIFT + i.
+CAT_ALLOW      = 1 << 0  # unsafe_allowlist
+CAT_UNSAFE     = 1 << 1  # default_unsafe_tokens
+CAT_HAZARD     = 1 << 2  # hazardous_chemicals (exact or embedded)
+CAT_HARD       = 1 << 3  # overrides.hard_avoid_tokens
+CAT_ALLERGEN   = 1 << 4  # major_allergens
+CAT_ANIMAL     = 1 << 5  # animal_tokens
+CAT_TRACE      = 1 << 6  # trace_allergen_patterns hit
+CAT_DENY       = 1 << 7  # deny_patterns hit
+CAT_E_NUMBER   = 1 << 8  # generic additive fallback (E-number / known sweetener)
+CAT_UNCHECKED  = 1 << 9  # patterns not (fully) evaluated: label budget spent, token truncated or pattern withheld
+ADDITIVE_SHIFT = 10
+CAT_HARD_ANY   = CAT_UNSAFE | CAT_HAZARD | CAT_HARD
+
+_SEEN_MAX = 65536  # bound on memoized out-of-vocabulary tokens per engine
+
+
+# ---------- Pattern budget ----------
+class PatternBudget:
+    """Regex CPU time (thread_time) left for one label, shared by every token classified while it is active."""
+    __slots__ = ("remaining",)
+
+    def __init__(self, seconds: float):
+        self.remaining = seconds
+
+_pattern_budget: ContextVar[Optional[PatternBudget]] = ContextVar("pattern_budget", default=None)
+
+@contextmanager
+def pattern_budget(seconds: Optional[float]) -> Iterator[Optional[PatternBudget]]:
+    """
+    Cap the total regex time spent classifying tokens inside the block. It is
+    CPU time of the calling thread, so waiting for the GIL or other threads under
+    load does not count against a label. It is checked between tokens, so it
+    bounds many slow-ish searches, not one runaway search: nested-quantifier
+    patterns are withheld at compile time (PatternSet) and policy_check rejects
+    policies whose patterns time out. Nested blocks share the outermost budget;
+    None or 0 disables the cap.
+    """
+    current = _pattern_budget.get()
+    if current is not None or not seconds:
+        yield current
+        return
+    budget = PatternBudget(seconds)
+    token = _pattern_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _pattern_budget.reset(token)
+
+
+# ---------- Compiled engine ----------
+class PolicyEngine:
+    """Immutable, precompiled view of a policy dict."""
+
+    def __init__(self, policy: Dict, fingerprint: Optional[str] = None, source: Optional[str] = None):
+        self.policy = policy
+        self.fingerprint = fingerprint or policy_fingerprint(policy)
+        self.source = source
+
+        # Normalization
+        norm = policy.get("normalization", {}) or {}
+        form = (norm.get("unicode") or "").upper()
+        self._unicode_form = form if form in {"NFKC", "NFC", "NFKD", "NFD"} else None
+        self._trim = bool(norm.get("trim", True))
+        self._lowercase = bool(norm.get("lowercase", True))
+
+        # Synonyms collapse (multilingual -> canonical)
+        self.syn_map: Dict[str, str] = _build_syn_map(policy)
+
+        # Weights / thresholds
+        scoring = policy.get("scoring", {}) or {}
+        weights = scoring.get("weights", {}) or {}
+        thresholds = scoring.get("thresholds", {}) or {}
+        self.w_allergen   = int(weights.get("ALLERGEN_MATCH", 5))
+        self.w_vegan      = int(weights.get("VEGAN_CONFLICT", 3))
+        self.w_add        = int(weights.get("ADDITIVE_FLAG", 2))
+        self.w_trace      = int(weights.get("TRACE_ALLERGEN", 0))
+        self.w_unknown    = int(weights.get("UNKNOWN", 1))
+        self.w_def_unsafe = int(weights.get("DEFAULT_UNSAFE", 1000))
+        self.w_haz_chem   = int(weights.get("HAZARDOUS_CHEM", 1000))
+        self.w_fuzzy      = int(weights.get("FUZZY_MATCH", 0))
+        self.w_budget     = int(weights.get("PATTERN_BUDGET_EXCEEDED", 0))
+        self.w_withheld   = int(weights.get("PATTERN_WITHHELD", 0))
+        self.caution_th   = int(thresholds.get("caution", 3))
+        self.avoid_th     = int(thresholds.get("avoid", 10))
+
+        # Policy sets
+        self.allowlist         = frozenset(_get_set(policy, "unsafe_allowlist", default=_DEFAULT_ALLOWLIST))
+        self.default_unsafe    = frozenset(_get_set(policy, "default_unsafe_tokens", default=_DEFAULT_UNSAFE))
+        self.hazardous_chems   = frozenset(_get_set(policy, "hazardous_chemicals", default=_DEFAULT_BIOCIDES))
+        self.major_allergens   = frozenset(_get_set(policy, "major_allergens", default=_DEFAULT_MAJOR_ALLERGENS))
+        self.animal_tokens     = frozenset(_get_set(policy, "animal_tokens", default=_DEFAULT_ANIMAL_TOKENS))
+        self.hard_extra_tokens = frozenset(_get_overrides_tokens(policy, "hard_avoid_tokens"))
+        self.hard_codes        = frozenset((policy.get("overrides", {}) or {}).get("hard_avoid_codes") or [])
+        self.haz_is_explicit   = _exists_in_policy(policy, "hazardous_chemicals")
+        self.deny_all          = self.default_unsafe | self.hazardous_chems | self.hard_extra_tokens
+        # Multi-pattern automaton for the hazardous substring scan
+        self.hazard_automaton  = AhoCorasick(self.hazardous_chems)
+
+        # Additives: (canonical id, names) in configured order
+        additives: List[Tuple[str, frozenset]] = []
+        for add in _get_additives(policy):
+            raw_id = (add.get("id") or "").strip()
+            names = _as_set(add.get("names") or [])
+            if raw_id:
+                names.add(_norm(raw_id))
+            additives.append((raw_id.upper() if raw_id else "UNKNOWN", frozenset(names)))
+        self.additives: Tuple[Tuple[str, frozenset], ...] = tuple(additives)
+
+        # Patterns (top-level + trace), each group fused into one regex with a literal prefilter
+        patterns_cfg = policy.get("patterns", {}) or {}
+        self.deny_patterns  = PatternSet(patterns_cfg.get("deny_patterns"))
+        self.trace_patterns = PatternSet(patterns_cfg.get("trace_allergen_patterns"))
+        self.allow_patterns = PatternSet(patterns_cfg.get("allow_patterns"))
+        # Runtime guard: patterns only see the first N chars of a token, and each label
+        # stops evaluating them once its regex time budget is spent (fails safe to caution)
+        matching = policy.get("matching", {}) or {}
+        self.pattern_max_length = max(1, int(matching.get("max_pattern_token_length", 512)))
+        budget_ms = float(matching.get("pattern_budget_ms", 50))
+        self.pattern_budget: Optional[float] = budget_ms / 1000 if budget_ms > 0 else None
+        # a withheld (nested-quantifier) trace/deny pattern could have matched any token
+        self._patterns_withheld = bool(self.trace_patterns.withheld or self.deny_patterns.withheld)
+        self.log_withheld()
+
+        # Token -> category bitmask index over the whole policy vocabulary
+        static: Dict[str, int] = {}
+        for bit, members in (
+            (CAT_ALLOW, self.allowlist),
+            (CAT_UNSAFE, self.default_unsafe),
+            (CAT_HAZARD, self.hazardous_chems),
+            (CAT_HARD, self.hard_extra_tokens),
+            (CAT_ALLERGEN, self.major_allergens),
+            (CAT_ANIMAL, self.animal_tokens),
+        ):
+            for t in members:
+                static[t] = static.get(t, 0) | bit
+        for i, (_, names) in enumerate(self.additives):
+            for t in names:
+                static[t] = static.get(t, 0) | (1 << (ADDITIVE_SHIFT + i))
+        self._static = static
+        self.index: Dict[str, int] = {t: self._classify(t) for t in static}
+        self._seen: Dict[str, int] = {}
+
+        # Fuzzy matching: SymSpell deletion index over the vocabulary and synonym aliases
+        self.fuzzy_max_distance = max(0, int(matching.get("max_edit_distance", 2)))
+        self.fuzzy_min_length = int(matching.get("min_token_length", 5))
+        self.known_words = _KNOWN_WORDS | _as_set(matching.get("known_words") or [])
+        self.fuzzy_index: Optional[SymSpell] = None
+        if matching.get("fuzzy") and self.fuzzy_max_distance:
+            vocab = set(self.index) | set(self.syn_map) | set(self.syn_map.values())
+            self.fuzzy_index = SymSpell(vocab, self.fuzzy_max_distance)
+        self._fuzzy_seen: Dict[str, Optional[str]] = {}
+
+        # Multi-word terms embedded in longer tokens ("sugar tree nut oil"): word-boundary trie
+        self.multiword_automaton: Optional[AhoCorasick] = None
+        if matching.get("multiword"):
+            terms = {t for t, m in self.index.items() if " " in t and m != CAT_ALLOW}
+            terms.update(a for a, c in self.syn_map.items() if " " in a and self.index.get(c, 0) not in (0, CAT_ALLOW))
+            if terms:
+                self.multiword_automaton = AhoCorasick(terms)
+        self._embedded: Dict[str, Tuple[str, ...]] = {}
+
+    def __getstate__(self) -> Dict:
+        # memo tables are per-process caches, not part of the compiled policy
+        state = self.__dict__.copy()
+        state["_seen"], state["_fuzzy_seen"], state["_embedded"] = {}, {}, {}
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self.log_withheld()
+
+    def log_withheld(self) -> None:
+        """Warn (once per load) that withheld patterns make every label fail safe to caution."""
+        if self._patterns_withheld:
+            log.warning("policy %s: nested-quantifier patterns withheld, every label will be 'caution': %s",
+                        self.source or self.fingerprint[:12],
+                        ", ".join(self.trace_patterns.withheld + self.deny_patterns.withheld))
+
+    # ---- normalization ----
+    def normalize_token(self, tok) -> str:
+        s = tok if isinstance(tok, str) else str(tok)
+        if self._unicode_form:
+            s = unicodedata.normalize(self._unicode_form, s)
+        if self._trim:
+            s = s.strip()
+        if self._lowercase:
+            s = s.lower()
+        return s
+
+    def prepare_token(self, raw) -> Optional[str]:
+        """Canonical form of one raw token, or None if it normalizes to nothing."""
+        return self.resolve(raw)[0]
+
+    def resolve(self, raw) -> Tuple[Optional[str], Optional[str]]:
+        """(canonical token or None, "typo->term" note when fuzzy matching corrected it)."""
+        t = self.normalize_token(raw)
+        if not t:
+            return None, None
+        t = _norm(t)
+        t = self.syn_map.get(t, t)
+        if self.fuzzy_index is not None:
+            fixed = self.correct(t)
+            if fixed is not None:
+                return fixed, f"{t}->{fixed}"
+        return t, None
+
+    def correct(self, t: str) -> Optional[str]:
+        """
+        Canonical vocabulary term a misspelled token resolves to, or None.
+        Only unmatched tokens outside the known-word list are looked up. The
+        target must share the first letter and be at least 6 characters long,
+        with one edit allowed below 8 characters and max_edit_distance above.
+        """
+        if self.fuzzy_index is None or len(t) < self.fuzzy_min_length or t in self.index:
+            return None
+        if t in self._fuzzy_seen:
+            return self._fuzzy_seen[t]
+        fixed = None
+        if t not in self.known_words and not self.mask_of(t):
+            hit = self.fuzzy_index.lookup(t, 1 if len(t) < 8 else self.fuzzy_max_distance)
+            if hit is not None and 0 < hit[1] <= _fuzzy_allowance(hit[0]) and hit[0][0] == t[0]:
+                fixed = self.syn_map.get(hit[0], hit[0])
+        if len(self._fuzzy_seen) >= _SEEN_MAX:
+            self._fuzzy_seen.clear()
+        self._fuzzy_seen[t] = fixed
+        return fixed
+
+    def prepare(self, tokens: List[str]) -> List[str]:
+        """Normalize per policy, drop empties and collapse synonyms to canonical tokens."""
+        out = []
+        for raw in tokens or []:
+            t = self.prepare_token(raw)
+            if t is not None:
+                out.append(t)
+        return out
+
+    def key_tokens(self, tokens: List[str]) -> List[str]:
+        """
+        Normalized, synonym-collapsed tokens without the fuzzy and multi-word passes.
+        Those passes are deterministic per policy, so this is enough to key a result
+        cache, and it never touches the pattern budget.
+        """
+        out = []
+        for raw in tokens or []:
+            t = self.normalize_token(raw)
+            if t:
+                t = _norm(t)
+                out.append(self.syn_map.get(t, t))
+        return out
+
+    def scan_hazards(self, toks: List[str]) -> List[Tuple[str, int]]:
+        """
+        One pass over normalized tokens with the hazard automaton.
+        Returns (hazard, offset) for every occurrence; allowlisted tokens are skipped.
+        """
+        if not self.hazard_automaton:
+            return []
+        allowlist = self.allowlist
+        return [
+            (hz, start)
+            for t in toks if t not in allowlist
+            for start, hz in self.hazard_automaton.iter_matches(t)
+        ]
+
+    def embedded_terms(self, t: str) -> Tuple[str, ...]:
+        """
+        Canonical multi-word policy terms found on word boundaries inside a prepared token,
+        in order of appearance. Exact vocabulary tokens, allowlisted tokens and trace
+        statements ("may contain tree nuts") are not expanded.
+        """
+        ac = self.multiword_automaton
+        if ac is None or " " not in t or t in self.index:
+            return ()
+        hit = self._embedded.get(t)
+        if hit is None:
+            found: List[str] = []
+            if not self.mask_of(t) & (CAT_ALLOW | CAT_TRACE):
+                for _, term in ac.iter_word_matches(" ".join(t.split())):
+                    term = self.syn_map.get(term, term)
+                    if term != t and term not in found:
+                        found.append(term)
+            hit = tuple(found)
+            if len(self._embedded) >= _SEEN_MAX:
+                self._embedded.clear()
+            self._embedded[t] = hit
+        return hit
+
+    # ---- classification ----
+    def _classify(self, t: str) -> int:
+        """Full category mask for a normalized token (static index bits + substring/regex bits)."""
+        m = self._static.get(t, 0)
+        laps = Laps(current_timer())
+        if m & CAT_ALLOW:
+            m &= ~CAT_HARD_ANY  # allowlisted tokens never count as unsafe
+        else:
+            if self.hazard_automaton and next(self.hazard_automaton.iter_matches(t), None):
+                m |= CAT_HAZARD
+            laps("hazard_scan")
+            if t not in self.deny_all and (self.trace_patterns or self.deny_patterns):
+                m |= self._pattern_bits(t)
+            laps("patterns")
+        if _E_NUM_RE.match(t) or t in _DEFAULT_ADD_SYNONYMS:
+            m |= CAT_E_NUMBER
+        laps("additives")
+        return m
+
+    def _pattern_bits(self, t: str) -> int:
+        """TRACE / DENY bits from the regex groups, or CAT_UNCHECKED when they were not all evaluated."""
+        budget = _pattern_budget.get()
+        if budget is not None and budget.remaining <= 0:
+            return CAT_UNCHECKED
+        s = t[:self.pattern_max_length]
+        started = time.thread_time()
+        trace = self.trace_patterns.search(s)
+        deny = self.deny_patterns.search(s)
+        allowed = (trace or deny) and self.allow_patterns.search(s)
+        if budget is not None:
+            budget.remaining -= time.thread_time() - started
+        if (trace or deny) and not allowed:
+            return (CAT_TRACE if trace else 0) | (CAT_DENY if deny else 0)
+        # the tail was never looked at, or a withheld pattern was never run
+        return CAT_UNCHECKED if len(t) > len(s) or self._patterns_withheld else 0
+
+    def mask_of(self, t: str) -> int:
+        """One dict lookup per token; tokens outside the policy vocabulary are classified once and memoized."""
+        m = self.index.get(t)
+        if m is None:
+            m = self._seen.get(t)
+            if m is None:
+                m = self._classify(t)
+                if m & CAT_UNCHECKED and len(t) <= self.pattern_max_length and not self._patterns_withheld:
+                    return m  # skipped for lack of budget: the next label classifies it properly
+                if len(self._seen) >= _SEEN_MAX:
+                    self._seen.clear()
+                self._seen[t] = m
+        return m
+
+    # ---- scoring ----
+    def analyze(self, tokens: List[str]) -> Tuple[List[str], List[int], int, List[str]]:
+        """Prepared tokens (with embedded multi-word terms), their masks, the OR of the masks and fuzzy notes."""
+        with pattern_budget(self.pattern_budget):
+            return self._analyze(tokens, Laps(current_timer()))
+
+    def _analyze(self, tokens: List[str], laps: Laps) -> Tuple[List[str], List[int], int, List[str]]:
+        """Separate passes (normalize, synonyms, fuzzy, multiword, classify), each a lap of the request timer."""
+        normed = []
+        for raw in tokens or []:
+            t = self.normalize_token(raw)
+            if t:
+                normed.append(_norm(t))
+        laps("normalize")
+        syn_map = self.syn_map
+        toks = [syn_map.get(t, t) for t in normed]
+        laps("synonyms")
+        fixes: List[str] = []
+        if self.fuzzy_index is not None:
+            for i, t in enumerate(toks):
+                fixed = self.correct(t)
+                if fixed is not None:
+                    toks[i] = fixed
+                    fixes.append(f"{t}->{fixed}")
+            laps("fuzzy")
+        if self.multiword_automaton is not None:
+            expanded: List[str] = []
+            for t in toks:
+                expanded.append(t)
+                expanded.extend(self.embedded_terms(t))  # scored like standalone tokens
+            toks = expanded
+            laps("multiword")
+        mask_of = self.mask_of
+        masks = [mask_of(t) for t in toks]
+        agg = 0
+        for m in masks:
+            agg |= m
+        laps("classify")
+        return toks, masks, agg, fixes
+
+    def assess(self, tokens: List[str]) -> Tuple[int, str, List[Dict]]:
+        timer = current_timer()
+        if timer is None:
+            return self.score(*self.analyze(tokens))
+        analyzed = self.analyze(tokens)
+        with timer.phase("score"):
+            return self.score(*analyzed)
+
+    def assess_many(self, token_lists: Iterable[List[str]], budget: bool = True) -> List[Tuple[int, str, List[Dict]]]:
+        """
+        Assess many labels in order; tokens shared across labels are prepared and
+        classified once. Each label gets its own regex budget, as with assess(), so a
+        verdict does not depend on the batch around it; budget=False (offline bulk
+        scoring) runs every pattern to completion.
+        """
+        limit = self.pattern_budget if budget else None
+        results = []
+        seen: Dict[str, Tuple[Optional[str], int, Optional[str], Tuple[Tuple[str, int], ...]]] = {}
+        for tokens in token_lists:
+            with pattern_budget(limit):
+                results.append(self._assess_one(tokens, seen))
+        return results
+
+    def _assess_one(self, tokens: List[str],
+                    seen: Dict[str, Tuple[Optional[str], int, Optional[str], Tuple[Tuple[str, int], ...]]]
+                    ) -> Tuple[int, str, List[Dict]]:
+        mask_of = self.mask_of
+        toks: List[str] = []
+        masks: List[int] = []
+        fixes: List[str] = []
+        agg = 0
+        for raw in tokens or []:
+            key = raw if isinstance(raw, str) else str(raw)
+            hit = seen.get(key)
+            if hit is None:
+                t, fix = self.resolve(key)
+                extra = tuple((e, mask_of(e)) for e in self.embedded_terms(t)) if t is not None else ()
+                hit = (t, mask_of(t) if t is not None else 0, fix, extra)
+                if not (hit[1] & CAT_UNCHECKED or any(em & CAT_UNCHECKED for _, em in extra)):
+                    seen[key] = hit  # a budget-skipped token gets a fresh try in the next label
+            t, m, fix, extra = hit
+            if t is None:
+                continue
+            toks.append(t)
+            masks.append(m)
+            agg |= m
+            for e, em in extra:
+                toks.append(e)
+                masks.append(em)
+                agg |= em
+            if fix:
+                fixes.append(fix)
+        return self.score(toks, masks, agg, fixes)
+
+    def score(self, toks: List[str], masks: List[int], agg: int,
+              fixes: Optional[List[str]] = None) -> Tuple[int, str, List[Dict]]:
+        """Turn per-token masks (and their OR) into (score, verdict, reasons), honoring phase order."""
+        score, verdict, reasons = self._score(toks, masks, agg)
+        if fixes:
+            # informational: which canonical terms fuzzy matching resolved OCR typos to
+            reasons.append({"code": "FUZZY_MATCH", "param": ", ".join(sorted(set(fixes)))})
+            if self.w_fuzzy:
+                score += self.w_fuzzy
+                verdict = "avoid" if verdict == "avoid" else self.verdict_for(score)
+        if agg & CAT_UNCHECKED:
+            # fail safe: some tokens were never matched against the patterns, so "safe" cannot hold
+            if any(r["code"] == "UNKNOWN" for r in reasons):
+                reasons = [r for r in reasons if r["code"] != "UNKNOWN"]
+                score -= self.w_unknown
+            # a withheld pattern leaves every label unchecked: say so, it is not a budget problem
+            code, weight = ("PATTERN_WITHHELD", self.w_withheld) if self._patterns_withheld \
+                else ("PATTERN_BUDGET_EXCEEDED", self.w_budget)
+            reasons.append({"code": code, "param": str(sum(1 for m in masks if m & CAT_UNCHECKED))})
+            score = max(score + weight, self.caution_th)
+            verdict = "avoid" if verdict == "avoid" else self.verdict_for(score)
+        return score, verdict, reasons
+
+    def _score(self, toks: List[str], masks: List[int], agg: int) -> Tuple[int, str, List[Dict]]:
+        score = 0
+        reasons: List[Dict] = []
+        hard_codes = self.hard_codes
+
+        def hits(bit: int) -> str:
+            return ", ".join(sorted({t for t, m in zip(toks, masks) if m & bit}))
+
+        # ---------- 1) HARD OVERRIDES ----------
+        if agg & CAT_HARD_ANY:
+            if agg & CAT_UNSAFE:
+                reasons.append({"code": "DEFAULT_UNSAFE", "param": hits(CAT_UNSAFE)})
+                score += self.w_def_unsafe
+                if "DEFAULT_UNSAFE" in hard_codes:
+                    return score, "avoid", reasons
+
+            if agg & CAT_HAZARD:
+                # exact hazard tokens plus every embedded hazard (e.g. "... benzalkonium chloride")
+                haz_toks = [t for t, m in zip(toks, masks) if m & CAT_HAZARD]
+                hazard_hits = {t for t in haz_toks if t in self.hazardous_chems}
+                hazard_hits.update(hz for hz, _ in self.scan_hazards(haz_toks))
+                code = "HAZARDOUS_CHEM" if self.haz_is_explicit else "DEFAULT_UNSAFE"
+                reasons.append({"code": code, "param": ", ".join(sorted(hazard_hits))})
+                score += (self.w_haz_chem if code == "HAZARDOUS_CHEM" else self.w_def_unsafe)
+                if code in hard_codes:
+                    return score, "avoid", reasons
+
+            if agg & CAT_HARD:
+                reasons.append({"code": "DEFAULT_UNSAFE", "param": hits(CAT_HARD)})
+                score += self.w_def_unsafe
+                if "DEFAULT_UNSAFE" in hard_codes:
+                    return score, "avoid", reasons
+
+            return score, "avoid", reasons
+
+        # ---------- 2) REGEX TRACE (caution) ----------
+        # TRACE_ALLERGEN (non-hard): e.g. "may contain nuts", "kan sporen bevatten van noten"
+        if agg & CAT_TRACE:
+            reasons.append({"code": "TRACE_ALLERGEN", "param": hits(CAT_TRACE)})
+            score += self.w_trace  # soft score only, no short-circuit
+
+        # ---------- 2b) REGEX DENY (hard) ----------
+        if agg & CAT_DENY:
+            reasons.append({"code": "DEFAULT_UNSAFE", "param": hits(CAT_DENY)})
+            score += self.w_def_unsafe
+            return score, "avoid", reasons
+
+        # ---------- 3) SOFT SCORING ----------
+        if agg & CAT_ALLERGEN:
+            reasons.append({"code": "ALLERGEN_MATCH", "param": "major_allergen"})
+            score += self.w_allergen
+
+        if agg & CAT_ANIMAL:
+            reasons.append({"code": "VEGAN_CONFLICT", "param": "animal"})
+            score += self.w_vegan
+
+        # Additives (configured): the first configured additive present wins
+        add_bits = agg >> ADDITIVE_SHIFT
+        if add_bits:
+            first = (add_bits & -add_bits).bit_length() - 1
+            reasons.append({"code": "ADDITIVE_FLAG", "param": self.additives[first][0]})
+            score += self.w_add
+        # Additives (generic fallback): the first E-number-like token wins
+        elif agg & CAT_E_NUMBER:
+            t = next(t for t, m in zip(toks, masks) if m & CAT_E_NUMBER)
+            reasons.append({"code": "ADDITIVE_FLAG", "param": t.upper() if _E_NUM_RE.match(t) else t})
+            score += self.w_add
+
+        # ---------- 4) UNKNOWN ----------
+        if not reasons:
+            reasons.append({"code": "UNKNOWN", "param": "none"})
+            score += self.w_unknown
+
+        return score, self.verdict_for(score), reasons
+
+    def verdict_for(self, score: int) -> str:
+        if score >= self.avoid_th:
+            return "avoid"
+        if score >= self.caution_th:
+            return "caution"
+        return "safe"
+
+
+# ---------- Validation ----------
+def validate_engine(engine: PolicyEngine) -> List[str]:
+    """
+    Problems that must keep a compiled policy from going live (empty: OK to
+    activate). Only static checks run here, so hot reload never forks or times
+    anything inside the server; policy_check's timing checks belong in CI.
+    """
+    errors: List[str] = []
+    if engine.caution_th > engine.avoid_th:
+        errors.append(f"scoring.thresholds: caution ({engine.caution_th}) above avoid ({engine.avoid_th})")
+    patterns = engine.policy.get("patterns", {}) or {}
+    for key in ("trace_allergen_patterns", "deny_patterns", "allow_patterns"):
+        for i, p in enumerate(patterns.get(key) or []):
+            try:
+                rx = re.compile(p, re.IGNORECASE)
+            except (re.error, TypeError) as e:
+                errors.append(f"patterns.{key}[{i}] {p!r}: {e}")
+                continue
+            if nested_quantifiers(rx.pattern, rx.flags):
+                errors.append(f"patterns.{key}[{i}] {rx.pattern!r}: nested unbounded quantifiers (withheld by the engine)")
+    try:
+        engine.assess(sorted(engine.index)[:64] + ["water", "may contain nuts", "E999"])
+    except Exception as e:  # any failure here would fail live requests too
+        errors.append(f"smoke assessment failed: {e!r}")
+    return errors
+
+
+# ---------- Binary snapshots ----------
+# A snapshot is a pickled PolicyEngine behind a header that ties it to the exact
+# policy bytes and engine code it was built from:
+#   magic (8) | format (u16) | sha256(policy JSON) (32) | sha256(engine code) (32) | pickle
+# Snapshots are build artifacts (python -m backend.compile_policy) and are trusted
+# like the code that ships next to them.
+SNAPSHOT_MAGIC = b"FSPOLSNP"
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_SUFFIX = ".snapshot"
+_SNAPSHOT_HEADER = struct.Struct(">8sH32s32s")
+
+def _code_digest() -> bytes:
+    h = hashlib.sha256()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in ("policy_engine.py", "matchers.py"):
+        with open(os.path.join(here, name), "rb") as f:
+            h.update(f.read())
+    return h.digest()
+
+_CODE_DIGEST = _code_digest()
+
+def snapshot_path(policy_file: str) -> str:
+    return policy_file + SNAPSHOT_SUFFIX
+
+def write_snapshot(engine: PolicyEngine, source: bytes, path: str) -> int:
+    """Write engine's snapshot for the given policy bytes atomically; returns the size in bytes."""
+    header = _SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, hashlib.sha256(source).digest(), _CODE_DIGEST)
+    blob = header + pickle.dumps(engine, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(blob)
+    os.replace(tmp, path)
+    return len(blob)
+
+def read_snapshot(path: str, source_digest: bytes) -> Optional[PolicyEngine]:
+    """The snapshot's engine if it matches the policy bytes and engine code, else None (missing/stale)."""
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if len(mm) < _SNAPSHOT_HEADER.size:
+                return None
+            magic, fmt, src, code = _SNAPSHOT_HEADER.unpack_from(mm)
+            if (magic, fmt, src, code) != (SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, source_digest, _CODE_DIGEST):
+                return None
+            with memoryview(mm) as view:
+                engine = pickle.loads(view[_SNAPSHOT_HEADER.size:])
+    except (OSError, ValueError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    return engine if isinstance(engine, PolicyEngine) else None
+
+def load_engine_file(path: str) -> PolicyEngine:
+    """
+    Compiled engine for a policy file: its snapshot when one exists and is current
+    (POLICY_SNAPSHOTS=0 disables), otherwise compiled from the JSON.
+    """
+    with open(path, "rb") as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw)
+    eng = None
+    if os.getenv("POLICY_SNAPSHOTS", "1") != "0":
+        eng = read_snapshot(snapshot_path(path), digest.digest())
+    if eng is None:
+        eng = PolicyEngine(json.loads(raw.decode("utf-8")), fingerprint=digest.hexdigest())
+    eng.source = path
+    return eng
+
+
+# ---------- Process-wide caches ----------
+_lock = threading.Lock()
+_file_cache: Dict[str, Tuple[int, str, PolicyEngine]] = {}  # path -> (mtime_ns, sha256, engine)
+_DICT_CACHE_MAX = 32
+_dict_cache: "OrderedDict[str, PolicyEngine]" = OrderedDict()
+
+def compile_policy(policy: Dict) -> PolicyEngine:
+    """Compile a policy dict, reusing a cached engine when the content is unchanged."""
+    fp = policy_fingerprint(policy)
+    with _lock:
+        eng = _dict_cache.get(fp)
+        if eng is not None:
+            _dict_cache.move_to_end(fp)
+            return eng
+    eng = PolicyEngine(policy, fingerprint=fp)
+    with _lock:
+        _dict_cache[fp] = eng
+        while len(_dict_cache) > _DICT_CACHE_MAX:
+            _dict_cache.popitem(last=False)
+    return eng
+
+def get_engine(path: Optional[str] = None) -> PolicyEngine:
+    """
+    Return the compiled engine for a policy file (default: POLICY_DIR/POLICY_FILE).
+    Cached by path + mtime; a touched file with identical content keeps its engine.
+    """
+    path = os.path.abspath(path or policy_path())
+    mtime = os.stat(path).st_mtime_ns
+    hit = _file_cache.get(path)
+    if hit and hit[0] == mtime:
+        return hit[2]
+    with _lock:
+        hit = _file_cache.get(path)
+        if hit and hit[0] == mtime:
+            return hit[2]
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        if hit and hit[1] == digest:
+            _file_cache[path] = (mtime, digest, hit[2])
+            return hit[2]
+        eng = load_engine_file(path)
+        _file_cache[path] = (mtime, eng.fingerprint, eng)
+        return eng
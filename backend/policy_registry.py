@@ -0,0 +1,327 @@
+# backend/policy_registry.py
+"""
+Registry of policy files loaded side by side (per version and per locale/country).
+
+POLICY_DIR is indexed once; file names carry the key:
+
+    <name>_v<version>[.<locale>].json    policy_v2.json, policy_v3.json, policy_v2.BE.json, policy_v2.fr_BE.json
+
+Engines are compiled lazily on first use and kept in an LRU (POLICY_REGISTRY_MAX),
+so cold policies are evicted and a request never touches the filesystem once its
+policy is warm. Requests pick a policy with X-Policy-Name / X-Policy-Version /
+X-Policy-Locale headers, the policy_name / policy_version / policy_locale query
+parameters, or the profile's country; the default is POLICY_FILE (policy_v2.json).
+"""
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import logging, os, re, signal, threading, time
+
+from fastapi import Header, HTTPException, Query
+
+from .lru import LRUCache
+from .policy_engine import PolicyEngine, load_engine_file, validate_engine
+
+POLICY_REGISTRY_MAX = int(os.getenv("POLICY_REGISTRY_MAX", "4"))
+# seconds between mtime checks of loaded policies (0: only reload on SIGHUP / admin request)
+POLICY_RELOAD_INTERVAL = float(os.getenv("POLICY_RELOAD_INTERVAL", "5"))
+
+log = logging.getLogger("policy_registry")
+
+_FILE_RE = re.compile(
+    r"^(?P<name>.+?)(?:_v(?P<version>\d[\w-]*(?:\.\d+)*))?(?:\.(?P<locale>[A-Za-z]{2,3}(?:[_-][A-Za-z]{2})?))?\.json$"
+)
+
+
+class PolicyKey(NamedTuple):
+    name: str
+    version: str
+    locale: Optional[str]  # None: generic policy for every locale
+
+
+class PolicySelection(NamedTuple):
+    name: Optional[str] = None
+    version: Optional[str] = None
+    locale: Optional[str] = None
+
+
+def parse_policy_filename(filename: str) -> Optional[PolicyKey]:
+    m = _FILE_RE.match(filename)
+    if not m:
+        return None
+    locale = m.group("locale")
+    return PolicyKey(m.group("name"), m.group("version") or "", _norm_locale(locale) if locale else None)
+
+def _norm_locale(value: str) -> str:
+    return value.strip().replace("-", "_").lower()
+
+def _version_sort_key(version: str) -> Tuple:
+    return tuple((0, int(p), "") if p.isdigit() else (1, 0, p) for p in re.split(r"[._-]", version))
+
+def _locale_rank(candidate: Optional[str], wanted: Optional[str]) -> int:
+    """How well a policy locale serves an explicitly requested locale (0 = not at all)."""
+    if candidate is None:
+        return 1  # generic fallback
+    if not wanted:
+        return 0
+    if candidate == wanted:
+        return 4
+    c_parts, w_parts = candidate.split("_"), wanted.split("_")
+    if c_parts[-1] == w_parts[-1] and (len(c_parts) > 1 or len(w_parts) > 1):
+        return 3  # same country ("BE" <-> "fr_BE")
+    if c_parts[0] == w_parts[0]:
+        return 2  # same language ("fr" <-> "fr_BE")
+    return 0
+
+def _country_rank(candidate: Optional[str], country: str) -> int:
+    """How well a policy locale serves a profile/owner country: only its country part counts ("NL" never picks nl_BE)."""
+    if candidate is None:
+        return 1  # generic fallback
+    parts = candidate.split("_")
+    if parts[-1] != country:
+        return 0
+    return 4 if len(parts) == 1 else 3  # "BE" before "fr_BE" / "nl_BE"
+
+
+class PolicyRegistry:
+    """Index of the policy files in one directory plus an LRU of their compiled engines."""
+
+    def __init__(self, policy_dir: Optional[str] = None, max_loaded: int = POLICY_REGISTRY_MAX):
+        self.policy_dir = policy_dir or os.getenv("POLICY_DIR", "backend/policies")
+        self._engines = LRUCache(max_loaded)
+        self._lock = threading.Lock()
+        self._files: Dict[PolicyKey, str] = {}
+        self._mtimes: Dict[PolicyKey, int] = {}  # file mtime the active engine was loaded from
+        self.loaded_at: Dict[PolicyKey, float] = {}
+        self.errors: Dict[PolicyKey, List[str]] = {}  # last rejected reload per key
+        self.default: Optional[PolicyKey] = None
+        self.scan()
+
+    def scan(self, clear: bool = True) -> None:
+        """(Re)index the directory; called at construction and on reload (which keeps loaded engines)."""
+        files: Dict[PolicyKey, str] = {}
+        for entry in sorted(os.listdir(self.policy_dir)) if os.path.isdir(self.policy_dir) else []:
+            key = parse_policy_filename(entry)
+            if key is not None:
+                files[key] = os.path.abspath(os.path.join(self.policy_dir, entry))
+        default = parse_policy_filename(os.path.basename(os.getenv("POLICY_FILE") or "policy_v2.json"))
+        with self._lock:
+            self._files = files
+            self.default = default if default in files else None
+            if clear:
+                self._engines.clear()
+
+    def keys(self) -> List[PolicyKey]:
+        return sorted(self._files, key=lambda k: (k.name, _version_sort_key(k.version), k.locale or ""))
+
+    def path_of(self, key: PolicyKey) -> str:
+        return self._files[key]
+
+    def resolve(self, name: Optional[str] = None, version: Optional[str] = None,
+                locale: Optional[str] = None, country: Optional[str] = None) -> PolicyKey:
+        """
+        Best key for a selection. Name and version default to POLICY_FILE's (or the
+        newest version of the name). An explicit locale matches by locale, country
+        or language; otherwise a country matches the country part of file locales.
+        Both fall back to the generic file. Raises KeyError when nothing matches.
+        """
+        default = self.default
+        name = name or (default.name if default else None)
+        candidates = [k for k in self._files if name is None or k.name == name]
+        if not candidates:
+            raise KeyError(f"unknown policy {name!r}")
+        if version is None:
+            if default is not None and default.name == name:
+                version = default.version
+            else:
+                version = max((k.version for k in candidates), key=_version_sort_key)
+        candidates = [k for k in candidates if k.version == version]
+        if locale or not country:
+            wanted = _norm_locale(locale) if locale else None
+            ranked = [(r, k) for k in candidates for r in (_locale_rank(k.locale, wanted),) if r]
+        else:
+            wanted = _norm_locale(country)
+            ranked = [(r, k) for k in candidates for r in (_country_rank(k.locale, wanted),) if r]
+        if not ranked:
+            raise KeyError(f"unknown policy {name!r} version {version!r} locale {locale or country!r}")
+        return max(ranked, key=lambda rk: rk[0])[1]
+
+    def engine(self, key: PolicyKey) -> PolicyEngine:
+        """Compiled engine for a key (LRU; only a miss reads the file)."""
+        eng = self._engines.get(key)
+        if eng is None:
+            with self._lock:
+                eng = self._engines.get(key)
+                if eng is None:
+                    path = self._files[key]
+                    mtime = os.stat(path).st_mtime_ns
+                    eng = load_engine_file(path)  # snapshot when current, else JSON
+                    self._engines.set(key, eng)
+                    self._mtimes[key] = mtime
+                    self.loaded_at[key] = time.time()
+        return eng
+
+    def reload(self) -> Dict[str, Any]:
+        """
+        Rescan the directory and recompile loaded policies whose files changed.
+        A new engine is validated first and then swapped in with one assignment:
+        requests already holding the old engine finish with it. A policy that
+        fails to load or validate keeps its current engine.
+        """
+        self.scan(clear=False)
+        reloaded: List[str] = []
+        for key in self._engines.keys():
+            path = self._files.get(key)
+            if path is None:  # file removed: drop the engine, keep serving the others
+                self._engines.pop(key)
+                continue
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            if mtime == self._mtimes.get(key):
+                continue
+            try:
+                new = load_engine_file(path)
+                errors = validate_engine(new)
+            except Exception as e:  # unreadable JSON, bad weights, ...
+                new, errors = None, [repr(e)]
+            self._mtimes[key] = mtime  # do not retry an unchanged broken file on every poll
+            if errors:
+                self.errors[key] = errors
+                log.error("policy %s rejected, keeping the active engine: %s", path, "; ".join(errors))
+                continue
+            self.errors.pop(key, None)
+            old = self._engines.peek(key)
+            if old is not None and old.fingerprint == new.fingerprint:
+                continue  # touched, same content
+            with self._lock:
+                self._engines.set(key, new)
+                self.loaded_at[key] = time.time()
+            reloaded.append(path)
+            log.info("policy %s reloaded (fingerprint %s)", path, new.fingerprint[:12])
+        return {"reloaded": reloaded, "errors": {self._files.get(k, str(k)): v for k, v in self.errors.items()}}
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Loaded policies with their fingerprints (for the admin endpoint)."""
+        out = []
+        for key in self.keys():
+            eng = self._engines.peek(key)
+            out.append({
+                "name": key.name, "version": key.version, "locale": key.locale,
+                "default": key == self.default, "loaded": eng is not None,
+                "fingerprint": eng.fingerprint if eng is not None else None,
+                "source": self._files[key], "loaded_at": self.loaded_at.get(key) if eng is not None else None,
+                "errors": self.errors.get(key, []),
+            })
+        return out
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the compiled-engine LRU."""
+        return self._engines.stats()
+
+    def select(self, selection: Optional[PolicySelection] = None, country: Optional[str] = None) -> PolicyEngine:
+        """Engine for a request selection; the country only applies when no locale was asked for."""
+        sel = selection or PolicySelection()
+        return self.engine(self.resolve(sel.name, sel.version, sel.locale, country))
+
+
+# ---------- process-wide registry ----------
+_registry: Optional[PolicyRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_registry() -> PolicyRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = PolicyRegistry()
+    return _registry
+
+def reset_registry() -> None:
+    """Forget the process-wide registry (the next get_registry() rescans POLICY_DIR)."""
+    global _registry
+    with _registry_lock:
+        _registry = None
+
+class PolicyWatcher:
+    """Background thread that reloads changed policies every interval seconds, or when woken (SIGHUP)."""
+
+    def __init__(self, interval: float = POLICY_RELOAD_INTERVAL):
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="policy-watcher", daemon=True)
+            self._thread.start()
+
+    def trigger(self) -> None:
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval if self.interval > 0 else None)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                get_registry().reload()
+            except Exception:
+                log.exception("policy reload failed")
+
+_watcher: Optional[PolicyWatcher] = None
+
+def start_policy_watcher() -> PolicyWatcher:
+    """Start the reload thread and hook SIGHUP to it (main thread only; elsewhere polling still works)."""
+    global _watcher
+    if _watcher is None:
+        _watcher = PolicyWatcher()
+        _watcher.start()
+        try:
+            signal.signal(signal.SIGHUP, lambda signum, frame: _watcher.trigger())
+        except (AttributeError, ValueError):  # no SIGHUP on Windows / not the main thread
+            pass
+    return _watcher
+
+def stop_policy_watcher() -> None:
+    global _watcher
+    if _watcher is not None:
+        _watcher.stop()
+        _watcher = None
+
+def select_policy(selection: Optional[PolicySelection] = None,
+                  country: Optional[str] = None) -> Tuple[PolicyKey, PolicyEngine]:
+    """(key, engine) for a request selection; unknown policies are a 400."""
+    sel = selection or PolicySelection()
+    registry = get_registry()
+    try:
+        key = registry.resolve(sel.name, sel.version, sel.locale, country)
+        return key, registry.engine(key)
+    except KeyError as e:
+        raise HTTPException(400, str(e.args[0]) if e.args else "unknown policy")
+
+def select_engine(selection: Optional[PolicySelection] = None, country: Optional[str] = None) -> PolicyEngine:
+    return select_policy(selection, country)[1]
+
+def policy_selection(
+    x_policy_name: Optional[str] = Header(default=None),
+    x_policy_version: Optional[str] = Header(default=None),
+    x_policy_locale: Optional[str] = Header(default=None),
+    policy_name: Optional[str] = Query(default=None),
+    policy_version: Optional[str] = Query(default=None),
+    policy_locale: Optional[str] = Query(default=None),
+) -> PolicySelection:
+    """FastAPI dependency: headers win over query parameters."""
+    return PolicySelection(
+        name=x_policy_name or policy_name,
+        version=x_policy_version or policy_version,
+        locale=x_policy_locale or policy_locale,
+    )
@@ -0,0 +1,231 @@
+# backend/profile_matchers.py
+"""
+Per-profile matchers layered on the compiled policy.
+
+A ProfileMatcher turns a profile's allergens (ProfileAllergen rows) and avoid
+list into canonical terms plus a word-boundary automaton, so "PEANUTS", "pinda"
+or "skimmed milk powder" hit the profile the same way the policy vocabulary
+does. Matchers are cached per profile id; update_profile/delete_profile drop
+the entry, and a change to the owner's country (PUT /auth/me) drops all of the
+owner's entries, so a personalized scan needs no DB round trip and no rebuild.
+"""
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+from collections import OrderedDict
+import hashlib, json, os, threading
+
+from fastapi import HTTPException
+
+from .auth import parse_token
+from .matchers import AhoCorasick
+from .metrics import timed
+from .policy_engine import CAT_TRACE, PolicyEngine, _E_NUM_RE
+from .policy_registry import PolicySelection, select_engine, select_policy
+
+PROFILE_MATCHER_CACHE_MAX = int(os.getenv("PROFILE_MATCHER_CACHE_MAX", "1024"))
+
+
+class ProfileMatcher:
+    """A profile's allergens / avoid list compiled against one PolicyEngine."""
+
+    def __init__(self, engine: PolicyEngine, profile_id: int, user_id: int,
+                 allergens: Iterable[str], avoid: Iterable[str], country: Optional[str] = None):
+        self.engine = engine
+        self.profile_id = profile_id
+        self.user_id = user_id
+        self.country = country
+        self._variants: Dict[Hashable, "ProfileMatcher"] = {}  # policy key -> matcher
+        self.raw_allergens: Tuple[str, ...] = tuple(a for a in allergens if a)
+        self.raw_avoid: Tuple[str, ...] = tuple(a for a in avoid if a)
+        # content version: changes whenever the profile's allergens / avoid list do
+        self.version = hashlib.sha256(json.dumps(
+            [profile_id, sorted(self.raw_allergens), sorted(self.raw_avoid)], ensure_ascii=False,
+        ).encode("utf-8")).hexdigest()[:16]
+        weights = (engine.policy.get("scoring", {}) or {}).get("weights", {}) or {}
+        self.w_allergen = int(weights.get("PROFILE_ALLERGEN", 1000))
+        self.w_avoid = int(weights.get("PROFILE_AVOID", 10))
+
+        # canonical term -> every surface form that should hit it (synonym aliases, plural)
+        self.allergens = self._canonical(self.raw_allergens)
+        self.avoid = self._canonical(self.raw_avoid, additives=True)
+        self._forms: Dict[str, Tuple[str, str]] = {}  # surface form -> (kind, canonical term)
+        for kind, terms in (("avoid", self.avoid), ("allergen", self.allergens)):
+            for term in terms:
+                for form in self._surface_forms(term):
+                    self._forms[form] = (kind, term)
+        self.automaton = AhoCorasick(self._forms)
+
+    def _canonical(self, items: Iterable[str], additives: bool = False) -> frozenset:
+        eng = self.engine
+        out = set()
+        for item in items:
+            t = eng.prepare_token(item)
+            if not t:
+                continue
+            # "PEANUTS" -> "peanut" when only the singular is in the policy vocabulary
+            if t not in eng.index and t.endswith("s"):
+                singular = eng.prepare_token(t[:-1])
+                if singular in eng.index:
+                    t = singular
+            out.add(t)
+            if additives:
+                # an avoided additive ("E102") also covers its configured names ("tartrazine")
+                for _, names in eng.additives:
+                    if t in names:
+                        out.update(names)
+        return frozenset(out)
+
+    def _surface_forms(self, term: str) -> List[str]:
+        forms = [term] + [alias for alias, canon in self.engine.syn_map.items() if canon == term]
+        forms += [f + "s" for f in forms if f.isalpha()]
+        return forms
+
+    def hits(self, toks: List[str], masks: List[int]) -> Tuple[List[str], List[str]]:
+        """(allergen terms, avoid terms) found on word boundaries in prepared tokens; trace statements are skipped."""
+        allergens, avoid = set(), set()
+        forms = self._forms
+        for t, m in zip(toks, masks):
+            if m & CAT_TRACE:
+                continue
+            for _, form in self.automaton.iter_word_matches(t):
+                kind, term = forms[form]
+                term = term.upper() if _E_NUM_RE.match(term) else term
+                (allergens if kind == "allergen" else avoid).add(term)
+        return sorted(allergens), sorted(avoid)
+
+    def assess(self, tokens: List[str]) -> Tuple[int, str, List[Dict]]:
+        """Policy assessment plus PROFILE_ALLERGEN / PROFILE_AVOID reasons for this profile."""
+        eng = self.engine
+        toks, masks, agg, fixes = eng.analyze(tokens)
+        with timed("score"):
+            score, verdict, reasons = eng.score(toks, masks, agg, fixes)
+        with timed("profile"):
+            allergens, avoid = self.hits(toks, masks)
+        if not (allergens or avoid):
+            return score, verdict, reasons
+        if any(r["code"] == "UNKNOWN" for r in reasons):
+            # the profile matched something, so "no specific concerns" no longer holds
+            reasons = [r for r in reasons if r["code"] != "UNKNOWN"]
+            score -= eng.w_unknown
+        if allergens:
+            reasons.append({"code": "PROFILE_ALLERGEN", "param": ", ".join(allergens)})
+            score += self.w_allergen
+        if avoid:
+            reasons.append({"code": "PROFILE_AVOID", "param": ", ".join(avoid)})
+            score += self.w_avoid
+        return score, "avoid" if verdict == "avoid" else eng.verdict_for(score), reasons
+
+    def rebind(self, engine: PolicyEngine, key: Hashable) -> "ProfileMatcher":
+        """
+        Same profile compiled against the engine currently serving a policy key; no
+        DB access. One variant per key: a reloaded engine replaces the stale one.
+        """
+        if engine is self.engine:
+            return self
+        variant = self._variants.get(key)
+        if variant is None or variant.engine is not engine:
+            variant = self._variants[key] = ProfileMatcher(
+                engine, self.profile_id, self.user_id, self.raw_allergens, self.raw_avoid, self.country)
+        return variant
+
+
+# ---------- cache ----------
+_lock = threading.Lock()
+_cache: "OrderedDict[int, ProfileMatcher]" = OrderedDict()
+_generation: Dict[int, int] = {}  # bumped on invalidation; a load that raced with it is not cached
+_user_generation: Dict[int, int] = {}  # same, for invalidate_user
+_hits = _misses = 0
+
+def invalidate_profile(profile_id: int) -> None:
+    """Drop the cached matcher for a profile (called after its allergens / avoid list change)."""
+    with _lock:
+        _cache.pop(profile_id, None)
+        _generation[profile_id] = _generation.get(profile_id, 0) + 1
+
+def invalidate_user(user_id: int) -> None:
+    """Drop the cached matchers of every profile a user owns (called after the user's country changes)."""
+    with _lock:
+        for pid in [pid for pid, m in _cache.items() if m.user_id == user_id]:
+            del _cache[pid]
+        _user_generation[user_id] = _user_generation.get(user_id, 0) + 1
+
+def clear_profile_cache() -> None:
+    global _hits, _misses
+    with _lock:
+        _cache.clear()
+        _hits = _misses = 0
+
+def profile_cache_stats() -> Dict:
+    """Same shape as LRUCache.stats()."""
+    total = _hits + _misses
+    return {"size": len(_cache), "maxsize": PROFILE_MATCHER_CACHE_MAX, "hits": _hits,
+            "misses": _misses, "hit_ratio": _hits / total if total else 0.0}
+
+def _load(profile_id: int) -> Optional[ProfileMatcher]:
+    from .api_profiles import _extract_avoid_list  # lazy: api_profiles imports this module
+    from .db import SessionLocal
+    from .models import Profile, User
+
+    with SessionLocal() as session:
+        prof = session.get(Profile, profile_id)
+        if prof is None:
+            return None
+        country = prof.country
+        if not country:
+            owner = session.get(User, prof.user_id)
+            country = owner.country if owner else None
+        allergens = [pa.allergen for pa in getattr(prof, "allergens", [])]
+        return ProfileMatcher(select_engine(country=country), prof.id, prof.user_id, allergens,
+                              _extract_avoid_list(prof), country)
+
+def get_profile_matcher(profile_id: int, user_id: int,
+                        selection: Optional[PolicySelection] = None) -> Optional[ProfileMatcher]:
+    """
+    Cached matcher for a profile owned by user_id, or None if there is no such profile.
+    The policy is the request's selection, else the one for the profile's country.
+    """
+    global _hits, _misses
+    with _lock:
+        matcher = _cache.get(profile_id)
+        gen = _generation.get(profile_id, 0)
+        user_gen = _user_generation.get(user_id, 0)
+        if matcher is not None:
+            _cache.move_to_end(profile_id)
+            _hits += 1
+        else:
+            _misses += 1
+    if matcher is None:
+        matcher = _load(profile_id)
+        if matcher is None:
+            return None
+    if matcher.user_id != user_id:
+        return None
+    with _lock:
+        if _generation.get(profile_id, 0) == gen and _user_generation.get(user_id, 0) == user_gen:
+            _cache[profile_id] = matcher
+            _cache.move_to_end(profile_id)
+            while len(_cache) > PROFILE_MATCHER_CACHE_MAX:
+                _cache.popitem(last=False)
+    key, engine = select_policy(selection, country=matcher.country)
+    return matcher.rebind(engine, key)
+
+def profile_matcher_for(profile_id: Optional[str], authorization: Optional[str],
+                        selection: Optional[PolicySelection] = None) -> Optional[ProfileMatcher]:
+    """
+    Resolve a request's profileId to a matcher. The bearer token is only decoded
+    (no user lookup); the profile must belong to the token's user.
+    """
+    if not profile_id:
+        return None
+    if not authorization or not authorization.lower().startswith("bearer "):
+        raise HTTPException(401, "Missing bearer token")
+    uid = parse_token(authorization.split(" ", 1)[1].strip())
+    if not uid:
+        raise HTTPException(401, "Invalid token")
+    try:
+        pid = int(profile_id)
+    except (TypeError, ValueError):
+        raise HTTPException(404, "Profile not found")
+    matcher = get_profile_matcher(pid, uid, selection)
+    if matcher is None:
+        raise HTTPException(404, "Profile not found")
+    return matcher
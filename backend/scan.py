@@ -0,0 +1,51 @@
+# backend/scan.py
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from typing import Dict, List, Optional, Tuple
+
+from .ingredients import split_ingredients
+from .metrics import VERDICTS, phase_timing, timed
+from .ocr import OcrRequest, extract_text
+from .ocr_upload import parse_image_request, upload_openapi
+from .policy_registry import PolicySelection, policy_selection, select_engine
+from .profile_matchers import profile_matcher_for
+
+router = APIRouter()
+
+class ScanReq(OcrRequest):
+    profileId: Optional[str] = None
+
+class ScanResp(BaseModel):
+    text: str
+    tokens: List[str]
+    score: int
+    verdict: str
+    reasons: List[Dict]
+
+def _resolve_engine(req: ScanReq, authorization: Optional[str], selection: PolicySelection):
+    matcher = profile_matcher_for(req.profileId, authorization, selection)
+    return matcher or select_engine(selection)
+
+def _assess_text(engine, text: str) -> Tuple[List[str], Tuple[int, str, List[Dict]]]:
+    with timed("tokenize"):
+        tokens = split_ingredients(text)
+    if not tokens:
+        raise HTTPException(422, "no ingredients recognized in image")
+    return tokens, engine.assess(tokens)
+
+@router.post("/v1/scan", response_model=ScanResp, openapi_extra=upload_openapi(ScanReq))
+async def scan(request: Request, response: Response, authorization: Optional[str] = Header(default=None),
+               selection: PolicySelection = Depends(policy_selection)):
+    """OCR -> tokenize -> assess in one round trip. The photo may also be a multipart or raw image/* upload."""
+    req, content = await parse_image_request(request, ScanReq)
+    # resolve profile and policy before paying for OCR; DB lookups and scoring stay off the event loop
+    engine = await run_in_threadpool(_resolve_engine, req, authorization, selection)
+    with phase_timing() as timer:
+        with timed("ocr"):
+            text = await extract_text(req, content)
+        tokens, (score, verdict, reasons) = await run_in_threadpool(_assess_text, engine, text)
+    if timer is not None:
+        response.headers["Server-Timing"] = timer.header()
+    VERDICTS.inc("/v1/scan", verdict)
+    return ScanResp(text=text, tokens=tokens, score=score, verdict=verdict, reasons=reasons)
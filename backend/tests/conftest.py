@@ -13,6 +13,9 @@ if str(REPO_ROOT) not in sys.path:
 # Test env defaults (your db bootstrap reads env in init_db/ensure_schema_if_dev)
 os.environ.setdefault("ENV", "test")
 os.environ.setdefault("DATABASE_URL", "sqlite:///./.test-api.sqlite")
+if os.getenv("LIVE_OCR") != "1":
+    os.environ.setdefault("OCR_BACKEND", "fake")  # no network; see backend/ocr.py
+os.environ.setdefault("OCR_CACHE_DIR", "")  # memory tier only: no results shared across runs
 
 # *** NEW: wipe stale test DB so emails & data don’t persist across runs ***
 db_file = REPO_ROOT / ".test-api.sqlite"
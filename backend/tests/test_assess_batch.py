@@ -0,0 +1,35 @@
+# backend/tests/test_assess_batch.py
+import backend.assess as assess_mod
+
+
+LABELS = [
+    ["milk", "sugar"],
+    ["soap", "milk"],
+    ["water"],
+    ["May contain nuts", "cocoa"],
+    ["gelatine", "E951", "melk"],
+]
+
+
+def test_batch_matches_single_assess_in_order(client):
+    r = client.post("/v1/assess/batch", json={"items": [{"ingredients": x} for x in LABELS]})
+    assert r.status_code == 200, r.text
+    results = r.json()["results"]
+    assert len(results) == len(LABELS)
+    for label, got in zip(LABELS, results):
+        single = client.post("/v1/assess", json={"ingredients": label})
+        assert single.status_code == 200
+        assert got == single.json()
+
+
+def test_batch_size_limit(client, monkeypatch):
+    monkeypatch.setattr(assess_mod, "ASSESS_BATCH_MAX", 2)
+    r = client.post("/v1/assess/batch", json={"items": [{"ingredients": ["milk"]}] * 3})
+    assert r.status_code == 413
+
+
+def test_batch_rejects_empty_items(client):
+    assert client.post("/v1/assess/batch", json={"items": []}).status_code == 400
+    r = client.post("/v1/assess/batch", json={"items": [{"ingredients": ["milk"]}, {"ingredients": []}]})
+    assert r.status_code == 400
+    assert "items[1]" in r.json()["detail"]
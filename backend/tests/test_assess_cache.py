@@ -0,0 +1,54 @@
+# backend/tests/test_assess_cache.py
+from backend.lru import LRUCache
+
+
+def test_lru_cache_evicts_and_expires():
+    now = [0.0]
+    cache = LRUCache(2, ttl=10, clock=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    now[0] = 11
+    assert cache.get("a") is None and len(cache) == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_assess_emits_etag_and_answers_304(client):
+    from backend import assess
+
+    assess._RESULT_CACHE.clear()
+    r = client.post("/v1/assess", json={"ingredients": ["Sugar", "Melk"]})
+    assert r.status_code == 200
+    etag = r.headers["etag"]
+
+    # same normalized tokens -> same content address, served from the cache
+    again = client.post("/v1/assess", json={"ingredients": [" sugar ", "milk"]})
+    assert again.headers["etag"] == etag and again.json() == r.json()
+    assert assess._RESULT_CACHE.hits == 1
+
+    nm = client.post("/v1/assess", json={"ingredients": ["sugar", "milk"]},
+                     headers={"If-None-Match": f'W/{etag}, "other"'})
+    assert nm.status_code == 304 and nm.content == b""
+    assert nm.headers["etag"] == etag
+
+    other = client.post("/v1/assess", json={"ingredients": ["sugar"]}, headers={"If-None-Match": etag})
+    assert other.status_code == 200 and other.headers["etag"] != etag
+
+
+def test_result_key_skips_fuzzy_and_multiword_work(monkeypatch):
+    from backend.assess import result_key
+    from backend.policy_engine import PolicyEngine, load_policy
+
+    engine = PolicyEngine(load_policy())
+
+    def boom(*_):
+        raise AssertionError("result_key ran a budgeted pass")
+
+    monkeypatch.setattr(engine, "correct", boom)
+    monkeypatch.setattr(engine, "embedded_terms", boom)
+    monkeypatch.setattr(engine, "mask_of", boom)
+    key = result_key([" Sugar ", "Melk", "arachlde oil"], engine)
+    assert key == result_key(["sugar", "milk", "arachlde oil"], engine)
+    assert key != result_key(["sugar"], engine)
@@ -0,0 +1,39 @@
+# backend/tests/test_bench_assess.py
+import json
+import random
+
+from backend.bench_assess import compare, main, make_corpus, make_policy, scenarios
+from backend.policy_engine import PolicyEngine
+
+
+def test_synthetic_corpus_is_deterministic_and_assessable():
+    a, b = random.Random(7), random.Random(7)
+    policy = make_policy(a, hazards=50, patterns=8)
+    assert policy == make_policy(b, hazards=50, patterns=8)
+    corpus = make_corpus(a, policy, labels=10, tokens=30, synonym_density=0.5)
+    assert corpus == make_corpus(b, policy, labels=10, tokens=30, synonym_density=0.5)
+    assert all(len(label) == 30 for label in corpus)
+    engine = PolicyEngine(policy)
+    assert len(engine.hazardous_chems) == 50 and len(engine.trace_patterns) + len(engine.deny_patterns) == 8
+    assert [engine.assess(label)[1] for label in corpus]
+    assert {"base", "tokens=500", "hazards=10000", "patterns=32", "synonyms=0.6"} <= set(scenarios())
+
+
+def test_baseline_round_trip_and_regression_gate(tmp_path, capsys):
+    path = tmp_path / "bench.json"
+    assert main(["--quick", "--scenario", "tokens=5", "--save-baseline", str(path)]) == 0
+    baseline = json.loads(path.read_text(encoding="utf-8"))
+    run = baseline["scenarios"]["tokens=5"]
+    assert set(run["cold_us"]) == {"prepare", "classify", "score", "total"}
+    assert run["alloc_bytes"]["prepare"] > 0
+    assert compare(baseline, baseline) == []
+
+    # a baseline twice as fast as today makes the current run a regression
+    faster = json.loads(path.read_text(encoding="utf-8"))
+    for mode in ("cold_us", "warm_us"):
+        for stats in faster["scenarios"]["tokens=5"][mode].values():
+            stats["p50"] = stats["p50"] / 2 - 10
+    assert compare(baseline, faster)
+    path.write_text(json.dumps(faster), encoding="utf-8")
+    assert main(["--quick", "--scenario", "tokens=5", "--baseline", str(path)]) == 1
+    assert "regression" in capsys.readouterr().err
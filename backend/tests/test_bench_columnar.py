@@ -0,0 +1,25 @@
+# backend/tests/test_bench_columnar.py
+import json
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from backend.bench_columnar import main, make_chunks
+from backend.policy_engine import load_policy
+
+
+def test_synthetic_chunks_are_deterministic_and_high_cardinality():
+    policy = load_policy()
+    a = make_chunks(random.Random(3), policy, chunks=2, chunk_size=50, unique=0.5)
+    assert a == make_chunks(random.Random(3), policy, chunks=2, chunk_size=50, unique=0.5)
+    tokens = [t for chunk in a for label in chunk for t in label]
+    assert len(set(tokens)) > len(tokens) // 3
+
+
+def test_quick_run_reports_both_paths_with_parity(capsys):
+    assert main(["--quick", "--unique", "0.2", "--json", "-"]) == 0
+    result = json.loads(capsys.readouterr().out)
+    (run,) = result["runs"]
+    assert run["mismatches"] == 0 and run["columnar_ms_p50"] > 0 and run["assess_many_ms_p50"] > 0
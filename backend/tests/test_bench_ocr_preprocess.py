@@ -0,0 +1,29 @@
+# backend/tests/test_bench_ocr_preprocess.py
+import json
+
+from backend.bench_ocr_preprocess import load_fixtures, main, run, settings, similarity, synthetic_fixtures
+from backend.ocr import FakeOcr
+
+
+def test_report_covers_every_setting(tmp_path, capsys):
+    path = tmp_path / "report.json"
+    assert main(["--quick", "--json", str(path)]) == 0
+    report = json.loads(path.read_text(encoding="utf-8"))
+    (row,) = report["settings"]
+    assert row["bytes_out"] < row["bytes_in"] and 0 < row["saved"] < 1 and row["accuracy"] is None
+    assert "edge=1024 q=85 gray" in capsys.readouterr().out
+    assert len(settings((1024, 2048), (70, 85))) == 8
+
+
+def test_fixture_directory_and_accuracy(tmp_path):
+    (name, photo, text), = synthetic_fixtures(1, size=(800, 600))
+    (tmp_path / "label.jpg").write_bytes(photo)
+    (tmp_path / "label.txt").write_text(text, encoding="utf-8")
+    (tmp_path / "notes.md").write_text("ignored", encoding="utf-8")
+    fixtures = load_fixtures(str(tmp_path))
+    assert [(n, e) for n, _, e in fixtures] == [("label.jpg", text)]
+
+    # FakeOcr reads non-UTF-8 bytes as its fixed label, so accuracy is that label vs the expected text
+    result = run(fixtures, settings((400,), (80,), (True,)), lambda: FakeOcr(text=text.upper()))
+    assert result["meta"]["backend"] == "FakeOcr" and result["settings"][0]["accuracy"] == 1.0
+    assert similarity("Sugar,  salt", "sugar, salt") == 1.0 and similarity("sugar", "milk") < 0.5
@@ -0,0 +1,71 @@
+# backend/tests/test_bulk_assess.py
+import csv
+import gzip
+import json
+
+import pytest
+
+from backend.assess import assess_tokens
+from backend.bulk_assess import main
+from backend.policy_engine import get_engine
+
+PRODUCTS = [
+    {"code": "1", "ingredients_text": "sugar, milk; cocoa butter"},
+    {"code": "2", "ingredients_text": "water, soap"},
+    {"code": "3", "ingredients": [{"text": "gelatine"}, {"text": "E951"}], "ingredients_text": None},
+    {"code": "4", "ingredients_text": ""},
+    {"code": "5", "ingredients_text": "salt, may contain nuts"},
+]
+
+
+def _write_jsonl_gz(path, rows):
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+        f.write("{not json\n")
+
+
+def _expected(tokens):
+    return assess_tokens(tokens, get_engine())
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_bulk_ndjson_in_input_order(tmp_path, workers):
+    src = tmp_path / "dump.jsonl.gz"
+    _write_jsonl_gz(src, PRODUCTS)
+    out = tmp_path / "out.ndjson"
+    rc = main([str(src), "-o", str(out), "--workers", str(workers), "--chunk-size", "2", "-q"])
+    assert rc == 0
+    rows = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    assert [r["line"] for r in rows] == [1, 2, 3, 4, 5, 6]
+    assert rows[0]["id"] == "1"
+    assert (rows[0]["score"], rows[0]["verdict"], rows[0]["reasons"]) == _expected(["sugar", "milk", "cocoa butter"])
+    assert rows[1]["verdict"] == "avoid"
+    # product 3 only has the OFF-style "ingredients" list
+    assert (rows[2]["score"], rows[2]["verdict"], rows[2]["reasons"]) == _expected(["gelatine", "E951"])
+    assert rows[3]["error"] == "no ingredients"
+    assert rows[5]["error"] == "invalid json"
+
+
+def test_bulk_csv_resumes_from_checkpoint(tmp_path):
+    src = tmp_path / "dump.csv"
+    with open(src, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["code", "ingredients_text"])
+        for i in range(10):
+            w.writerow([str(i), "milk, sugar" if i % 2 else "water"])
+    out = tmp_path / "out.csv"
+    ckpt = tmp_path / "run.ckpt"
+
+    # simulate an interrupted run: first 4 records flushed, then garbage after the checkpoint offset
+    main([str(src), "-o", str(out), "--workers", "0", "--chunk-size", "4", "-q",
+          "--checkpoint", str(ckpt), "--keep-checkpoint"])
+    full = out.read_text(encoding="utf-8")
+    header_and_four = "".join(full.splitlines(keepends=True)[:5])
+    out.write_text(header_and_four + "partial,row", encoding="utf-8")
+    ckpt.write_text(json.dumps({"input": str(src.resolve()), "records": 4,
+                                "output_bytes": len(header_and_four.encode("utf-8"))}))
+
+    main([str(src), "-o", str(out), "--workers", "0", "--chunk-size", "4", "-q", "--checkpoint", str(ckpt)])
+    assert out.read_text(encoding="utf-8") == full
+    assert not ckpt.exists()
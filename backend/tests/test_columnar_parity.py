@@ -0,0 +1,84 @@
+# backend/tests/test_columnar_parity.py
+import copy
+import json
+import random
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from backend.assess import assess_tokens
+from backend.columnar import ColumnarAssessor
+from backend.policy_engine import compile_policy
+
+POLICY_FILE = Path(__file__).resolve().parents[1] / "policies" / "policy_v2.json"
+
+
+def _policies():
+    base = json.loads(POLICY_FILE.read_text(encoding="utf-8"))
+    strict = copy.deepcopy(base)
+    strict["patterns"]["deny_patterns"] = [r"^[a-z ]+ oil$"]
+    strict["patterns"]["allow_patterns"] = [r"^olive oil$"]
+    strict["overrides"] = {"hard_avoid_codes": ["HAZARDOUS_CHEM"], "hard_avoid_tokens": ["denatonium"]}
+    strict["tokens"]["additives"].append({"id": "e102", "names": ["tartrazine"]})
+    return [base, strict, {}]
+
+
+def _corpus(policy, n, seed):
+    rng = random.Random(seed)
+    toks = policy.get("tokens", {})
+    vocab = ["water", "sugar", "salt", "E330", "e471", "olive oil", "palm oil", "tartrazine",
+             "may contain nuts", "Contains traces of nuts", "x formaldehyde y", "denatonium",
+             "  Milk ", "ｅ９５１", "", "  ", "Aspartame", "cocoa butter",
+             "sugar tree nut oil soy lecithin", "lécithine de soja noix de cajou"]
+    for key in ("major_allergens", "animal_tokens", "default_unsafe_tokens", "unsafe_allowlist"):
+        vocab += toks.get(key, [])
+    for canonical, aliases in (toks.get("synonyms") or {}).items():
+        vocab += [canonical] + aliases
+    rare = {"soap", "bleach", "lye", "x formaldehyde y", "denatonium", "palm oil"}
+    common = [v for v in vocab if v not in rare]
+    corpus = []
+    for _ in range(n):
+        label = [rng.choice(common) for _ in range(rng.randint(0, 12))]
+        if rng.random() < 0.1:
+            label.insert(rng.randint(0, len(label)), rng.choice(sorted(rare)))
+        corpus.append(label)
+    return corpus
+
+
+@pytest.mark.parametrize("idx", [0, 1, 2])
+def test_columnar_matches_assess_tokens(idx):
+    policy = _policies()[idx]
+    corpus = _corpus(policy, 3000, seed=idx)
+    got = ColumnarAssessor(compile_policy(policy)).assess_corpus(corpus)
+    expected = [assess_tokens(label, policy) for label in corpus]
+    assert got == expected
+
+
+def test_columnar_handles_empty_input():
+    col = ColumnarAssessor(compile_policy({}))
+    assert col.assess_corpus([]) == []
+    assert col.assess_corpus([[], [""]]) == [assess_tokens([], {}), assess_tokens([""], {})]
+
+
+def test_columnar_carries_fuzzy_notes():
+    policy = copy.deepcopy(_policies()[0])
+    policy["matching"] = {"fuzzy": True}
+    engine = compile_policy(policy)
+    corpus = [["sugar", "peanvt"], ["peanvt"], ["sugar"], ["bleech", "salt"], []]
+    assert ColumnarAssessor(engine).assess_corpus(corpus) == [engine.assess(label) for label in corpus]
+
+
+def test_columnar_vocabulary_is_bounded_across_chunks():
+    policy = _policies()[0]
+    engine = compile_policy(policy)
+    col = ColumnarAssessor(engine, max_vocab=len(engine.index) + 50)
+    base = len(col.tokens)
+    for n in range(5):
+        chunk = [[f"oneoff {n} {i}", "milk", "sugar"] for i in range(40)] + _corpus(policy, 20, seed=n)
+        assert col.assess_corpus(chunk) == [assess_tokens(label, policy) for label in chunk]
+        assert len(col.tokens) <= base + 40 + 60  # reset before a chunk once over max_vocab
+        assert col._built == len(col.tokens)  # tables extended for new ids only
+    col.reset()
+    assert len(col.tokens) == base and not col._raw
@@ -0,0 +1,35 @@
+# backend/tests/test_compile_policy.py
+import hashlib
+import json
+
+from backend.compile_policy import main
+from backend.policy_engine import PolicyEngine, load_engine_file, read_snapshot, snapshot_path
+
+
+POLICY = {"tokens": {"major_allergens": ["milk"], "synonyms": {"milk": ["melk"]}},
+          "matching": {"fuzzy": True, "multiword": True}}
+
+
+def test_snapshot_round_trip_and_stale_fallback(tmp_path):
+    path = tmp_path / "policy_v9.json"
+    path.write_text(json.dumps(POLICY), encoding="utf-8")
+    assert main([str(path)]) == 0
+    assert main([str(path), "--check"]) == 0
+
+    # the snapshot is what gets loaded, and it scores like a fresh compile
+    digest = hashlib.sha256(path.read_bytes()).digest()
+    assert read_snapshot(snapshot_path(str(path)), digest) is not None
+    engine = load_engine_file(str(path))
+    assert engine.source == str(path)
+    assert engine.assess(["Melkk"]) == PolicyEngine(POLICY).assess(["Melkk"])
+
+    # policy edited after the snapshot was built -> snapshot ignored, JSON compiled
+    changed = dict(POLICY, tokens={"major_allergens": ["egg"]})
+    path.write_text(json.dumps(changed), encoding="utf-8")
+    assert main([str(path), "--check"]) == 1
+    assert "egg" in load_engine_file(str(path)).major_allergens
+
+    # garbage snapshot -> ignored as well
+    with open(snapshot_path(str(path)), "wb") as f:
+        f.write(b"not a snapshot")
+    assert "egg" in load_engine_file(str(path)).major_allergens
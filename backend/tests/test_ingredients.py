@@ -0,0 +1,60 @@
+# backend/tests/test_ingredients.py
+import base64
+
+import pytest
+
+from backend.ingredients import iter_ingredients, split_ingredients
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Ingredients: Sugar, palm oil, hazelnuts 13%, skimmed milk powder 8,7%, emulsifier: lecithins (soya), vanillin.",
+     ["Sugar", "palm oil", "hazelnuts", "skimmed milk powder", "lecithins", "soya", "vanillin"]),
+    ("chocolate (sugar, cocoa butter, milk), salt; E 322, e-150d",
+     ["chocolate", "sugar", "cocoa butter", "milk", "salt", "E322", "E150d"]),
+    ("Ingrédients : farine de blé, sucre, œufs 12 %. Peut contenir des traces de noix.",
+     ["farine de blé", "sucre", "œufs", "Peut contenir des traces de noix"]),
+    ("Product of Belgium\nIngrediënten: tarwebloem, suiker (2,5%), melk.",
+     ["tarwebloem", "suiker", "melk"]),
+    ("water, may contain: nuts", ["water", "may contain: nuts"]),
+    ("a,,b;;[c]", ["a", "b", "c"]),
+    ("Ingredients: sugar, cocoa mass. Contains: milk.", ["sugar", "cocoa mass", "milk"]),
+    ("Contains milk, soy. May contain: nuts", ["milk", "soy", "May contain: nuts"]),
+    ("Ingrediënten: suiker. Bevat: melk. Kan sporen bevatten van noten.",
+     ["suiker", "melk", "Kan sporen bevatten van noten"]),
+    ("Ingredients:\nsugar\nwheat flour\r\nmilk powder\n", ["sugar", "wheat flour", "milk powder"]),
+    ("Ingredients: skimmed milk\npowder, E322(ii), salt", ["skimmed milk powder", "E322", "salt"]),
+])
+def test_split_ingredients(text, expected):
+    assert split_ingredients(text) == expected
+
+
+def test_iter_ingredients_streams_chunks():
+    chunks = ["Ingredi", "ents: sug", "ar, mi", "lk (2", ",5%), sa", "lt"]
+    assert list(iter_ingredients(iter(chunks))) == ["sugar", "milk", "salt"]
+
+
+def test_scan_endpoint_combines_ocr_tokenize_assess(client):
+    # the fake OCR backend (OCR_BACKEND=fake in conftest) reads UTF-8 "images" back as their text
+    image = base64.b64encode("Ingredients: sugar, milk (2%), E951".encode()).decode()
+    r = client.post("/v1/scan", json={"image_base64": image})
+    assert r.status_code == 200, r.text
+    data = r.json()
+    assert data["tokens"] == ["sugar", "milk", "E951"]
+    assert data["verdict"] == "caution"
+    assert {"code": "ADDITIVE_FLAG", "param": "E951"} in data["reasons"]
+
+    assert client.post("/v1/scan", json={"image_base64": base64.b64encode(b"12345").decode()}).status_code == 422
+
+
+@pytest.mark.parametrize("label, allergen", [
+    ("Ingredients: sugar, cocoa mass. Contains: milk.", "milk"),
+    ("Ingrediënten: suiker, cacaomassa. Bevat: melk.", "melk"),
+    ("Ingredients:\nsugar\ncocoa mass\nmilk\n", "milk"),
+])
+def test_scan_flags_declared_allergens(client, label, allergen):
+    r = client.post("/v1/scan", json={"image_base64": base64.b64encode(label.encode()).decode()})
+    assert r.status_code == 200, r.text
+    data = r.json()
+    assert allergen in data["tokens"]
+    assert data["verdict"] != "safe"
+    assert "UNKNOWN" not in {reason["code"] for reason in data["reasons"]}
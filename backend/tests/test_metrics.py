@@ -0,0 +1,87 @@
+# backend/tests/test_metrics.py
+from backend.metrics import PHASE_SECONDS, Histogram, phase_timing
+from backend.policy_engine import compile_policy
+
+
+POLICY = {
+    "matching": {"fuzzy": True, "multiword": True},
+    "tokens": {"major_allergens": ["milk", "tree nut"], "hazardous_chemicals": ["formaldehyde"],
+               "synonyms": {"milk": ["melk"]}},
+    "patterns": {"trace_allergen_patterns": [r"(?i)may\s+contain"]},
+}
+
+
+def test_histogram_buckets_are_cumulative():
+    h = Histogram("h", "test", ("phase",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 0.7, 3.0):
+        h.observe(v, "x")
+    s = h.series()[("x",)]
+    assert s["buckets"] == [(0.1, 1), (1.0, 3), (float("inf"), 4)]
+    assert s["count"] == 4 and abs(s["sum"] - 4.25) < 1e-9
+
+
+def test_timed_pipeline_matches_untimed_and_records_phases():
+    engine = compile_policy(POLICY)
+    labels = [["Melk", "sugar tree nut oil"], ["may contain nuts", "Milkk", "E330"], ["x formaldehyde"]]
+    plain = [engine.assess(label) for label in labels]
+
+    PHASE_SECONDS.clear()
+    fresh = compile_policy(dict(POLICY, version="fresh"))  # empty memo tables: classification runs
+    with phase_timing(True) as timer:
+        assert [fresh.assess(label) for label in labels] == plain
+    for phase in ("normalize", "synonyms", "fuzzy", "multiword", "classify", "hazard_scan", "patterns", "score"):
+        assert phase in timer.phases
+    assert "classify;dur=" in timer.header()
+    assert PHASE_SECONDS.series()[("score",)]["count"] == 1
+
+    with phase_timing(False) as timer:
+        assert timer is None
+
+
+def test_server_timing_header_when_enabled(client, monkeypatch):
+    from backend import api_admin, assess, metrics
+
+    r = client.post("/v1/assess", json={"ingredients": ["sugar"]})
+    assert "server-timing" not in r.headers
+
+    monkeypatch.setattr(metrics, "ASSESS_PHASE_TIMING", True)
+    assess._RESULT_CACHE.clear()
+    r = client.post("/v1/assess", json={"ingredients": ["sugar", "milk"]})
+    assert "cache_key;dur=" in r.headers["server-timing"] and "score;dur=" in r.headers["server-timing"]
+    nm = client.post("/v1/assess", json={"ingredients": ["sugar", "milk"]},
+                     headers={"If-None-Match": r.headers["etag"]})
+    assert nm.status_code == 304 and "cache_key" in nm.headers["server-timing"]
+    batch = client.post("/v1/assess/batch", json={"items": [{"ingredients": ["sugar"]}]})
+    assert "assess_many;dur=" in batch.headers["server-timing"]
+
+    monkeypatch.setattr(api_admin, "ADMIN_TOKEN", "s3cret")
+    phases = client.get("/admin/timings", headers={"X-Admin-Token": "s3cret"}).json()["phases"]
+    assert phases["cache_key"]["count"] >= 2
+
+
+def test_metrics_endpoint_exposes_routes_verdicts_caches_and_pool(client, monkeypatch):
+    from backend import api_metrics
+
+    client.post("/v1/assess", json={"ingredients": ["sugar"]})
+    client.get("/no/such/path")
+    text = client.get("/metrics").text
+    assert "# TYPE foodscanner_http_request_duration_seconds histogram" in text
+    assert 'foodscanner_http_request_duration_seconds_count{method="POST",route="/v1/assess",status="200"}' in text
+    assert 'route="unmatched",status="404"' in text
+    assert 'foodscanner_verdicts_total{route="/v1/assess",verdict="safe"}' in text
+    for cache in ("assess_result", "policy_engine", "profile_matcher"):
+        assert f'foodscanner_cache_hit_ratio{{cache="{cache}"}}' in text
+    assert "foodscanner_db_pool_checked_out " in text
+    assert "foodscanner_http_requests_in_flight 1" in text  # the scrape itself
+    # cache counts restart when a cache is cleared: gauges, not counters
+    assert "# TYPE foodscanner_cache_hits gauge" in text and "foodscanner_cache_hits_total" not in text
+
+    calls = []
+    collect = api_metrics._collect_cache_stats
+    monkeypatch.setattr(api_metrics, "_collect_cache_stats", lambda: calls.append(1) or collect())
+    assert client.get("/metrics").status_code == 200
+    assert len(calls) == 1  # one snapshot per scrape, shared by every cache gauge
+
+    monkeypatch.setattr(api_metrics, "METRICS_TOKEN", "scrape")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape"}).status_code == 200
@@ -0,0 +1,244 @@
+# backend/tests/test_ocr.py
+import base64
+
+from backend import ocr as ocr_mod
+from backend.ocr_cache import OcrCache, image_key
+
+
+class FlakyOcr:
+    """Fails with a transient error `failures` times, then answers."""
+
+    def __init__(self, failures, delay=0.0):
+        self.failures = failures
+        self.delay = delay
+        self.calls = 0
+
+    async def detect(self, content, url, timeout):
+        import asyncio
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.calls <= self.failures:
+            raise ocr_mod.TransientOcrError("UNAVAILABLE")
+        return "sugar, salt"
+
+    async def close(self):
+        pass
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode()
+
+
+def test_fake_backend_and_request_validation(client):
+    assert isinstance(ocr_mod._backend, ocr_mod.FakeOcr)  # created once by the lifespan
+    assert client.post("/v1/ocr", json={"image_base64": _b64(b"milk, eggs")}).json() == {"text": "milk, eggs"}
+    assert client.post("/v1/ocr", json={"image_base64": _b64(b"\x89PNG\r\n")}).json()["text"] == ocr_mod.OCR_FAKE_TEXT
+    assert client.post("/v1/ocr", json={}).status_code == 400
+    assert client.post("/v1/ocr", json={"image_base64": "not base64!"}).status_code == 400
+
+
+def test_transient_failures_are_retried_then_surface(client, monkeypatch):
+    monkeypatch.setattr(ocr_mod, "_cache", OcrCache(directory=None))
+    monkeypatch.setattr(ocr_mod, "OCR_RETRY_BACKOFF", 0.0)
+    flaky = FlakyOcr(failures=2)
+    monkeypatch.setattr(ocr_mod, "_backend", flaky)
+    r = client.post("/v1/ocr", json={"image_base64": _b64(b"x")})
+    assert r.status_code == 200 and r.json() == {"text": "sugar, salt"} and flaky.calls == 3
+
+    down = FlakyOcr(failures=99)
+    monkeypatch.setattr(ocr_mod, "_backend", down)
+    assert client.post("/v1/ocr", json={"image_base64": _b64(b"y")}).status_code == 502
+    assert down.calls == ocr_mod.OCR_RETRIES + 1
+
+    monkeypatch.setattr(ocr_mod, "OCR_TIMEOUT", 0.01)
+    monkeypatch.setattr(ocr_mod, "OCR_RETRIES", 0)
+    monkeypatch.setattr(ocr_mod, "_backend", FlakyOcr(failures=0, delay=1.0))
+    assert client.post("/v1/ocr", json={"image_base64": _b64(b"z")}).status_code == 504
+
+
+def test_backend_from_another_event_loop_is_closed_when_replaced(monkeypatch):
+    import asyncio
+
+    class StaleVision(ocr_mod.VisionOcr):
+        def __init__(self):
+            self.closed = False
+
+        async def close(self):
+            self.closed = True
+
+    stale, old_loop = StaleVision(), asyncio.new_event_loop()
+    old_loop.close()
+    monkeypatch.setattr(ocr_mod, "_backend", stale)
+    monkeypatch.setattr(ocr_mod, "_backend_loop", old_loop)
+    monkeypatch.setattr(ocr_mod, "_create_backend", ocr_mod.FakeOcr)
+    assert isinstance(asyncio.run(ocr_mod.get_ocr_backend()), ocr_mod.FakeOcr)
+    assert stale.closed
+
+
+def test_ocr_cache_tiers_and_disk_cap(tmp_path):
+    cache = OcrCache(maxsize=2, directory=str(tmp_path), max_bytes=100)
+    keys = [image_key("FakeOcr", bytes([i])) for i in range(4)]
+    assert image_key("VisionOcr", b"\x00") != keys[0]
+    assert cache.get(keys[0]) is None
+    cache.set(keys[0], "sugar, salt")
+    assert cache.get(keys[0]) == "sugar, salt"
+
+    # a new process (or worker) finds it on disk and promotes it to memory
+    restarted = OcrCache(maxsize=2, directory=str(tmp_path), max_bytes=100)
+    assert restarted.get(keys[0]) == "sugar, salt" and restarted.get(keys[0]) == "sugar, salt"
+    stats = restarted.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 0)
+
+    # 3 x 40 bytes > 100: the least recently used file goes
+    for k in keys[1:]:
+        restarted.set(k, "x" * 40)
+    assert restarted.stats()["disk_bytes"] <= 90
+    assert OcrCache(directory=str(tmp_path)).get(keys[0]) is None
+    assert OcrCache(directory=str(tmp_path)).get(keys[3]) == "x" * 40
+
+
+def test_repeat_scans_hit_the_cache(client, monkeypatch):
+    monkeypatch.setattr(ocr_mod, "_cache", OcrCache(directory=None))
+    counting = FlakyOcr(failures=0)
+    monkeypatch.setattr(ocr_mod, "_backend", counting)
+    for _ in range(3):
+        assert client.post("/v1/ocr", json={"image_base64": _b64(b"photo")}).json() == {"text": "sugar, salt"}
+    assert counting.calls == 1
+
+    # image_url: keyed by the URL alone (the server never fetches it) and expires after the TTL
+    cache = ocr_mod.get_ocr_cache()
+    now = [0.0]
+    monkeypatch.setattr(cache.urls, "_clock", lambda: now[0])
+    url = {"image_url": "https://img.example.com/label.jpg"}
+    client.post("/v1/ocr", json=url)
+    client.post("/v1/ocr", json=url)
+    assert counting.calls == 2
+    now[0] += cache.urls.ttl + 1
+    client.post("/v1/ocr", json=url)
+    assert counting.calls == 3
+    assert cache.stats()["hits"] == 3
+    assert OcrCache(directory=None, url_ttl=0).urls.maxsize == 0  # OCR_URL_CACHE_TTL=0: not cached
+
+
+def _label_photo(seed: int, quality: int = 90, shift: int = 0) -> bytes:
+    import io, random
+    from PIL import Image, ImageDraw
+    rnd = random.Random(seed)
+    img = Image.new("RGB", (320, 240), "white")
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x, y = rnd.randrange(300), rnd.randrange(220)
+        draw.rectangle((x + shift, y, x + shift + rnd.randrange(20, 120), y + 20), fill=(rnd.randrange(256),) * 3)
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=quality)
+    return out.getvalue()
+
+
+def test_phash_index_matches_brute_force():
+    import random
+    from backend.ocr_phash import PhashIndex
+    rnd = random.Random(7)
+    index = PhashIndex(threshold=6, maxsize=500, verify_rate=0)
+    hashes = [rnd.getrandbits(64) for _ in range(500)]
+    for i, h in enumerate(hashes):
+        index.add("k", h, str(i))
+    for base in hashes[:100]:
+        q = base
+        for bit in rnd.sample(range(64), rnd.randrange(9)):
+            q ^= 1 << bit
+        best = min(bin(h ^ q).count("1") for h in hashes)
+        hit = index.lookup("k", q)
+        assert (hit[1] if hit else None) == (best if best <= 6 else None)
+    assert index.lookup("other-backend", hashes[0]) is None
+
+    index.add("k", rnd.getrandbits(64), "newest")  # over maxsize: the oldest entry goes
+    assert len(index) == 500 and index.lookup("k", hashes[0]) is None
+
+
+def test_near_duplicate_photos_reuse_ocr_text(client, monkeypatch):
+    from backend import ocr_phash
+    from backend.ocr_phash import PhashIndex, dhash
+    first, retake, other = _label_photo(1), _label_photo(1, quality=60, shift=1), _label_photo(2)
+    assert first != retake and dhash(first) is not None and dhash(b"not an image") is None
+    assert bin(dhash(first) ^ dhash(retake)).count("1") <= 4 < bin(dhash(first) ^ dhash(other)).count("1")
+
+    monkeypatch.setattr(ocr_mod, "_cache", OcrCache(directory=None))
+    monkeypatch.setattr(ocr_phash, "OCR_PHASH", True)
+    monkeypatch.setattr(ocr_mod, "_phash", PhashIndex(threshold=4, verify_rate=0))
+    counting = FlakyOcr(failures=0)
+    monkeypatch.setattr(ocr_mod, "_backend", counting)
+    for image in (first, retake, other):
+        assert client.post("/v1/ocr", json={"image_base64": _b64(image)}).json() == {"text": "sugar, salt"}
+    assert counting.calls == 2  # the retake was served from the index
+    assert ocr_mod.get_phash_index().stats()["hits"] == 1
+
+    # with every hit verified, a disagreeing re-read counts as a false match
+    index = PhashIndex(threshold=4, verify_rate=1.0)
+    index.add("FlakyOcr", dhash(first), "milk, eggs")
+    monkeypatch.setattr(ocr_mod, "_phash", index)
+    assert client.post("/v1/ocr", json={"image_base64": _b64(_label_photo(1, quality=40))}).json()["text"] == "sugar, salt"
+    stats = index.stats()
+    assert (stats["verified"], stats["false_matches"], stats["false_match_ratio"]) == (1, 1, 1.0)
+    assert "foodscanner_ocr_phash_false_matches_total 1" in client.get("/metrics").text
+
+
+def test_preprocess_uprights_shrinks_and_passes_non_images_through(client, monkeypatch):
+    import io, random
+    from PIL import Image
+    from backend.bench_ocr_preprocess import make_fixture
+    photo, _ = make_fixture(random.Random(3), size=(1600, 1200))  # stored sideways, EXIF orientation 6
+    with Image.open(io.BytesIO(photo)) as img:
+        assert img.size == (1200, 1600)
+    out = ocr_mod.preprocess_image(photo, ocr_mod.PreprocessOptions(max_edge=800, grayscale=True, quality=80))
+    with Image.open(io.BytesIO(out)) as img:
+        assert (img.size, img.mode, img.format) == ((800, 600), "L", "JPEG")
+        assert img.getexif().get(0x0112, 1) == 1
+    assert len(out) < len(photo) / 4
+
+    assert ocr_mod.preprocess_image(b"milk, eggs") == b"milk, eggs"
+    tiny = io.BytesIO()
+    Image.effect_noise((64, 32), 60).save(tiny, "JPEG", quality=30)
+    assert ocr_mod.preprocess_image(tiny.getvalue()) == tiny.getvalue()  # nothing to gain
+
+    # the backend receives the preprocessed bytes
+    seen = []
+    class Recording(ocr_mod.FakeOcr):
+        async def detect(self, content, url, timeout):
+            seen.append(content)
+            return "ok"
+    monkeypatch.setattr(ocr_mod, "_cache", OcrCache(directory=None))
+    monkeypatch.setattr(ocr_mod, "_backend", Recording())
+    assert client.post("/v1/ocr", json={"image_base64": _b64(photo)}).json() == {"text": "ok"}
+    assert len(seen[0]) < len(photo)
+
+
+def test_binary_and_multipart_uploads(client, monkeypatch):
+    from backend import ocr_upload
+    monkeypatch.setattr(ocr_mod, "_cache", OcrCache(directory=None))
+    text = b"Ingredients: sugar, milk"
+    raw = client.post("/v1/ocr", content=text, headers={"Content-Type": "image/jpeg"})
+    assert raw.json() == {"text": text.decode()}
+    form = client.post("/v1/ocr", files={"image": ("label.jpg", text, "image/jpeg")})
+    assert form.json() == {"text": text.decode()}
+
+    scan = client.post("/v1/scan", files={"image": ("label.jpg", text, "image/jpeg")}, data={"profileId": ""})
+    assert scan.status_code == 200 and scan.json()["tokens"] == ["sugar", "milk"]
+    scan = client.post("/v1/scan", content=text, headers={"Content-Type": "image/png"})
+    assert scan.status_code == 200 and scan.json()["text"] == text.decode()
+
+    assert client.post("/v1/ocr", content=b"", headers={"Content-Type": "image/jpeg"}).status_code == 400
+    assert client.post("/v1/ocr", files={"photo": ("x.jpg", text, "image/jpeg")}).status_code == 400
+    assert client.post("/v1/ocr", files={"image": ("x.jpg", b"", "image/jpeg")}).status_code == 400
+    assert client.post("/v1/ocr", content=b"{not json", headers={"Content-Type": "application/json"}).status_code == 422
+
+    # the limit holds with a Content-Length and while streaming a chunked body
+    monkeypatch.setattr(ocr_upload, "OCR_MAX_UPLOAD_BYTES", 16)
+    assert client.post("/v1/ocr", content=b"x" * 17, headers={"Content-Type": "image/jpeg"}).status_code == 413
+    chunked = client.post("/v1/ocr", content=iter([b"x" * 10, b"x" * 10]), headers={"Content-Type": "image/jpeg"})
+    assert chunked.status_code == 413
+    assert client.post("/v1/ocr", files={"image": ("x.jpg", b"x" * 17, "image/jpeg")}).status_code == 413
+    assert client.post("/v1/ocr", json={"image_base64": _b64(b"x" * 40)}).status_code == 200  # base64 allowance + fields
+
+    body = client.get("/openapi.json").json()["paths"]["/v1/scan"]["post"]["requestBody"]["content"]
+    assert {"application/json", "multipart/form-data", "image/*"} <= set(body)
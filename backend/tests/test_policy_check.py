@@ -0,0 +1,41 @@
+# backend/tests/test_policy_check.py
+import json
+
+from backend.policy_check import check_cost, check_entries, main, nested_quantifiers
+
+
+def test_entry_checks_flag_duplicates_and_conflicting_aliases():
+    errors, warnings = check_entries({
+        "tokens": {"major_allergens": ["milk", "Milk", ""], "synonyms": {"milk": ["melk"], "egg": ["melk"]},
+                   "additives": [{"id": "E102"}, {"id": "e102"}]},
+        "patterns": {"deny_patterns": ["x", "x"]},
+    })
+    assert not errors
+    text = "\n".join(warnings)
+    for needle in ("duplicate 'Milk'", "empty entry", "'melk' maps to both", "duplicate id E102", "duplicate pattern"):
+        assert needle in text
+
+
+def test_regex_cost_analysis():
+    assert nested_quantifiers(r"(a+)+$")
+    assert not nested_quantifiers(r"(?i)may\s+(also\s+)?contain")
+    assert check_cost(r"(?i)may\s+(also\s+)?contain") is None
+    assert "catastrophic" in check_cost(r"(a+)+$", timeout=0.5)
+
+
+def test_cli_exit_status(tmp_path, capsys):
+    good = tmp_path / "good_v1.json"
+    good.write_text(json.dumps({"tokens": {"major_allergens": ["milk"]},
+                                "patterns": {"trace_allergen_patterns": [r"may\s+contain"]}}), encoding="utf-8")
+    assert main([str(good)]) == 0
+    assert "compiled engine" in capsys.readouterr().out
+
+    bad = tmp_path / "bad_v1.json"
+    bad.write_text(json.dumps({"patterns": {"deny_patterns": ["[unclosed", r"(a|\w)*x$", r"(\w+\s?)*x$"]}}),
+                   encoding="utf-8")
+    assert main([str(bad), "--timeout", "0.5", "--json"]) == 1
+    report = json.loads(capsys.readouterr().out)[0]
+    assert any("[unclosed" in e for e in report["errors"])
+    assert any("catastrophic" in e for e in report["errors"])  # overlapping alternatives, found by timing
+    assert any("nested unbounded quantifiers" in e for e in report["errors"])
+    assert report["memory"]["total_bytes"] > 0
@@ -0,0 +1,278 @@
+# backend/tests/test_policy_engine.py
+import json
+import os
+
+from backend.assess import assess_tokens
+from backend.policy_engine import PolicyEngine, compile_policy, get_engine, pattern_budget, validate_engine
+
+
+POLICY = {
+    "tokens": {
+        "major_allergens": ["milk", "peanut"],
+        "hazardous_chemicals": ["formaldehyde"],
+        "synonyms": {"milk": ["melk", "lait"]},
+    },
+    "scoring": {"weights": {"ALLERGEN_MATCH": 5}, "thresholds": {"caution": 3, "avoid": 10}},
+}
+
+
+def _write(path, policy):
+    path.write_text(json.dumps(policy), encoding="utf-8")
+
+
+def test_compile_policy_reuses_engine_for_equal_dicts():
+    a = compile_policy(POLICY)
+    b = compile_policy(json.loads(json.dumps(POLICY)))
+    assert a is b
+    assert isinstance(a, PolicyEngine)
+    assert isinstance(a.major_allergens, frozenset)
+
+
+def test_assess_tokens_accepts_compiled_engine():
+    engine = compile_policy(POLICY)
+    assert assess_tokens(["Melk"], engine) == assess_tokens(["Melk"], POLICY)
+    score, verdict, reasons = engine.assess(["Melk"])
+    assert verdict == "caution"
+    assert reasons == [{"code": "ALLERGEN_MATCH", "param": "major_allergen"}]
+
+
+def test_get_engine_cached_by_mtime_and_content(tmp_path):
+    path = tmp_path / "policy.json"
+    _write(path, POLICY)
+    first = get_engine(str(path))
+    assert get_engine(str(path)) is first
+
+    # touched but identical content -> same engine
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert get_engine(str(path)) is first
+
+    # changed content -> recompiled
+    changed = json.loads(json.dumps(POLICY))
+    changed["tokens"]["major_allergens"].append("egg")
+    _write(path, changed)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 2_000_000))
+    second = get_engine(str(path))
+    assert second is not first
+    assert "egg" in second.major_allergens
+
+
+def test_default_policy_file_compiles():
+    engine = get_engine()
+    assert engine.fingerprint
+    score, verdict, reasons = engine.assess(["peanut"])
+    assert verdict == "caution"
+
+
+def test_aho_corasick_reports_overlapping_matches_with_offsets():
+    from backend.matchers import AhoCorasick
+
+    ac = AhoCorasick(["he", "she", "his", "hers"])
+    assert sorted(ac.iter_matches("ushers")) == [(1, "she"), (2, "he"), (2, "hers")]
+    assert list(AhoCorasick([]).iter_matches("anything")) == []
+
+
+def test_scan_hazards_skips_allowlist_and_reports_offsets():
+    engine = compile_policy({
+        "tokens": {
+            "hazardous_chemicals": ["formaldehyde", "chlorine dioxide"],
+            "unsafe_allowlist": ["trace formaldehyde standard"],
+        }
+    })
+    hits = engine.scan_hazards(["water", "x formaldehyde y", "trace formaldehyde standard"])
+    assert hits == [("formaldehyde", 2)]
+    score, verdict, reasons = engine.assess(["Water with Chlorine Dioxide"])
+    assert verdict == "avoid"
+    assert reasons == [{"code": "HAZARDOUS_CHEM", "param": "chlorine dioxide"}]
+
+
+def test_token_index_holds_category_masks():
+    from backend.policy_engine import ADDITIVE_SHIFT, CAT_ALLERGEN, CAT_ANIMAL, CAT_ALLOW
+
+    engine = compile_policy({
+        "tokens": {
+            "major_allergens": ["fish"],
+            "animal_tokens": ["fish"],
+            "unsafe_allowlist": ["citric acid"],
+            "additives": [{"id": "E102", "names": ["tartrazine"]}, {"id": "E951", "names": ["aspartame"]}],
+        }
+    })
+    assert engine.index["fish"] == CAT_ALLERGEN | CAT_ANIMAL
+    assert engine.index["citric acid"] & CAT_ALLOW
+    assert engine.index["e951"] >> ADDITIVE_SHIFT == 0b10
+    # configured order decides which additive is reported, not token order
+    _, _, reasons = engine.assess(["aspartame", "tartrazine"])
+    assert {"code": "ADDITIVE_FLAG", "param": "E102"} in reasons
+
+
+def test_pattern_set_fuses_groups_and_prefilters_on_literals():
+    from backend.matchers import PatternSet
+
+    ps = PatternSet([
+        r"(?i)may\s+(also\s+)?contain\s+nut[s]?",
+        r"(?i)kan\s+sporen\s+bevatten\s+van\s+noten",
+        r"(\w)\1{3}",   # backreference: evaluated on its own, outside the fused regex
+        r"[unclosed",   # invalid: dropped
+    ])
+    assert len(ps) == 3
+    assert ps.literals is None  # the backreference pattern has no literal anchor
+    assert ps.search("may also contain nuts")
+    assert ps.search("Kan sporen bevatten van noten")
+    assert ps.search("zzzz")
+    assert not ps.search("sugar")
+    assert ps.which("may contain nut").startswith("(?i)may")
+
+    trace = PatternSet([r"(?i)may\s+contain\s+nuts", r"(?i)contains?\s+traces\s+of\s+nuts"])
+    assert trace.literals == ("contain", "contain")
+    assert not trace.search("milk chocolate")
+
+
+def test_symspell_lookup_matches_bounded_edit_distance():
+    from backend.matchers import SymSpell, edit_distance
+
+    assert edit_distance("aspartarne", "aspartame", 2) == 2
+    assert edit_distance("peanut", "paenut", 1) == 1  # transposition counts once
+    assert edit_distance("formaldehyde", "sugar", 2) == 3
+    ss = SymSpell(["peanut", "aspartame", "formaldehyde", "soy lecithin"], max_distance=2)
+    assert ss.lookup("peanvt") == ("peanut", 1)
+    assert ss.lookup("soy lecitin") == ("soy lecithin", 1)
+    assert ss.lookup("formaldehyde") == ("formaldehyde", 0)
+    assert ss.lookup("aspartarne", max_distance=1) is None
+    assert ss.lookup("sugar") is None
+
+
+def test_fuzzy_matching_resolves_ocr_typos_to_canonical_terms():
+    policy = json.loads(json.dumps(POLICY))
+    policy["tokens"]["additives"] = [{"id": "E951", "names": ["aspartame"]}]
+    exact = compile_policy(policy)
+    assert exact.fuzzy_index is None
+    assert exact.assess(["peanvt"])[2] == [{"code": "UNKNOWN", "param": "none"}]
+
+    policy["matching"] = {"fuzzy": True}
+    engine = compile_policy(policy)
+    score, verdict, reasons = engine.assess(["peanvt", "aspartarne", "sugar"])
+    assert verdict == "caution"
+    assert reasons[-1] == {"code": "FUZZY_MATCH", "param": "aspartarne->aspartame, peanvt->peanut"}
+    # short tokens and known tokens are left alone
+    assert engine.prepare(["mikl", "sugar"]) == ["mikl", "sugar"]
+    assert engine.assess_many([["peanvt"], ["sugar"]]) == [engine.assess(["peanvt"]), engine.assess(["sugar"])]
+
+    # synonyms resolve to their canonical term
+    policy["tokens"]["synonyms"]["peanut"] = ["arachide"]
+    assert compile_policy(policy).assess(["arachlde"])[2][-1] == {"code": "FUZZY_MATCH", "param": "arachlde->peanut"}
+
+
+def test_fuzzy_matching_does_not_invent_allergens():
+    policy = {
+        "matching": {"fuzzy": True, "known_words": ["peanutbar"]},
+        "tokens": {
+            "major_allergens": ["milk", "egg", "fish", "wheat", "peanut"],
+            "animal_tokens": ["chicken"],
+            "synonyms": {"egg": ["oeuf"], "milk": ["melk"]},
+        },
+    }
+    engine = compile_policy(policy)
+    # real words, short targets (fish, wheat, oeuf, melk) and first-letter changes are never corrected
+    for word in ("chickpea", "boeuf", "fishy", "wheaty", "melkk", "peanutbar"):
+        assert engine.correct(word) is None, word
+    assert engine.correct("chickem") == "chicken"
+    assert engine.correct("xeanut") is None  # one edit, but across the first letter
+    assert engine.assess(["chickpea", "boeuf", "fishy", "wheaty"])[2] == [{"code": "UNKNOWN", "param": "none"}]
+
+
+def test_multiword_terms_inside_long_tokens_feed_scoring():
+    policy = {
+        "matching": {"multiword": True},
+        "tokens": {
+            "major_allergens": ["tree nut", "soy"],
+            "default_unsafe_tokens": ["lamp oil"],
+            "synonyms": {"soy": ["soy lecithin"]},
+        },
+        "patterns": {"trace_allergen_patterns": [r"(?i)may\s+contain"]},
+    }
+    engine = compile_policy(policy)
+    assert engine.embedded_terms("sugar tree nut oil soy lecithin") == ("tree nut", "soy")
+    assert engine.embedded_terms("street nutrition") == ()  # word boundaries only
+    assert engine.embedded_terms("may contain tree nut") == ()  # trace statements stay trace-only
+    score, verdict, reasons = engine.assess(["sugar tree nut oil soy lecithin"])
+    assert reasons == [{"code": "ALLERGEN_MATCH", "param": "major_allergen"}]
+    assert engine.assess(["water  lamp oil"])[2] == [{"code": "DEFAULT_UNSAFE", "param": "lamp oil"}]
+
+    policy["matching"]["multiword"] = False
+    assert compile_policy(policy).assess(["sugar tree nut oil"])[2] == [{"code": "UNKNOWN", "param": "none"}]
+
+
+def test_pattern_guard_fails_safe_to_caution():
+    policy = {
+        "matching": {"max_pattern_token_length": 32},
+        "tokens": {"major_allergens": ["milk"]},
+        "patterns": {"trace_allergen_patterns": [r"(?i)may\s+contain"]},
+    }
+    engine = compile_policy(policy)
+    # the tail of an over-long token is never matched: caution instead of a clean result
+    score, verdict, reasons = engine.assess(["water", "x" * 40 + " may contain nuts"])
+    assert verdict == "caution"
+    assert reasons == [{"code": "PATTERN_BUDGET_EXCEEDED", "param": "1"}]
+
+    # once the request's regex budget is spent, remaining tokens skip the patterns
+    with pattern_budget(1e-9):
+        assert engine.assess(["sugar"])[1] == "safe"  # checked before the budget ran out
+        score, verdict, reasons = engine.assess(["salt", "may contain nuts", "milk"])
+    assert verdict == "caution"
+    assert reasons == [{"code": "ALLERGEN_MATCH", "param": "major_allergen"},
+                       {"code": "PATTERN_BUDGET_EXCEEDED", "param": "2"}]
+    # skipped tokens were not memoized: the next request classifies them properly
+    assert engine.assess(["may contain nuts"])[2] == [{"code": "TRACE_ALLERGEN", "param": "may contain nuts"}]
+
+
+def _ticking_clock(monkeypatch, step=0.001, wall_step=0.0):
+    """Every thread_time() call in the engine advances 1 ms: a token's pattern pass 'costs' 1 ms of CPU."""
+    import time
+    import types
+    import backend.policy_engine as pe
+    now, wall = [0.0], [time.perf_counter()]
+    def thread_time():
+        now[0] += step
+        return now[0]
+    def perf_counter():
+        wall[0] += wall_step
+        return wall[0]
+    monkeypatch.setattr(pe, "time", types.SimpleNamespace(thread_time=thread_time, perf_counter=perf_counter))
+
+
+def test_pattern_budget_ignores_time_spent_waiting(monkeypatch):
+    # a loaded host: each call sees a second of wall time pass but no CPU time for this thread
+    _ticking_clock(monkeypatch, step=0.0, wall_step=1.0)
+    engine = get_engine()
+    assert {v for _, v, _ in engine.assess_many([[f"zw{n}x{i}" for i in range(25)] for n in range(20)])} == {"safe"}
+
+
+def test_each_label_in_a_batch_gets_its_own_pattern_budget(client, monkeypatch):
+    _ticking_clock(monkeypatch)
+    engine = get_engine()
+    labels = [[f"zq{n}x{i}" for i in range(25)] for n in range(200)]  # 25 ms per label, 5 s per batch
+    batch = engine.assess_many(labels)
+    assert not any(r["code"] == "PATTERN_BUDGET_EXCEEDED" for _, _, reasons in batch for r in reasons)
+    singles = [engine.assess(label) for label in labels]
+    assert batch == singles and {v for _, v, _ in batch} == {"safe"}
+
+    fresh = [[f"zr{n}x{i}" for i in range(25)] for n in range(200)]
+    r = client.post("/v1/assess/batch", json={"items": [{"ingredients": x} for x in fresh]})
+    assert {res["verdict"] for res in r.json()["results"]} == {"safe"}
+
+    # 60 ms of patterns overruns one label's 50 ms; offline bulk scoring runs without a budget
+    assert engine.assess_many([[f"zs{i}" for i in range(60)]])[0][1] == "caution"
+    assert engine.assess_many([[f"zt{i}" for i in range(60)]], budget=False)[0][1] == "safe"
+
+
+def test_nested_quantifier_patterns_are_withheld_and_fail_safe(caplog):
+    with caplog.at_level("WARNING", logger="policy_engine"):
+        engine = PolicyEngine({"tokens": {"major_allergens": ["milk"]},
+                               "patterns": {"deny_patterns": [r"^(\w+\s?)+$", r"forbidden"]}})
+    assert "withheld" in caplog.text  # logged once at load, not per label
+    assert engine.deny_patterns.withheld == (r"^(\w+\s?)+$",)
+    # would backtrack for seconds under `re`; the withheld pattern is never run
+    score, verdict, reasons = engine.assess(["abcdefghijklmnopqrstuvwxyz!"])
+    assert verdict == "caution" and reasons[-1] == {"code": "PATTERN_WITHHELD", "param": "1"}
+    assert any("nested unbounded quantifiers" in e for e in validate_engine(engine))
+    assert engine.assess(["forbidden dye"])[1] == "avoid"
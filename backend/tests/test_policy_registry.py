@@ -0,0 +1,148 @@
+# backend/tests/test_policy_registry.py
+import json
+import os
+
+import pytest
+
+from backend.policy_registry import PolicyKey, PolicyRegistry, parse_policy_filename
+
+
+def _policy(weight):
+    return {"tokens": {"major_allergens": ["milk"]}, "scoring": {"weights": {"ALLERGEN_MATCH": weight}}}
+
+
+@pytest.fixture
+def registry(tmp_path):
+    for name, weight in [("policy_v2.json", 5), ("policy_v3.json", 7),
+                         ("policy_v2.BE.json", 11), ("policy_v2.fr_FR.json", 13)]:
+        (tmp_path / name).write_text(json.dumps(_policy(weight)), encoding="utf-8")
+    (tmp_path / "README.md").write_text("not a policy", encoding="utf-8")
+    return PolicyRegistry(str(tmp_path), max_loaded=2)
+
+
+def test_parse_policy_filename():
+    assert parse_policy_filename("policy_v2.json") == PolicyKey("policy", "2", None)
+    assert parse_policy_filename("policy_v2.1.fr-BE.json") == PolicyKey("policy", "2.1", "fr_be")
+    assert parse_policy_filename("custom.json") == PolicyKey("custom", "", None)
+    assert parse_policy_filename("notes.txt") is None
+
+
+def test_resolve_by_version_and_locale(registry):
+    assert registry.default == PolicyKey("policy", "2", None)
+    assert registry.resolve() == PolicyKey("policy", "2", None)
+    assert registry.resolve(version="3") == PolicyKey("policy", "3", None)
+    assert registry.resolve(locale="BE") == PolicyKey("policy", "2", "be")
+    assert registry.resolve(locale="nl-BE") == PolicyKey("policy", "2", "be")  # same country
+    assert registry.resolve(locale="fr") == PolicyKey("policy", "2", "fr_fr")  # same language
+    assert registry.resolve(locale="DE") == PolicyKey("policy", "2", None)  # generic fallback
+    assert registry.resolve(name="policy", version="3", locale="BE") == PolicyKey("policy", "3", None)
+    with pytest.raises(KeyError):
+        registry.resolve(version="9")
+    with pytest.raises(KeyError):
+        registry.resolve(name="other")
+
+
+def test_profile_country_matches_only_the_country_part(tmp_path):
+    for name, weight in [("policy_v2.json", 5), ("policy_v2.nl_BE.json", 11)]:
+        (tmp_path / name).write_text(json.dumps(_policy(weight)), encoding="utf-8")
+    registry = PolicyRegistry(str(tmp_path))
+    assert registry.resolve(country="NL") == PolicyKey("policy", "2", None)  # Dutch, not Belgian
+    assert registry.resolve(country="BE") == PolicyKey("policy", "2", "nl_be")
+    assert registry.resolve(locale="nl") == PolicyKey("policy", "2", "nl_be")  # explicit locale: language counts
+    assert registry.select(country="NL").w_allergen == 5
+
+
+def test_engines_are_cached_and_cold_ones_evicted(registry):
+    v2 = registry.select()
+    assert registry.select() is v2
+    assert registry.select(country="BE").w_allergen == 11
+    registry.engine(registry.resolve(version="3"))  # third policy: evicts the least recently used
+    assert len(registry._engines) == 2
+    assert registry.select(country="BE").w_allergen == 11
+    assert registry.select() is not v2  # recompiled after eviction
+    assert registry.select().fingerprint == v2.fingerprint
+
+
+def test_assess_selects_policy_by_header_or_query(client):
+    body = {"ingredients": ["milk"]}
+    assert client.post("/v1/assess", json=body, headers={"X-Policy-Locale": "BE"}).status_code == 200
+    r = client.post("/v1/assess?policy_version=99", json=body)
+    assert r.status_code == 400
+    assert client.post("/v1/assess", json=body, headers={"X-Policy-Version": "2"}).status_code == 200
+
+
+def _rewrite(path, policy, bump_ns):
+    st = os.stat(path)
+    path.write_text(json.dumps(policy), encoding="utf-8")
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + bump_ns))
+
+
+def test_reload_swaps_validated_engines_atomically(registry, tmp_path):
+    old = registry.select()
+    assert registry.reload()["reloaded"] == []  # nothing changed
+
+    _rewrite(tmp_path / "policy_v2.json", _policy(6), 1_000_000)
+    report = registry.reload()
+    assert report["reloaded"] == [str(tmp_path / "policy_v2.json")]
+    new = registry.select()
+    assert new is not old and new.w_allergen == 6
+    assert old.assess(["milk"])[0] == 5  # in-flight holders keep their engine
+
+    # a broken or invalid edit is rejected and the active engine stays
+    redos = {"patterns": {"deny_patterns": [r"^(\w+\s?)+$"]}}  # what policy_check fails in CI
+    for bump, broken in ((2_000_000, "{not json"), (3_000_000, {"patterns": {"deny_patterns": ["[unclosed"]}}),
+                         (4_000_000, redos)):
+        st = os.stat(tmp_path / "policy_v2.json")
+        (tmp_path / "policy_v2.json").write_text(broken if isinstance(broken, str) else json.dumps(broken))
+        os.utime(tmp_path / "policy_v2.json", ns=(st.st_atime_ns, st.st_mtime_ns + bump))
+        report = registry.reload()
+        assert report["reloaded"] == [] and report["errors"]
+        assert registry.select() is new
+    assert "nested unbounded quantifiers" in registry.status()[0]["errors"][0]
+
+
+def test_reload_validation_never_times_patterns(registry, tmp_path, monkeypatch):
+    from backend import policy_check
+
+    def no_timing(*args, **kwargs):
+        raise AssertionError("hot reload must not fork timing children")
+    monkeypatch.setattr(policy_check, "time_pattern", no_timing)
+    registry.select()
+    slow_but_valid = {**_policy(9), "patterns": {"deny_patterns": [r"(a|\w)*x$", r"forbidden"]}}
+    _rewrite(tmp_path / "policy_v2.json", slow_but_valid, 1_000_000)
+    assert registry.reload()["reloaded"] == [str(tmp_path / "policy_v2.json")]
+    assert registry.select().w_allergen == 9
+
+
+def test_watcher_polls_for_changes(monkeypatch, tmp_path):
+    import time
+    from backend import policy_registry as pr
+
+    (tmp_path / "policy_v2.json").write_text(json.dumps(_policy(5)), encoding="utf-8")
+    reg = PolicyRegistry(str(tmp_path))
+    monkeypatch.setattr(pr, "_registry", reg)
+    assert reg.select().w_allergen == 5
+    watcher = pr.PolicyWatcher(interval=0.01)
+    watcher.start()
+    try:
+        _rewrite(tmp_path / "policy_v2.json", _policy(8), 1_000_000)
+        deadline = time.monotonic() + 5
+        while reg.select().w_allergen != 8 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert reg.select().w_allergen == 8
+    finally:
+        watcher.stop()
+
+
+def test_admin_policy_endpoint_reports_fingerprint(client, monkeypatch):
+    from backend import api_admin
+    from backend.policy_registry import get_registry
+
+    monkeypatch.setattr(api_admin, "ADMIN_TOKEN", None)
+    assert client.get("/admin/policy").status_code == 404
+    monkeypatch.setattr(api_admin, "ADMIN_TOKEN", "s3cret")
+    assert client.get("/admin/policy", headers={"X-Admin-Token": "nope"}).status_code == 403
+    r = client.get("/admin/policy", headers={"X-Admin-Token": "s3cret"})
+    assert r.status_code == 200
+    assert r.json()["fingerprint"] == get_registry().select().fingerprint
+    assert client.post("/admin/policy/reload", headers={"X-Admin-Token": "s3cret"}).json()["reloaded"] == []
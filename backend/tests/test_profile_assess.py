@@ -0,0 +1,105 @@
+# backend/tests/test_profile_assess.py
+from backend.auth import make_token
+from backend.policy_engine import compile_policy
+from backend import profile_matchers
+from backend.profile_matchers import ProfileMatcher
+
+
+def _create(client, headers, allergens, avoid):
+    r = client.post("/profiles", json={"name": "Assess Kid", "allergens": allergens,
+                                       "avoid_ingredients": avoid}, headers=headers)
+    assert r.status_code in (200, 201), r.text
+    return r.json()["id"]
+
+
+def generic_etag(client, body):
+    return client.post("/v1/assess", json={"ingredients": body["ingredients"]}).headers["etag"]
+
+
+def _codes(body):
+    return {r["code"]: r["param"] for r in body["reasons"]}
+
+
+def test_profile_matcher_canonicalizes_profile_terms():
+    engine = compile_policy({
+        "tokens": {
+            "major_allergens": ["peanut", "milk"],
+            "synonyms": {"peanut": ["pinda"]},
+            "additives": [{"id": "E102", "names": ["tartrazine"]}],
+        },
+        "patterns": {"trace_allergen_patterns": [r"(?i)may\s+contain"]},
+    })
+    matcher = ProfileMatcher(engine, 1, 1, ["PEANUTS"], ["E102"])
+    assert matcher.allergens == {"peanut"}
+    assert matcher.avoid == {"e102", "tartrazine"}
+    score, verdict, reasons = matcher.assess(["Pinda", "Tartrazine", "sugar"])
+    assert verdict == "avoid"
+    assert {"code": "PROFILE_ALLERGEN", "param": "peanut"} in reasons
+    assert {"code": "PROFILE_AVOID", "param": "tartrazine"} in reasons
+    # embedded on word boundaries, but not inside trace statements
+    assert matcher.assess(["roasted peanuts pieces"])[2][-1]["code"] == "PROFILE_ALLERGEN"
+    assert matcher.assess(["may contain peanuts"])[2] == engine.assess(["may contain peanuts"])[2]
+    assert matcher.assess(["water"]) == engine.assess(["water"])
+
+
+def test_rebind_keeps_one_variant_per_policy_key():
+    base = compile_policy({"tokens": {"major_allergens": ["milk"]}})
+    matcher = ProfileMatcher(base, 1, 1, ["milk"], [])
+    v1 = compile_policy({"tokens": {"major_allergens": ["milk", "egg"]}})
+    assert matcher.rebind(base, "generic") is matcher
+    assert matcher.rebind(v1, "be") is matcher.rebind(v1, "be")
+    reloaded = compile_policy({"tokens": {"major_allergens": ["milk", "egg", "soy"]}})
+    assert matcher.rebind(reloaded, "be").engine is reloaded
+    assert list(matcher._variants) == ["be"]  # the stale engine is not pinned
+
+
+def test_country_change_drops_the_owners_cached_matchers(client, auth_headers):
+    pid = _create(client, auth_headers, ["milk"], [])
+    body = {"ingredients": ["milk"], "profileId": str(pid)}
+    assert client.post("/v1/assess", json=body, headers=auth_headers).status_code == 200
+    assert pid in profile_matchers._cache
+    me = client.get("/auth/me", headers=auth_headers).json()
+    r = client.put("/auth/me", json={"country": "NL" if me.get("country") != "NL" else "BE"}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+    assert pid not in profile_matchers._cache
+
+
+def test_assess_with_profile_id_uses_cached_matcher_and_invalidates(client, auth_headers):
+    pid = _create(client, auth_headers, ["milk"], ["E102"])
+    body = {"ingredients": ["sugar", "skimmed milk powder", "E102"], "profileId": str(pid)}
+
+    r = client.post("/v1/assess", json=body, headers=auth_headers)
+    assert r.status_code == 200, r.text
+    assert r.json()["verdict"] == "avoid"
+    assert _codes(r.json())["PROFILE_ALLERGEN"] == "milk"
+    assert _codes(r.json())["PROFILE_AVOID"] == "E102"
+
+    # the generic assessment is unchanged without a profile
+    generic = client.post("/v1/assess", json={"ingredients": body["ingredients"]}).json()
+    assert "PROFILE_ALLERGEN" not in _codes(generic)
+    assert generic_etag(client, body) != r.headers["etag"]
+
+    upd = client.put(f"/profiles/{pid}", json={"name": "Assess Kid", "allergens": ["egg"],
+                                              "avoid_ingredients": []}, headers=auth_headers)
+    assert upd.status_code == 200, upd.text
+    after = client.post("/v1/assess", json=body, headers=auth_headers)
+    assert "PROFILE_ALLERGEN" not in _codes(after.json()) and "PROFILE_AVOID" not in _codes(after.json())
+    assert after.headers["etag"] != r.headers["etag"]  # matcher version is part of the cache key
+
+    batch = client.post("/v1/assess/batch", headers=auth_headers, json={"items": [
+        {"ingredients": ["egg"], "profileId": str(pid)}, {"ingredients": ["egg"]},
+    ]}).json()["results"]
+    assert _codes(batch[0])["PROFILE_ALLERGEN"] == "egg"
+    assert "PROFILE_ALLERGEN" not in _codes(batch[1])
+
+    assert client.delete(f"/profiles/{pid}", headers=auth_headers).status_code == 200
+    assert client.post("/v1/assess", json=body, headers=auth_headers).status_code == 404
+
+
+def test_assess_with_profile_id_requires_owner_token(client, auth_headers):
+    pid = _create(client, auth_headers, ["milk"], [])
+    body = {"ingredients": ["milk"], "profileId": str(pid)}
+    assert client.post("/v1/assess", json=body).status_code == 401
+    other = {"Authorization": f"Bearer {make_token(987654)}"}
+    assert client.post("/v1/assess", json=body, headers=other).status_code == 404
+    assert client.post("/v1/assess", json={**body, "profileId": "nope"}, headers=auth_headers).status_code == 404